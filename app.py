@@ -1,764 +1,254 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from flask import Flask, request, send_from_directory, abort, current_app
+from werkzeug.security import safe_join
 import os
-from PIL import Image
-from datetime import datetime, timedelta, date  # Add date to the import
-import io
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'cebu-rental-hub-secret-key-2023'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///rentalhub.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-login_manager.login_message_category = 'error'
-
-
-def allowed_file(filename):
-    return '.' in filename and \
-        filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-
-def save_image(file):
-    """Save uploaded image and create thumbnail"""
-    if file and allowed_file(file.filename):
-        # Generate secure filename
-        filename = secure_filename(file.filename)
-        # Add timestamp to make filename unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
-
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-
-        try:
-            image = Image.open(file)
-
-            max_size = (1200, 1200)
-            image.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            if image.mode in ('RGBA', 'P'):
-                image = image.convert('RGB')
-
-            image.save(filepath, 'JPEG', quality=85)
-
-            thumbnail_size = (300, 300)
-            thumbnail = image.copy()
-            thumbnail.thumbnail(thumbnail_size, Image.Resampling.LANCZOS)
-
-            thumb_filename = f"thumb_{filename}"
-            thumb_path = os.path.join(app.config['UPLOAD_FOLDER'], thumb_filename)
-            thumbnail.save(thumb_path, 'JPEG', quality=80)
-
-            return filename
-        except Exception as e:
-            print(f"Error processing image: {e}")
-            return None
-    return None
-
-
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(200), nullable=False)
-    phone = db.Column(db.String(20))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-
-class RentalItem(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    title = db.Column(db.String(200), nullable=False)
-    description = db.Column(db.Text, nullable=False)
-    price = db.Column(db.Float, nullable=False)
-    location = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(50), nullable=False)
-    image_filename = db.Column(db.String(300))
-    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    is_available = db.Column(db.Boolean, default=True)
-
-    owner = db.relationship('User', backref=db.backref('items', lazy=True))
-
-    @property
-    def image_url(self):
-        if self.image_filename:
-            return url_for('uploaded_file', filename=self.image_filename)
-        return url_for('static', filename='images/default-item.jpg')
-
-    @property
-    def thumbnail_url(self):
-        if self.image_filename:
-            return url_for('uploaded_file', filename=f"thumb_{self.image_filename}")
-        return url_for('static', filename='images/default-item.jpg')
-
-
-def get_available_dates_count(item_id, months=6):
-    """Get count of available dates for the next few months"""
-    start_date = datetime.now().date()
-    end_date = start_date + timedelta(days=30 * months)
-
-    # Get total days in range
-    total_days = (end_date - start_date).days + 1
-
-    # Get blocked dates count
-    blocked_count = BlockedDate.query.filter(
-        BlockedDate.item_id == item_id,
-        BlockedDate.date >= start_date,
-        BlockedDate.date <= end_date
-    ).count()
-
-    return total_days - blocked_count
-
-
-# Make the function available to templates
-@app.context_processor
-def utility_processor():
-    return dict(get_available_dates_count=get_available_dates_count)
-
-# Add this new model for blocked dates
-class BlockedDate(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey('rental_item.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    reason = db.Column(db.String(100))  # e.g., 'rented', 'maintenance', 'owner_blocked'
-    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=True)
-
-    item = db.relationship('RentalItem', backref=db.backref('blocked_dates', lazy=True))
-    rental = db.relationship('Rental', backref=db.backref('blocked_dates', lazy=True))
-
-
-# Update the Rental model to include a method for generating blocked dates
-class Rental(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    item_id = db.Column(db.Integer, db.ForeignKey('rental_item.id'), nullable=False)
-    renter_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    start_date = db.Column(db.DateTime, nullable=False)
-    end_date = db.Column(db.DateTime, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
-    status = db.Column(db.String(20), default='pending')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-    item = db.relationship('RentalItem', backref=db.backref('rentals', lazy=True))
-    renter = db.relationship('User', backref=db.backref('rentals', lazy=True))
-
-    def create_blocked_dates(self):
-        """Create blocked dates for this rental period"""
-        current_date = self.start_date.date()
-        end_date = self.end_date.date()
-
-        while current_date <= end_date:
-            blocked_date = BlockedDate(
-                item_id=self.item_id,
-                date=current_date,
-                reason='rented',
-                rental_id=self.id
-            )
-            db.session.add(blocked_date)
-            current_date += timedelta(days=1)
-
-    def remove_blocked_dates(self):
-        """Remove blocked dates associated with this rental"""
-        BlockedDate.query.filter_by(rental_id=self.id).delete()
-
-
-def validate_rental_dates(start_date_str, end_date_str):
-    """Validate rental dates and return (success, start_date, end_date, error_message)"""
+import hashlib
+import functools
+import sqlite3
+from sqlalchemy import event
+import metrics
+from cache import MemoryCache
+from payments import FakeGateway
+from models import db, login_manager, RentalItem
+from availability import get_available_dates_count
+from geo import create_location_index
+from search import create_catalog_facets, create_search_index
+from user_stats import create_user_stats
+from routes.auth_routes import auth_bp
+from routes.owner_routes import owner_bp
+from routes.renter_routes import renter_bp
+from routes.admin_routes import admin_bp
+
+
+def database_url():
+    """DATABASE_URL, also accepting the postgres:// scheme some hosts hand out"""
+    url = os.environ.get('DATABASE_URL', 'sqlite:///rentalhub.db')
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    """SQLAlchemy engine options from the DB_POOL_* environment variables"""
+    options = {'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1'}
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        # In-memory SQLite shares one connection, there is no pool to size
+        return options
+    options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+    options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    options['pool_recycle'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    return options
+
+
+def set_sqlite_pragmas(config, dbapi_connection, connection_record):
+    """Apply the SQLITE_* settings to every new SQLite connection"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}")
+    cursor.execute(f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}")
+    cursor.close()
+
+
+# Static files are linked with a ?v=<content hash> token and uploads have unique
+# names, so both are served as immutable. Responses carry a strong ETag of the
+# content; send_file answers If-None-Match with 304 and Range with 206.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+@functools.lru_cache(maxsize=4096)
+def _content_hash(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:20]
+
+
+def file_hash(folder, filename):
+    """Content hash of a served file, or None if it does not exist"""
+    # Relative folders are resolved like send_from_directory does
+    path = safe_join(os.path.join(current_app.root_path, folder), filename)
     try:
-        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-
-        today = datetime.now().date()
-
-        if start_date < today:
-            return False, None, None, 'Start date cannot be in the past.'
-
-        if start_date >= end_date:
-            return False, None, None, 'End date must be after start date.'
-
-        return True, start_date, end_date, None
-
-    except ValueError:
-        return False, None, None, 'Invalid date format.'
-
-class Payment(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    method = db.Column(db.String(20), nullable=False)
-    status = db.Column(db.String(20), default='pending')
-    transaction_id = db.Column(db.String(100))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        stat = os.stat(path)
+    except (TypeError, OSError):
+        return None
+    # Keyed on mtime and size so an edited file is hashed again
+    return _content_hash(path, stat.st_mtime_ns, stat.st_size)
+
+
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = file_hash(current_app.static_folder, values['filename'])
+        if version:
+            values['v'] = version
+
+
+def send_cacheable_file(folder, filename, immutable):
+    etag = file_hash(folder, filename)
+    if etag is None:
+        abort(404)
+    response = send_from_directory(folder, filename, etag=etag)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        # Unversioned URL: let the browser keep it but revalidate with the ETag
+        response.cache_control.no_cache = True
+    return response
+
+
+def static_file(filename):
+    # Only immutable when the version token matches the file currently on disk
+    version = request.args.get('v')
+    static_folder = current_app.static_folder
+    return send_cacheable_file(static_folder, filename,
+                               immutable=version is not None and version == file_hash(static_folder, filename))
 
-    rental = db.relationship('Rental', backref=db.backref('payment', uselist=False))
 
-
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-
-@app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-
-
-@app.route('/')
-def index():
-    featured_items = RentalItem.query.filter_by(is_available=True).order_by(db.func.random()).limit(6).all()
-    return render_template('index.html', featured_items=featured_items)
-
-
-@app.route('/items')
-def items():
-    category = request.args.get('category', '')
-    search = request.args.get('search', '')
-    location = request.args.get('location', '')
-
-    query = RentalItem.query.filter_by(is_available=True)
-
-    if category:
-        query = query.filter_by(category=category)
-    if search:
-        query = query.filter(RentalItem.title.ilike(f'%{search}%'))
-    if location:
-        query = query.filter(RentalItem.location.ilike(f'%{location}%'))
-
-    items = query.all()
-    categories = db.session.query(RentalItem.category).distinct().all()
-    categories = [cat[0] for cat in categories]
-
-    return render_template('items.html', items=items, search=search, category=category, location=location,
-                           categories=categories)
-
-
-@app.route('/add-item', methods=['GET', 'POST'])
-@login_required
-def add_item():
-    if request.method == 'POST':
-        title = request.form['title']
-        description = request.form['description']
-        price = float(request.form['price'])
-        location = request.form['location']
-        category = request.form['category']
-
-        # Handle image upload
-        image_filename = None
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename != '':
-                image_filename = save_image(file)
-                if not image_filename:
-                    flash('Invalid image file. Please upload PNG, JPG, or GIF.', 'error')
-                    return render_template('add_item.html')
-
-        new_item = RentalItem(
-            title=title,
-            description=description,
-            price=price,
-            location=location,
-            category=category,
-            image_filename=image_filename,
-            owner_id=current_user.id
-        )
-
-        db.session.add(new_item)
-        db.session.commit()
-
-        flash('Item listed successfully!', 'success')
-        return redirect(url_for('items'))
-
-    return render_template('add_item.html')
-
-
-@app.route('/delete-item/<int:item_id>', methods=['DELETE'])
-@login_required
-def delete_item(item_id):
-    item = RentalItem.query.get_or_404(item_id)
-
-    if item.owner_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized'}), 403
-
-    if item.image_filename:
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], item.image_filename)
-        thumb_path = os.path.join(app.config['UPLOAD_FOLDER'], f"thumb_{item.image_filename}")
-
-        try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-            if os.path.exists(thumb_path):
-                os.remove(thumb_path)
-        except Exception as e:
-            print(f"Error deleting image files: {e}")
-
-    db.session.delete(item)
-    db.session.commit()
-
-    return jsonify({'success': True, 'message': 'Item deleted successfully'})
-
-
-@app.route('/dashboard')
-@login_required
-def dashboard():
-    total_rentals = Rental.query.filter_by(renter_id=current_user.id).count()
-    active_bookings = Rental.query.filter(
-        Rental.renter_id == current_user.id,
-        Rental.status.in_(['approved', 'rented'])
-    ).count()
-
-    completed_payments = Payment.query.join(Rental).filter(
-        Rental.renter_id == current_user.id,
-        Payment.status == 'completed'
-    ).count()
-
-    my_items = RentalItem.query.filter_by(owner_id=current_user.id).count()
-    recent_rentals = Rental.query.filter_by(renter_id=current_user.id).order_by(Rental.created_at.desc()).limit(5).all()
-
-    return render_template('dashboard.html',
-                           total_rentals=total_rentals,
-                           active_bookings=active_bookings,
-                           completed_payments=completed_payments,
-                           my_items=my_items,
-                           recent_rentals=recent_rentals)
-
-
-@app.route('/rent/<int:item_id>', methods=['GET', 'POST'])
-@login_required
-def rent_item(item_id):
-    item = RentalItem.query.get_or_404(item_id)
-
-    if request.method == 'POST':
-        try:
-            # Parse dates without time components
-            start_date_str = request.form['start_date']
-            end_date_str = request.form['end_date']
-
-            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
-
-            # Validate date range
-            if start_date >= end_date:
-                flash('End date must be after start date.', 'error')
-                return redirect(url_for('rent_item', item_id=item_id))
-
-            if start_date < datetime.now().date():
-                flash('Start date cannot be in the past.', 'error')
-                return redirect(url_for('rent_item', item_id=item_id))
-
-            # Check if dates are available
-            if not is_date_range_available(item_id, start_date, end_date):
-                flash('Selected dates are not available. Please choose different dates.', 'error')
-                return redirect(url_for('rent_item', item_id=item_id))
-
-            # FIX: Calculate days to match frontend (include both start and end days)
-            days = (end_date - start_date).days + 1  # Include both start and end days
-
-            if days < 1:
-                flash('Rental period must be at least 1 day', 'error')
-                return redirect(url_for('rent_item', item_id=item_id))
-
-            total_price = item.price * days
-
-            # Create rental with datetime objects (set time to beginning of day)
-            new_rental = Rental(
-                item_id=item_id,
-                renter_id=current_user.id,
-                start_date=datetime.combine(start_date, datetime.min.time()),
-                end_date=datetime.combine(end_date, datetime.min.time()),
-                total_price=total_price
-            )
-
-            db.session.add(new_rental)
-            db.session.commit()
-
-            # Create blocked dates for the rental period
-            new_rental.create_blocked_dates()
-            db.session.commit()
-
-            flash('Rental request submitted successfully! Please proceed to payment.', 'success')
-            return redirect(url_for('payment', rental_id=new_rental.id))
-
-        except ValueError as e:
-            flash('Invalid date format. Please select valid dates.', 'error')
-            return redirect(url_for('rent_item', item_id=item_id))
-
-    # Get available dates for the calendar
-    available_dates = get_available_dates(item_id)
-    today = datetime.now().date().isoformat()
-
-    return render_template('rent_item.html', item=item, available_dates=available_dates, today=today)
-def is_date_range_available(item_id, start_date, end_date):
-    """Check if a date range is available for rental"""
-    conflicting_dates = BlockedDate.query.filter(
-        BlockedDate.item_id == item_id,
-        BlockedDate.date >= start_date,
-        BlockedDate.date <= end_date
-    ).first()
-
-    return conflicting_dates is None
-
-
-def get_available_dates(item_id, months=6):
-    """Get available dates for the next few months"""
-    start_date = datetime.now().date()
-    end_date = start_date + timedelta(days=30 * months)
-
-    blocked_dates = BlockedDate.query.filter(
-        BlockedDate.item_id == item_id,
-        BlockedDate.date >= start_date,
-        BlockedDate.date <= end_date
-    ).all()
-
-    blocked_dates_set = {bd.date for bd in blocked_dates}
-
-    available_dates = []
-    current_date = start_date
-
-    while current_date <= end_date:
-        if current_date not in blocked_dates_set:
-            available_dates.append(current_date.isoformat())
-        current_date += timedelta(days=1)
-
-    return available_dates
-
-
-@app.route('/my-rentals')
-@login_required
-def my_rentals():
-    rentals = Rental.query.filter_by(renter_id=current_user.id).order_by(Rental.created_at.desc()).all()
-    return render_template('my_rentals.html', rentals=rentals)
-
-
-@app.route('/my-listings')
-@login_required
-def my_listings():
-    items = RentalItem.query.filter_by(owner_id=current_user.id).order_by(RentalItem.created_at.desc()).all()
-    return render_template('my_listings.html', items=items)
-
-
-@app.route('/payment/<int:rental_id>', methods=['GET', 'POST'])
-@login_required
-def payment(rental_id):
-    rental = Rental.query.get_or_404(rental_id)
-
-    if rental.renter_id != current_user.id:
-        flash('You are not authorized to view this payment.', 'error')
-        return redirect(url_for('my_rentals'))
-
-    if request.method == 'POST':
-        method = request.form['payment_method']
-
-        new_payment = Payment(
-            rental_id=rental_id,
-            amount=rental.total_price,
-            method=method,
-            status='completed',
-            transaction_id=f'TXN-{rental_id}-{datetime.utcnow().strftime("%Y%m%d%H%M%S")}'
-        )
-
-        rental.status = 'approved'
-
-        # Blocked dates are already created, just update the reason if needed
-        BlockedDate.query.filter_by(rental_id=rental_id).update({'reason': 'rented'})
-
-        db.session.add(new_payment)
-        db.session.commit()
-
-        flash('Payment completed successfully! Your rental has been approved.', 'success')
-        return redirect(url_for('my_rentals'))
-
-    return render_template('payment.html', rental=rental)
-
-
-@app.route('/cancel-rental/<int:rental_id>')
-@login_required
-def cancel_rental(rental_id):
-    """Cancel a rental and free up the dates"""
-    rental = Rental.query.get_or_404(rental_id)
-
-    if rental.renter_id != current_user.id:
-        flash('You are not authorized to cancel this rental.', 'error')
-        return redirect(url_for('my_rentals'))
-
-    # Remove blocked dates
-    rental.remove_blocked_dates()
-
-    # Update rental status
-    rental.status = 'cancelled'
-
-    # Also cancel associated payment if exists
-    if rental.payment:
-        rental.payment.status = 'refunded'
-
-    db.session.commit()
-
-    flash('Rental cancelled successfully.', 'success')
-    return redirect(url_for('my_rentals'))
-
-
-@app.route('/update-rental-status/<int:rental_id>/<status>')
-@login_required
-def update_rental_status(rental_id, status):
-    rental = Rental.query.get_or_404(rental_id)
-
-    if rental.item.owner_id != current_user.id:
-        flash('You are not authorized to update this rental.', 'error')
-        return redirect(url_for('dashboard'))
-
-    rental.status = status
-    db.session.commit()
-
-    flash(f'Rental status updated to {status}.', 'success')
-    return redirect(url_for('dashboard'))
-
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        username = request.form['username']
-        password = request.form['password']
-
-        user = User.query.filter_by(username=username).first()
-
-        if user and check_password_hash(user.password, password):
-            login_user(user)
-            flash('Login successful!', 'success')
-            next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('dashboard'))
-        else:
-            flash('Invalid username or password.', 'error')
-
-    return render_template('login.html')
-
-
-@app.route('/item/<int:item_id>/availability')
-def item_availability(item_id):
-    """Get available dates for an item"""
-    item = RentalItem.query.get_or_404(item_id)
-
-    # Get blocked dates for the next 6 months
-    start_date = datetime.now().date()
-    end_date = start_date + timedelta(days=180)
-
-    blocked_dates = BlockedDate.query.filter(
-        BlockedDate.item_id == item_id,
-        BlockedDate.date >= start_date,
-        BlockedDate.date <= end_date
-    ).all()
-
-    blocked_dates_list = [bd.date.isoformat() for bd in blocked_dates]
-
-    return jsonify({
-        'item_id': item_id,
-        'item_title': item.title,
-        'blocked_dates': blocked_dates_list
-    })
-
-
-@app.route('/manage-availability/<int:item_id>')
-@login_required
-def manage_availability(item_id):
-    """Page for owners to manage item availability"""
-    item = RentalItem.query.get_or_404(item_id)
-
-    if item.owner_id != current_user.id:
-        flash('You are not authorized to manage this item.', 'error')
-        return redirect(url_for('dashboard'))
-
-    # Get existing blocked dates
-    blocked_dates = BlockedDate.query.filter_by(item_id=item_id).all()
-
-    return render_template('manage_availability.html',
-                           item=item,
-                           blocked_dates=blocked_dates)
-
-
-@app.route('/block-dates/<int:item_id>', methods=['POST'])
-@login_required
-def block_dates(item_id):
-    """Block multiple dates at once"""
-    item = RentalItem.query.get_or_404(item_id)
-
-    if item.owner_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized'}), 403
-
-    data = request.get_json()
-    dates = data.get('dates', [])
-    reason = data.get('reason', 'owner_blocked')
-
-    blocked_count = 0
-    for date_str in dates:
-        try:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-            # Check if date is already blocked
-            existing_block = BlockedDate.query.filter_by(
-                item_id=item_id,
-                date=date
-            ).first()
-
-            if not existing_block:
-                blocked_date = BlockedDate(
-                    item_id=item_id,
-                    date=date,
-                    reason=reason
-                )
-                db.session.add(blocked_date)
-                blocked_count += 1
-
-        except ValueError:
-            continue
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'message': f'Successfully blocked {blocked_count} dates',
-        'blocked_count': blocked_count
-    })
-
-
-@app.route('/unblock-dates/<int:item_id>', methods=['POST'])
-@login_required
-def unblock_dates(item_id):
-    """Unblock multiple dates at once"""
-    item = RentalItem.query.get_or_404(item_id)
-
-    if item.owner_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized'}), 403
-
-    data = request.get_json()
-    dates = data.get('dates', [])
-
-    unblocked_count = 0
-    for date_str in dates:
-        try:
-            date = datetime.strptime(date_str, '%Y-%m-%d').date()
-
-            # Find and remove owner-blocked dates only
-            blocked_date = BlockedDate.query.filter_by(
-                item_id=item_id,
-                date=date,
-                rental_id=None
-            ).first()
-
-            if blocked_date:
-                db.session.delete(blocked_date)
-                unblocked_count += 1
-
-        except ValueError:
-            continue
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'message': f'Successfully unblocked {unblocked_count} dates',
-        'unblocked_count': unblocked_count
-    })
-
-
-@app.route('/clear-all-blocks/<int:item_id>', methods=['POST'])
-@login_required
-def clear_all_blocks(item_id):
-    """Clear all owner-blocked dates"""
-    item = RentalItem.query.get_or_404(item_id)
-
-    if item.owner_id != current_user.id:
-        return jsonify({'success': False, 'message': 'Not authorized'}), 403
-
-    # Only delete owner-blocked dates (not rental bookings)
-    deleted_count = BlockedDate.query.filter_by(
-        item_id=item_id,
-        rental_id=None
-    ).delete()
-
-    db.session.commit()
-
-    return jsonify({
-        'success': True,
-        'message': f'All owner-blocked dates cleared',
-        'deleted_count': deleted_count
-    })
-
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        username = request.form['username']
-        email = request.form['email']
-        password = request.form['password']
-        confirm_password = request.form['confirm_password']
-        phone = request.form.get('phone', '')
-
-        if password != confirm_password:
-            flash('Passwords do not match.', 'error')
-            return render_template('register.html')
-
-        if User.query.filter_by(username=username).first():
-            flash('Username already exists.', 'error')
-            return render_template('register.html')
-
-        if User.query.filter_by(email=email).first():
-            flash('Email already registered.', 'error')
-            return render_template('register.html')
-
-        hashed_password = generate_password_hash(password, method='sha256')
-
-        new_user = User(
-            username=username,
-            email=email,
-            password=hashed_password,
-            phone=phone
-        )
-
-        db.session.add(new_user)
-        db.session.commit()
-
-        flash('Registration successful! Please login.', 'success')
-        return redirect(url_for('login'))
-
-    return render_template('register.html')
-
-
-@app.route('/logout')
-@login_required
-def logout():
-    logout_user()
-    flash('You have been logged out.', 'success')
-    return redirect(url_for('index'))
+    return send_cacheable_file(current_app.config['UPLOAD_FOLDER'], filename, immutable=True)
+
+
+def create_app(config=None):
+    """Build the application; `flask --app app` and wsgi.py both call this.
+
+    config overrides the defaults below, which mostly come from the environment.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'cebu-rental-hub-secret-key-2023')
+    # Werkzeug method string with its work factor; logins rehash passwords stored with another one.
+    # PASSWORD_HASH_WORKERS > 0 hashes on a pool of that many threads instead of the request thread.
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # SQLite settings for several workers sharing one file: WAL lets reads run during a
+    # write, and busy_timeout makes a writer wait for the lock instead of failing with
+    # "database is locked". synchronous=NORMAL is durable enough in WAL mode.
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    app.config['ITEMS_PER_PAGE'] = int(os.environ.get('ITEMS_PER_PAGE', 24))
+    app.config['MAX_ITEMS_PER_PAGE'] = 100
+    app.config['SEARCH_INDEX_ENABLED'] = True
+    app.config['LOCATION_INDEX_ENABLED'] = True  # R*Tree of item coordinates for ?within= searches
+    app.config['MAX_SEARCH_RADIUS_KM'] = 50
+    app.config['CATALOG_FACETS_ENABLED'] = True  # facet counts and popularity from trigger-kept tables
+    app.config['USER_STATS_ENABLED'] = True  # dashboard counters from user_stats instead of counting
+    app.config['MAX_DATES_PER_REQUEST'] = 1000  # days one block/unblock request may name
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 2000))  # rows fetched per batch
+
+    # Raw uploads wait here, outside static/, until an image worker has resized them
+    app.config['RAW_UPLOAD_FOLDER'] = os.path.join(app.instance_path, 'raw_uploads')
+    app.config['IMAGE_PROCESSING_ASYNC'] = os.environ.get('IMAGE_PROCESSING_ASYNC', '1') == '1'
+    app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+    app.config['IMAGE_MAX_ATTEMPTS'] = 3
+    # Responsive variants generated for every upload and offered through srcset
+    app.config['IMAGE_WIDTHS'] = [int(w) for w in os.environ.get('IMAGE_WIDTHS', '300,600,1200').split(',')]
+    app.config['IMAGE_FORMATS'] = ['webp', 'jpeg']
+
+    # Payments are charged on PAYMENT_WORKERS threads; gateway errors are retried after
+    # PAYMENT_RETRY_DELAY seconds, doubling each time. Webhooks must be signed with the secret,
+    # which has no default: without one /payments/webhook answers 404.
+    app.config['PAYMENT_PROCESSING_ASYNC'] = os.environ.get('PAYMENT_PROCESSING_ASYNC', '1') == '1'
+    app.config['PAYMENT_WORKERS'] = int(os.environ.get('PAYMENT_WORKERS', 4))
+    app.config['PAYMENT_MAX_ATTEMPTS'] = 3
+    app.config['PAYMENT_RETRY_DELAY'] = float(os.environ.get('PAYMENT_RETRY_DELAY', 1))
+    app.config['PAYMENT_WEBHOOK_SECRET'] = os.environ.get('PAYMENT_WEBHOOK_SECRET')
+    # A payment still queued this long after it was queued was lost, e.g. by a restart; the
+    # expiry sweeper queues it again
+    app.config['PAYMENT_STALE_MINUTES'] = int(os.environ.get('PAYMENT_STALE_MINUTES', 10))
+
+    # Unpaid rentals hold their days for RENTAL_HOLD_MINUTES; each worker sweeps for expired
+    # holds every RENTAL_EXPIRY_INTERVAL seconds (0 leaves it to `flask expire-rentals`)
+    app.config['RENTAL_HOLD_MINUTES'] = int(os.environ.get('RENTAL_HOLD_MINUTES', 30))
+    app.config['RENTAL_EXPIRY_INTERVAL'] = int(os.environ.get('RENTAL_EXPIRY_INTERVAL', 60))
+    app.config['RENTAL_EXPIRY_BATCH_SIZE'] = 2000  # rentals per transaction
+    # A payment pending or processing this long no longer holds its rental's days
+    app.config['PAYMENT_CONFIRM_MINUTES'] = int(os.environ.get('PAYMENT_CONFIRM_MINUTES', 60))
+
+    # Per-item availability calendars; set AVAILABILITY_CACHE_SIZE=0 to disable
+    app.config['AVAILABILITY_CACHE_SIZE'] = int(os.environ.get('AVAILABILITY_CACHE_SIZE', 1024))
+    app.config['AVAILABILITY_CACHE_TTL'] = int(os.environ.get('AVAILABILITY_CACHE_TTL', 300))
+    # Pages served to anonymous visitors; PAGE_CACHE_TTL bounds how stale another worker's copy can be
+    app.config['PAGE_CACHE_SIZE'] = int(os.environ.get('PAGE_CACHE_SIZE', 512))
+    app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))
+    # Seconds the home page shows the same featured sample
+    app.config['FEATURED_REFRESH'] = int(os.environ.get('FEATURED_REFRESH', 300))
+    # Seconds a worker keeps the gazetteer before reading places another process added
+    app.config['GAZETTEER_REFRESH'] = int(os.environ.get('GAZETTEER_REFRESH', 300))
+
+    # Request, SQL and template timings on /metrics; SERVER_TIMING also sends them in a response header.
+    # /metrics only exists with METRICS_TOKEN set and wants it as 'Authorization: Bearer <token>'.
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
+
+    app.config.update(config or {})
+    # Each worker process keeps its own connection pool; chosen for the final database URL
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['RAW_UPLOAD_FOLDER'], exist_ok=True)
+
+    # Any backend with get/set/stats can replace this, e.g. one shared by several workers
+    app.extensions['availability_cache'] = MemoryCache(maxsize=app.config['AVAILABILITY_CACHE_SIZE'],
+                                                       ttl=app.config['AVAILABILITY_CACHE_TTL'])
+    app.extensions['page_cache'] = MemoryCache(maxsize=app.config['PAGE_CACHE_SIZE'],
+                                               ttl=app.config['PAGE_CACHE_TTL'])
+    app.extensions['featured_cache'] = MemoryCache(maxsize=1, ttl=app.config['FEATURED_REFRESH'])
+    app.extensions['gazetteer_cache'] = MemoryCache(maxsize=1, ttl=app.config['GAZETTEER_REFRESH'])
+    # Replace with a PaymentGateway of the real provider; the fake one approves every charge
+    app.extensions['payment_gateway'] = FakeGateway()
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', functools.partial(set_sqlite_pragmas, app.config))
+    if app.config['METRICS_ENABLED']:
+        metrics.init_app(app, db)
 
+    app.url_defaults(fingerprint_static_url)
+    app.view_functions['static'] = static_file
+    app.add_url_rule('/uploads/<filename>', 'uploaded_file', uploaded_file)
 
-@app.route('/about')
-def about():
-    return render_template('about.html')
+    # Make the availability helpers available to templates
+    @app.context_processor
+    def utility_processor():
+        return dict(get_available_dates_count=get_available_dates_count)
 
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(owner_bp)
+    app.register_blueprint(renter_bp)
+    app.register_blueprint(admin_bp)
+    return app
 
-@app.route('/contact', methods=['GET', 'POST'])
-def contact():
-    if request.method == 'POST':
-        name = request.form['name']
-        email = request.form['email']
-        message = request.form['message']
 
-        flash('Thank you for your message! We will get back to you soon.', 'success')
-        return redirect(url_for('contact'))
+def check_database(app):
+    """Make sure the schema exists before a WSGI server starts its workers.
 
-    return render_template('contact.html')
+    Workers do not create tables, so several of them starting at once never race
+    on DDL: run `flask --app app upgrade-db` before starting them.
+    """
+    with app.app_context():
+        if not db.inspect(db.engine).has_table(RentalItem.__tablename__):
+            raise RuntimeError("The database has no tables, run 'flask --app app upgrade-db' first")
+        # Preforking servers copy this process: let every worker open its own connections
+        db.engine.dispose()
 
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+        create_catalog_facets()
+        create_search_index()
+        create_location_index()
+        create_user_stats()
+    app.run(debug=True)
@@ -0,0 +1,265 @@
+"""Availability service: blocked days are stored as inclusive date intervals,
+so every lookup below is a single range query on BlockedPeriod.
+"""
+import base64
+import bisect
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BlockedPeriod, Rental, lock_item_availability
+
+
+def validate_rental_dates(start_date_str, end_date_str):
+    """Validate rental dates and return (success, start_date, end_date, error_message)"""
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+
+        today = datetime.now().date()
+
+        if start_date < today:
+            return False, None, None, 'Start date cannot be in the past.'
+
+        if start_date >= end_date:
+            return False, None, None, 'End date must be after start date.'
+
+        return True, start_date, end_date, None
+
+    except ValueError:
+        return False, None, None, 'Invalid date format.'
+
+
+def _overlapping_periods(item_id, start_date, end_date):
+    return BlockedPeriod.query.filter(
+        BlockedPeriod.item_id == item_id,
+        BlockedPeriod.end_date >= start_date,
+        BlockedPeriod.start_date <= end_date
+    )
+
+
+def get_blocked_periods(item_id, start_date, end_date):
+    """Get blocked periods of an item overlapping the given date range"""
+    return _overlapping_periods(item_id, start_date, end_date).order_by(BlockedPeriod.start_date).all()
+
+
+def is_date_range_available(item_id, start_date, end_date):
+    """Check if a date range is available for rental"""
+    return _overlapping_periods(item_id, start_date, end_date).first() is None
+
+
+def reserve_item_dates(item_id, renter_id, start_date, end_date, total_price):
+    """Create a pending rental and block its days, all in one transaction.
+
+    Returns the committed rental, or None if any of the days is already blocked.
+    """
+    lock_item_availability(item_id)
+    if not is_date_range_available(item_id, start_date, end_date):
+        db.session.rollback()
+        return None
+
+    rental = Rental(
+        item_id=item_id,
+        renter_id=renter_id,
+        start_date=datetime.combine(start_date, datetime.min.time()),
+        end_date=datetime.combine(end_date, datetime.min.time()),
+        total_price=total_price
+    )
+    db.session.add(rental)
+    db.session.flush()
+    rental.create_blocked_dates()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The overlap trigger caught a booking that bypassed the lock
+        db.session.rollback()
+        return None
+    return rental
+
+
+def blocked_bitmap(start_date, days, periods):
+    """Bitset of the blocked days among the `days` days from start_date.
+
+    Day i is blocked when bit (i & 7) of byte (i >> 3) is set.
+    """
+    bitmap = bytearray((days + 7) // 8)
+    for period in periods:
+        first = max((period.start_date - start_date).days, 0)
+        last = min((period.end_date - start_date).days, days - 1)
+        for day in range(first, last + 1):
+            bitmap[day >> 3] |= 1 << (day & 7)
+    return bitmap
+
+
+def bitmap_dates(start_date, days, bitmap, blocked=True):
+    """ISO dates of the blocked (or available) days of a bitmap"""
+    return [
+        (start_date + timedelta(days=day)).isoformat()
+        for day in range(days)
+        if bool(bitmap[day >> 3] & (1 << (day & 7))) == blocked
+    ]
+
+
+def get_available_dates(item_id, months=6, periods=None):
+    """Get available dates for the next few months"""
+    start_date = datetime.now().date()
+    days = 30 * months + 1
+
+    if periods is None:
+        periods = get_blocked_periods(item_id, start_date, start_date + timedelta(days=days - 1))
+
+    return bitmap_dates(start_date, days, blocked_bitmap(start_date, days, periods), blocked=False)
+
+
+def item_calendar(item, months=6):
+    """Blocked ranges and blocked-day bitmap of an item for the next few months.
+
+    Cached under the item's availability_version, which every change to its
+    blocked periods bumps, so workers never serve a calendar that has changed.
+    """
+    today = datetime.now().date()
+    key = f"calendar:{item.id}:{item.availability_version or 0}:{today.isoformat()}:{months}"
+    cache = current_app.extensions['availability_cache']
+
+    calendar = cache.get(key)
+    if calendar is None:
+        days = 30 * months + 1
+        periods = get_blocked_periods(item.id, today, today + timedelta(days=days - 1))
+        calendar = {
+            'start': today.isoformat(),
+            'days': days,
+            'blocked_bitmap': base64.b64encode(blocked_bitmap(today, days, periods)).decode('ascii'),
+            'blocked_ranges': [
+                {'from': p.start_date.isoformat(), 'to': p.end_date.isoformat(), 'reason': p.reason}
+                for p in periods
+            ],
+        }
+        cache.set(key, calendar)
+    return calendar
+
+
+def get_available_dates_count(item_id, months=6, periods=None):
+    """Get count of available dates for the next few months"""
+    start_date = datetime.now().date()
+    days = 30 * months + 1
+
+    if periods is None:
+        periods = get_blocked_periods(item_id, start_date, start_date + timedelta(days=days - 1))
+
+    return days - int.from_bytes(blocked_bitmap(start_date, days, periods), 'little').bit_count()
+
+
+def group_consecutive_dates(dates):
+    """Collapse an iterable of dates into sorted (start, end) runs of consecutive days"""
+    runs = []
+    for current_date in sorted(set(dates)):
+        if runs and current_date == runs[-1][1] + timedelta(days=1):
+            runs[-1][1] = current_date
+        else:
+            runs.append([current_date, current_date])
+    return [(start, end) for start, end in runs]
+
+
+def merge_periods(ranges):
+    """Merge overlapping or adjacent (start, end) ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def _dates_within(dates, start_date, end_date):
+    """Slice of the sorted dates that fall in the inclusive range"""
+    return dates[bisect.bisect_left(dates, start_date):bisect.bisect_right(dates, end_date)]
+
+
+def block_item_dates(item_id, dates, reason='owner_blocked'):
+    """Block the given days for an item, skipping days that are already blocked.
+
+    New days are coalesced with adjacent owner blocks of the same reason so the
+    item keeps as few intervals as possible. Runs a fixed number of statements
+    however many days are given. Returns {date: 'blocked', 'already_blocked' or 'booked'}.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    lock_item_availability(item_id)
+    # One query finds both the days that are taken and the periods the new days touch
+    periods = _overlapping_periods(item_id, dates[0] - timedelta(days=1), dates[-1] + timedelta(days=1)).all()
+
+    results = dict.fromkeys(dates, 'blocked')
+    for period in periods:
+        for taken in _dates_within(dates, period.start_date, period.end_date):
+            results[taken] = 'booked' if period.rental_id else 'already_blocked'
+    new_dates = [d for d in dates if results[d] == 'blocked']
+    if not new_dates:
+        return results
+
+    # Neighbouring owner blocks with the same reason get folded into the new intervals
+    neighbours = [
+        p for p in periods
+        if p.rental_id is None and p.reason == reason
+        and _dates_within(new_dates, p.start_date - timedelta(days=1), p.end_date + timedelta(days=1))
+    ]
+    ranges = group_consecutive_dates(new_dates) + [(p.start_date, p.end_date) for p in neighbours]
+
+    # Delete before inserting, merged periods may reuse a neighbour's start day
+    if neighbours:
+        db.session.execute(db.delete(BlockedPeriod).where(BlockedPeriod.id.in_([p.id for p in neighbours])))
+    db.session.execute(db.insert(BlockedPeriod), [
+        {'item_id': item_id, 'start_date': start, 'end_date': end, 'reason': reason}
+        for start, end in merge_periods(ranges)
+    ])
+
+    return results
+
+
+def unblock_item_dates(item_id, dates):
+    """Unblock the given days for an item, splitting owner blocks where needed.
+
+    Rental bookings are never touched. Runs a fixed number of statements however
+    many days are given. Returns {date: 'unblocked', 'not_blocked' or 'booked'}.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    lock_item_availability(item_id)
+    periods = _overlapping_periods(item_id, dates[0], dates[-1]).all()
+
+    results = dict.fromkeys(dates, 'not_blocked')
+    removed_ids = []
+    remaining = []
+    for period in periods:
+        removed = _dates_within(dates, period.start_date, period.end_date)
+        if not removed:
+            continue
+        if period.rental_id:
+            results.update(dict.fromkeys(removed, 'booked'))
+            continue
+        results.update(dict.fromkeys(removed, 'unblocked'))
+        removed_ids.append(period.id)
+
+        # Keep whatever is left of the period on either side of the removed days
+        cursor = period.start_date
+        for removed_date in removed:
+            if removed_date > cursor:
+                remaining.append((cursor, removed_date - timedelta(days=1), period.reason))
+            cursor = removed_date + timedelta(days=1)
+        if cursor <= period.end_date:
+            remaining.append((cursor, period.end_date, period.reason))
+
+    if removed_ids:
+        db.session.execute(db.delete(BlockedPeriod).where(BlockedPeriod.id.in_(removed_ids)))
+    if remaining:
+        db.session.execute(db.insert(BlockedPeriod), [
+            {'item_id': item_id, 'start_date': start, 'end_date': end, 'reason': reason}
+            for start, end, reason in remaining
+        ])
+
+    return results
@@ -0,0 +1,158 @@
+"""Compare per-day BlockedDate rows with the interval-based BlockedPeriod storage.
+
+Seeds a scratch SQLite database with long bookings stored both ways and times
+inserting them, checking a date range and building the 6-month calendar.
+
+Usage: python benchmarks/bench_availability.py [--items 200] [--bookings 4] [--length 90]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from seed_data import use_scratch_database
+
+use_scratch_database('bench_availability')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User, RentalItem, BlockedPeriod, Rental  # noqa: E402
+from availability import is_date_range_available, get_available_dates  # noqa: E402
+
+app = create_app()
+
+
+class LegacyBlockedDate(db.Model):
+    """The old one-row-per-day layout, kept here only for comparison"""
+    __tablename__ = 'blocked_date'
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('rental_item.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(100))
+    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=True)
+
+
+def legacy_create_blocked_dates(rental):
+    current_date = rental.start_date.date()
+    while current_date <= rental.end_date.date():
+        db.session.add(LegacyBlockedDate(item_id=rental.item_id, date=current_date,
+                                         reason='rented', rental_id=rental.id))
+        current_date += timedelta(days=1)
+
+
+def legacy_is_date_range_available(item_id, start_date, end_date):
+    return LegacyBlockedDate.query.filter(
+        LegacyBlockedDate.item_id == item_id,
+        LegacyBlockedDate.date >= start_date,
+        LegacyBlockedDate.date <= end_date
+    ).first() is None
+
+
+def legacy_get_available_dates(item_id, months=6):
+    start_date = datetime.now().date()
+    end_date = start_date + timedelta(days=30 * months)
+    blocked = {bd.date for bd in LegacyBlockedDate.query.filter(
+        LegacyBlockedDate.item_id == item_id,
+        LegacyBlockedDate.date >= start_date,
+        LegacyBlockedDate.date <= end_date
+    ).all()}
+    available = []
+    current_date = start_date
+    while current_date <= end_date:
+        if current_date not in blocked:
+            available.append(current_date.isoformat())
+        current_date += timedelta(days=1)
+    return available
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def seed(args):
+    owner = User(username='owner', email='owner@example.com', password='x')
+    renter = User(username='renter', email='renter@example.com', password='x')
+    db.session.add_all([owner, renter])
+    db.session.flush()
+
+    items = [RentalItem(title=f'Item {i}', description='bench', price=100, location='Cebu City',
+                        category='Tools', owner_id=owner.id) for i in range(args.items)]
+    db.session.add_all(items)
+    db.session.flush()
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    rentals = []
+    for item in items:
+        for n in range(args.bookings):
+            start = today + timedelta(days=n * (args.length + 7))
+            rentals.append(Rental(item_id=item.id, renter_id=renter.id, start_date=start,
+                                  end_date=start + timedelta(days=args.length - 1), total_price=0))
+    db.session.add_all(rentals)
+    db.session.commit()
+    return [item.id for item in items], rentals
+
+
+def insert_all(create, rentals):
+    for rental in rentals:
+        create(rental)
+    db.session.commit()
+
+
+def lookups(check, item_ids, ranges):
+    for item_id, (start, end) in zip(item_ids, ranges):
+        check(item_id, start, end)
+
+
+def calendars(build, item_ids):
+    for item_id in item_ids:
+        build(item_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=4, help='bookings per item')
+    parser.add_argument('--length', type=int, default=90, help='days per booking')
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        item_ids, rentals = seed(args)
+
+        rng = random.Random(42)
+        today = datetime.now().date()
+        sample_ids = [rng.choice(item_ids) for _ in range(args.lookups)]
+        ranges = []
+        for _ in range(args.lookups):
+            start = today + timedelta(days=rng.randrange(0, 365))
+            ranges.append((start, start + timedelta(days=rng.randrange(1, 14))))
+
+        results = {
+            'legacy per-day rows': (
+                timed(insert_all, legacy_create_blocked_dates, rentals),
+                LegacyBlockedDate.query.count(),
+                timed(lookups, legacy_is_date_range_available, sample_ids, ranges),
+                timed(calendars, legacy_get_available_dates, item_ids),
+            ),
+            'blocked periods': (
+                timed(insert_all, Rental.create_blocked_dates, rentals),
+                BlockedPeriod.query.count(),
+                timed(lookups, is_date_range_available, sample_ids, ranges),
+                timed(calendars, get_available_dates, item_ids),
+            ),
+        }
+
+    print(f'{len(rentals)} bookings of {args.length} days across {args.items} items')
+    print(f"{'storage':<22}{'insert s':>10}{'rows':>10}{'range check ms':>16}{'calendar ms':>14}")
+    for name, (insert_s, rows, lookup_s, calendar_s) in results.items():
+        print(f'{name:<22}{insert_s:>10.3f}{rows:>10}'
+              f'{lookup_s / args.lookups * 1000:>16.3f}{calendar_s / len(item_ids) * 1000:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Payload size and client lookup time of the availability formats.
+
+Blocks a growing share of the 181 calendar days on a few items and compares
+/item/<id>/availability in the default format (ISO date list and ranges)
+with ?format=bitmap, raw and gzipped. If node is installed, it also times
+the client-side "is this day blocked?" lookups that the calendar and the
+date validation make. It compares the old linear scans over blocked_dates
+with the availabilityLookup() bitmap from static/js/script.js.
+
+Usage: python benchmarks/bench_availability_format.py [--densities 0 10 50 100] [--lookups 200000]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+from datetime import date, timedelta
+
+from seed_data import seed, use_scratch_database
+
+use_scratch_database('bench_availability_format')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from availability import block_item_dates  # noqa: E402
+
+app = create_app()
+
+# Times each lookup style over every day of the calendar window, repeatedly
+NODE_BENCHMARK = r'''
+const {listData, bitmapData, lookups} = JSON.parse(process.argv[1]);
+LOOKUP_SOURCE
+const dateObjects = listData.blocked_dates.map(d => new Date(d));
+const strings = listData.blocked_dates;
+const isBlocked = availabilityLookup(bitmapData);
+const days = [];
+const [y, m, d] = bitmapData.start.split('-').map(Number);
+for (let i = 0; i < bitmapData.days; i++) days.push(new Date(y, m - 1, d + i));
+
+// The old code keyed days with toISOString(), which is a day early east of UTC;
+// key by local calendar day here so every style gives the same answers
+function localIso(day) {
+    const pad = n => String(n).padStart(2, '0');
+    return `${day.getFullYear()}-${pad(day.getMonth() + 1)}-${pad(day.getDate())}`;
+}
+
+function time(fn) {
+    let hits = 0;
+    const start = process.hrtime.bigint();
+    for (let n = 0; n < lookups; n++) if (fn(days[n % days.length])) hits++;
+    return [Number(process.hrtime.bigint() - start) / lookups, hits];
+}
+console.log(JSON.stringify({
+    'Date list .some()': time(day => {
+        const s = localIso(day);
+        return dateObjects.some(b => b.toISOString().split('T')[0] === s);
+    }),
+    'string list .includes()': time(day => strings.includes(localIso(day))),
+    'bitmap lookup': time(day => isBlocked(day)),
+}));
+'''
+
+
+def lookup_source():
+    with open(os.path.join(ROOT, 'static', 'js', 'script.js')) as f:
+        script = f.read()
+    return re.search(r'^function availabilityLookup\(data\) \{.*?^\}', script, re.S | re.M).group(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--densities', type=int, nargs='+', default=[0, 10, 50, 100])
+    parser.add_argument('--lookups', type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    with app.app_context():
+        db.create_all()
+        seed(len(args.densities), rentals_per_item=0)
+        item_ids = [item.id for item in RentalItem.query.order_by(RentalItem.id)]
+        today = date.today()
+        for item_id, density in zip(item_ids, args.densities):
+            days = [today + timedelta(days=n) for n in range(181) if rng.random() * 100 < density]
+            block_item_dates(item_id, days)
+        db.session.commit()
+
+    node = shutil.which('node')
+    client = app.test_client()
+    print(f"{'blocked %':>10}{'list B':>9}{'gzip':>7}{'bitmap B':>10}{'gzip':>7}", end='')
+    print('   ns per lookup: .some() / .includes() / bitmap' if node else '   (node not found, lookups skipped)')
+    for item_id, density in zip(item_ids, args.densities):
+        list_body = client.get(f'/item/{item_id}/availability').data
+        bitmap_body = client.get(f'/item/{item_id}/availability?format=bitmap').data
+        row = f'{density:>10}{len(list_body):>9}{len(gzip.compress(list_body)):>7}'
+        row += f'{len(bitmap_body):>10}{len(gzip.compress(bitmap_body)):>7}'
+
+        if node:
+            payload = json.dumps({'listData': json.loads(list_body), 'bitmapData': json.loads(bitmap_body),
+                                  'lookups': args.lookups})
+            output = subprocess.run([node, '-e', NODE_BENCHMARK.replace('LOOKUP_SOURCE', lookup_source()), payload],
+                                    capture_output=True, text=True, check=True).stdout
+            timings = json.loads(output)
+            hits = {result[1] for result in timings.values()}
+            assert len(hits) == 1, f'lookups disagree: {timings}'
+            row += '   ' + ' / '.join(f'{ns:.0f}' for ns, _ in timings.values())
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
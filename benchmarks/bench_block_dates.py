@@ -0,0 +1,92 @@
+"""Cost of blocking and unblocking a year of dates on one item.
+
+Posts to /block-dates and /unblock-dates as the item's owner and reports
+the SQL statements and wall time of each request. The days are sent as a
+list of 365 dates, as one range, and as 365 alternate days. Alternate days
+are the worst case because each one becomes its own interval.
+
+Usage: python benchmarks/bench_block_dates.py [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_block_dates')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, BlockedPeriod, RentalItem  # noqa: E402
+
+app = create_app()
+
+
+def days(start, count, step=1):
+    return [(start + timedelta(days=n * step)).isoformat() for n in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(20, rentals_per_item=0)
+        item = RentalItem.query.first()
+        item_id, owner = item.id, item.owner.username
+        engine = db.engine
+
+    first = date.today() + timedelta(days=1)
+    year = {'from': first.isoformat(), 'to': (first + timedelta(days=364)).isoformat()}
+    two_years = {'from': first.isoformat(), 'to': (first + timedelta(days=729)).isoformat()}
+    steps = [
+        ('block 365 listed days', 'block', {'dates': days(first, 365)}),
+        ('unblock them as a range', 'unblock', {'ranges': [year]}),
+        ('block 365 days as a range', 'block', {'ranges': [year]}),
+        ('unblock 365 listed days', 'unblock', {'dates': days(first, 365)}),
+        ('block 365 alternate days', 'block', {'dates': days(first, 365, step=2)}),
+        ('unblock them as a range', 'unblock', {'ranges': [two_years]}),
+    ]
+
+    client = app.test_client()
+    client.post('/login', data={'username': owner, 'password': PASSWORD})
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    timings = {label: [] for label, _, _ in steps}
+    counts = {}
+    try:
+        for _ in range(args.repeat):
+            for label, action, body in steps:
+                statements.clear()
+                start = time.perf_counter()
+                response = client.post(f'/{action}-dates/{item_id}', json=body)
+                timings[label].append(time.perf_counter() - start)
+                assert response.status_code == 200, response.get_json()
+                result = response.get_json()
+                counts[label] = (len(statements), result[f'{action}ed_count'])
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    with app.app_context():
+        assert BlockedPeriod.query.filter_by(item_id=item_id).count() == 0
+
+    print(f"{'request':<28}{'days':>7}{'statements':>12}{'median ms':>11}")
+    for label, _, _ in steps:
+        statement_count, changed = counts[label]
+        print(f'{label:<28}{changed:>7}{statement_count:>12}{statistics.median(timings[label]) * 1000:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
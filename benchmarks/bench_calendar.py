@@ -0,0 +1,110 @@
+"""Repeated availability calendar loads with and without the calendar cache.
+
+Loads /item/<id>/availability and the /rent/<id> page for a hot set of
+items, first with the cache disabled, then enabled, then enabled with the
+browser revalidating through If-None-Match. Every --write-every loads the
+owner blocks a day on one of the items, which must show up in the next
+response for that item. Reports median latency, throughput and the cache's
+hit/miss counters.
+
+Usage: python benchmarks/bench_calendar.py [--items 200] [--hot 50] [--loads 2000] [--write-every 100]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_calendar')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from cache import MemoryCache  # noqa: E402
+
+app = create_app()
+
+
+def run(args, items, renter, owners, revalidate):
+    rng = random.Random(3)
+    etags = {}
+    latencies = {'availability': [], 'rent page': []}
+    stale = 0
+    day = date.today() + timedelta(days=170)
+
+    start = time.perf_counter()
+    for n in range(args.loads):
+        item_id = rng.choice(items)
+        written = None
+        if n and n % args.write_every == 0:
+            blocked = owners[item_id].post(f'/block-dates/{item_id}', json={'dates': [day.isoformat()]}).get_json()
+            # Earlier modes may have blocked the day already, then nothing changed
+            if blocked['blocked_count']:
+                written = day.isoformat()
+            day -= timedelta(days=1)
+
+        headers = {'If-None-Match': etags[item_id]} if revalidate and item_id in etags else {}
+        request_start = time.perf_counter()
+        response = renter.get(f'/item/{item_id}/availability', headers=headers)
+        latencies['availability'].append(time.perf_counter() - request_start)
+        assert response.status_code in (200, 304), response.status_code
+        if response.status_code == 200:
+            etags[item_id] = response.headers['ETag']
+        if written and (response.status_code == 304 or written not in response.get_json()['blocked_dates']):
+            stale += 1
+
+        request_start = time.perf_counter()
+        assert renter.get(f'/rent/{item_id}').status_code == 200
+        latencies['rent page'].append(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'availability ms': statistics.median(latencies['availability']) * 1000,
+        'rent page ms': statistics.median(latencies['rent page']) * 1000,
+        'loads/s': 2 * args.loads / elapsed,
+        'stale': stale,
+        **app.extensions['availability_cache'].stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--hot', type=int, default=50)
+    parser.add_argument('--loads', type=int, default=2000)
+    parser.add_argument('--write-every', type=int, default=100)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.items, rentals_per_item=3)
+        hot = RentalItem.query.order_by(RentalItem.id).limit(args.hot).all()
+        items = [item.id for item in hot]
+        owner_names = {item.id: item.owner.username for item in hot}
+
+    renter = app.test_client()
+    renter.post('/login', data={'username': 'user20', 'password': PASSWORD})
+    clients = {}
+    owners = {}
+    for item_id, username in owner_names.items():
+        if username not in clients:
+            clients[username] = app.test_client()
+            clients[username].post('/login', data={'username': username, 'password': PASSWORD})
+        owners[item_id] = clients[username]
+
+    modes = [('no cache', 0, False), ('cache', 1024, False), ('cache + If-None-Match', 1024, True)]
+    columns = ['availability ms', 'rent page ms', 'loads/s', 'hits', 'misses', 'stale']
+    print(f"{'mode':<24}" + ''.join(f'{c:>17}' for c in columns))
+    for label, size, revalidate in modes:
+        app.extensions['availability_cache'] = MemoryCache(maxsize=size, ttl=300)
+        result = run(args, items, renter, owners, revalidate)
+        print(f'{label:<24}' + ''.join(f'{result[c]:>17.2f}' if isinstance(result[c], float) else f'{result[c]:>17}'
+                                       for c in columns))
+
+
+if __name__ == '__main__':
+    main()
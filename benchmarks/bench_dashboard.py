@@ -0,0 +1,103 @@
+"""Dashboard response time for power users, counters read vs counted.
+
+Seeds a scratch database with seed_scale(--scale), then hands every tenth
+listing to user0 and every tenth rental to one renter, so both have
+thousands of rentals. Times /dashboard for each with the user_stats
+counters (USER_STATS_ENABLED on) and with the five COUNT queries it used to
+run. Then it compares the time to insert rentals with and without the
+triggers that keep the counters current, and recounts everything to check
+the triggers left no drift.
+
+Usage: python benchmarks/bench_dashboard.py [--scale 2] [--repeat 30]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from seed_data import PASSWORD, SCALE_OWNERS, seed_scale, use_scratch_database
+
+use_scratch_database('bench_dashboard')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Rental, RentalItem, USER_STATS_TRIGGERS  # noqa: E402
+from user_stats import dashboard_counters, rebuild_user_stats  # noqa: E402
+
+MODES = [('counted', {'USER_STATS_ENABLED': False}), ('user_stats', {})]
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def insert_rentals_ms(count, first_id):
+    start = datetime(2040, 1, 1)
+    rows = [{'id': first_id + n, 'item_id': 1, 'renter_id': SCALE_OWNERS + 1, 'start_date': start,
+             'end_date': start + timedelta(days=1), 'total_price': 100, 'status': 'pending'} for n in range(count)]
+    began = time.perf_counter()
+    db.session.execute(Rental.__table__.insert(), rows)
+    db.session.commit()
+    return (time.perf_counter() - began) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    apps = [(label, create_app(config)) for label, config in MODES]
+    with apps[1][1].app_context():
+        db.create_all()
+        seed_scale(args.scale)
+        power_renter = f'user{SCALE_OWNERS * args.scale}'
+        # The triggers move the counters along with these updates
+        db.session.execute(db.update(RentalItem).where(RentalItem.id % 10 == 0).values(owner_id=1))
+        db.session.execute(db.update(Rental).where(Rental.id % 10 == 0).values(renter_id=SCALE_OWNERS * args.scale + 1))
+        db.session.commit()
+        owner_counts, renter_counts = dashboard_counters(1), dashboard_counters(SCALE_OWNERS * args.scale + 1)
+
+    print(f"user0 (owner): {owner_counts['listings']} listings, {owner_counts['pending_requests']} pending requests")
+    print(f"{power_renter} (renter): {renter_counts['rentals']} rentals, "
+          f"{renter_counts['completed_payments']} completed payments\n")
+    print(f"{'/dashboard':<22}" + ''.join(f'{label:>14}' for label, _ in MODES))
+    for username in ('user0', power_renter):
+        row = f'{username:<22}'
+        for label, app in apps:
+            client = app.test_client()
+            client.post('/login', data={'username': username, 'password': PASSWORD})
+            assert client.get('/dashboard').status_code == 200
+            row += f"{median_ms(lambda: client.get('/dashboard'), args.repeat):>11.2f} ms"
+        print(row)
+
+    with apps[1][1].app_context():
+        next_id = db.session.query(db.func.max(Rental.id)).scalar() + 1
+        with_triggers = insert_rentals_ms(5000, next_id)
+        for trigger in USER_STATS_TRIGGERS:
+            name = str(trigger.statement).split()[5]
+            db.session.execute(db.text(f'DROP TRIGGER {name}'))
+        db.session.commit()
+        without_triggers = insert_rentals_ms(5000, next_id + 5000)
+        db.session.execute(db.delete(Rental).where(Rental.id >= next_id + 5000))
+        for trigger in USER_STATS_TRIGGERS:
+            db.session.execute(trigger)
+        db.session.commit()
+        users, drifted = rebuild_user_stats()
+
+    print(f'\ninserting 5000 rentals: {with_triggers:.0f} ms with the counter triggers, '
+          f'{without_triggers:.0f} ms without')
+    print(f'recount: {drifted} of {users} users had drifted counters')
+    if drifted:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
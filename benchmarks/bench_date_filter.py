@@ -0,0 +1,100 @@
+"""Response time of the start_date/end_date availability filter on a large catalog.
+
+Seeds --items listings with owner blocks scattered over the next year, then
+times /items and /api/items filtered to a few date windows. Wider windows
+leave fewer free items, so pages have to look further down the catalog. For
+comparison it fills the same first page the per-item way: walk the catalog
+newest first and call is_date_range_available on each item.
+
+Usage: python benchmarks/bench_date_filter.py [--items 100000] [--repeat 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from seed_data import bulk_seed_items, bulk_seed_periods, use_scratch_database
+
+use_scratch_database('bench_date_filter')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.datastructures import MultiDict  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from availability import is_date_range_available  # noqa: E402
+from search import filter_items  # noqa: E402
+
+app = create_app()
+
+# (label, days from today, length in days)
+WINDOWS = [('1 day', 7, 1), ('3 days', 30, 3), ('2 weeks', 45, 14), ('2 months', 60, 60)]
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def per_item_page(start_date, end_date, per_page):
+    """The first page found by checking items one at a time"""
+    page = []
+    for item in RentalItem.query.filter_by(is_available=True).order_by(RentalItem.id.desc()).yield_per(500):
+        if is_date_range_available(item.id, start_date, end_date):
+            page.append(item.id)
+            if len(page) == per_page:
+                break
+    return page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--history-days', type=int, default=730, help='days of past blocks per item')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        bulk_seed_items(args.items)
+        periods, days = bulk_seed_periods(history_days=args.history_days)
+        print(f'{args.items} items, {periods} blocked periods covering {days} blocked days '
+              f'(seeded in {time.perf_counter() - start:.0f}s)\n')
+
+    client = app.test_client()
+    per_page = app.config['ITEMS_PER_PAGE']
+    columns = ['free items', '/items', '/api/items', '+category', 'per-item (old)']
+    print(f"{'window':<10}" + ''.join(f'{c:>16}' for c in columns) + '   (median ms)')
+    for label, offset, length in WINDOWS:
+        start_date = date.today() + timedelta(days=offset)
+        end_date = start_date + timedelta(days=length - 1)
+        dates = f'start_date={start_date.isoformat()}&end_date={end_date.isoformat()}'
+
+        with app.app_context():
+            query, _ = filter_items(MultiDict({'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}))
+            free = query.count()
+            api_page = client.get(f'/api/items?{dates}').get_json()['items']
+            assert [item['id'] for item in api_page] == per_item_page(start_date, end_date, per_page)
+
+            def old():
+                with app.app_context():
+                    per_item_page(start_date, end_date, per_page)
+
+        row = [
+            median_ms(lambda: client.get(f'/items?{dates}'), args.repeat),
+            median_ms(lambda: client.get(f'/api/items?{dates}'), args.repeat),
+            median_ms(lambda: client.get(f'/api/items?{dates}&category=Tools'), args.repeat),
+            median_ms(old, max(1, args.repeat // 5)),
+        ]
+        print(f'{label:<10}{free:>16}' + ''.join(f'{ms:>16.1f}' for ms in row))
+
+
+if __name__ == '__main__':
+    main()
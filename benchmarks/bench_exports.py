@@ -0,0 +1,94 @@
+"""Export throughput and peak memory, streamed against loaded all at once.
+
+Seeds a scratch database with seed_scale(--scale) and exports every dataset
+in both formats, once through the streaming export_chunks() and once the
+way an export without it would be written: every row loaded with .all() and
+the whole file built as one string. Reports rows per second, MB per second
+and the peak Python memory (tracemalloc, measured in a second pass so its
+overhead stays out of the timings). The streamed peak should stay near one
+EXPORT_BATCH_SIZE batch however large --scale gets.
+
+Usage: python benchmarks/bench_exports.py [--scale 4] [--batch-size 2000]
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from seed_data import seed_scale, use_scratch_database
+
+use_scratch_database('bench_exports')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from exports import DATASETS, FORMATS, _value, export_chunks, export_query  # noqa: E402
+from models import db  # noqa: E402
+
+
+def streamed(dataset, fmt, batch_size):
+    rows = size = 0
+    for chunk in export_chunks(dataset, fmt, batch_size=batch_size):
+        size += len(chunk)
+        rows += chunk.count('\n')
+    return rows - (fmt == 'csv'), size
+
+
+def loaded(dataset, fmt, batch_size):
+    result = db.session.execute(export_query(dataset))
+    columns = list(result.keys())
+    rows = result.all()
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        writer.writerows([_value(name, value) for name, value in zip(columns, row)] for row in rows)
+        body = buffer.getvalue()
+    else:
+        body = ''.join(json.dumps({name: _value(name, value) for name, value in zip(columns, row)}) + '\n'
+                       for row in rows)
+    return len(rows), len(body)
+
+
+def measure(export, dataset, fmt, batch_size):
+    start = time.perf_counter()
+    rows, size = export(dataset, fmt, batch_size)
+    elapsed = time.perf_counter() - start
+    db.session.rollback()
+
+    tracemalloc.start()
+    export(dataset, fmt, batch_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.rollback()
+    return rows, elapsed, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=2000, help='EXPORT_BATCH_SIZE of the streamed runs')
+    args = parser.parse_args()
+
+    app = create_app({'METRICS_ENABLED': False})
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed_scale(args.scale)
+        print(f'seeded scale {args.scale} in {time.perf_counter() - start:.0f} s, '
+              f'batches of {args.batch_size} rows\n')
+
+        print(f"{'dataset':<17}{'format':<8}{'mode':<9}{'rows':>9}{'rows/s':>10}{'MB/s':>7}{'peak MiB':>10}")
+        for dataset in DATASETS:
+            for fmt in FORMATS:
+                for label, export in (('streamed', streamed), ('loaded', loaded)):
+                    rows, elapsed, size, peak = measure(export, dataset, fmt, args.batch_size)
+                    print(f'{dataset:<17}{fmt:<8}{label:<9}{rows:>9}{rows / elapsed:>10.0f}'
+                          f'{size / elapsed / 1e6:>7.1f}{peak / 2 ** 20:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Catalog facet counts and sorted pages over a large catalog.
+
+Seeds --items listings placed in the gazetteer and --rentals rentals, a third
+of them booked, so items differ in popularity. Then, for a set of /items
+filters:
+
+- times the facet counts the way a page used to get them, one COUNT per
+  category and per city after a SELECT DISTINCT of the categories, against
+  facet_counts(): one grouped query, or the catalog_facet table when only
+  the category and location filter; all three must agree;
+- times the first and the --depth-th page of each sort through /api/items,
+  with the sort indexes and with them dropped.
+
+Paging through a sort must list every matching item once, in order, and
+rebuild_catalog_facets() must find nothing drifted. Exits non-zero otherwise.
+
+Usage: python benchmarks/bench_facets.py [--items 100000] [--rentals 100000] [--repeat 10] [--depth 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from seed_data import bulk_seed_items, use_scratch_database
+
+use_scratch_database('bench_facets')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.datastructures import MultiDict  # noqa: E402
+
+from app import create_app  # noqa: E402
+from geo import create_location_index, places_by_id  # noqa: E402
+from models import db, Rental, RentalItem, BOOKED_RENTAL_STATUSES  # noqa: E402
+from search import create_search_index, facet_counts, filter_items, rebuild_catalog_facets  # noqa: E402
+
+app = create_app({'METRICS_ENABLED': False})
+
+FILTERS = ['', 'category=Tools', 'location=Cebu City', 'location=Lahug&category=Tools', 'max_price=500',
+           'search=drill', 'min_price=200&max_price=800&category=Vehicles']
+SORTS = ['price_asc', 'price_desc', 'popular', 'newest']
+SORT_INDEXES = ['ix_rental_item_available_price', 'ix_rental_item_available_rental_count']
+
+
+def seed_rentals(count, chunk_size=20_000, rng_seed=9):
+    """Insert rentals on random items; the triggers count the booked ones per item"""
+    rng = random.Random(rng_seed)
+    item_ids = [item_id for (item_id,) in db.session.query(RentalItem.id)]
+    # Popularity is skewed: a few items get most of the bookings
+    weights = [1 / (n + 1) for n in range(len(item_ids))]
+    rng.shuffle(weights)
+    start = datetime.combine(datetime.now().date(), datetime.min.time()) - timedelta(days=400)
+    statuses = list(BOOKED_RENTAL_STATUSES) + ['pending', 'cancelled', 'expired']
+    for offset in range(0, count, chunk_size):
+        picks = rng.choices(item_ids, weights, k=min(chunk_size, count - offset))
+        db.session.execute(Rental.__table__.insert(), [
+            {'item_id': item_id, 'renter_id': 11 + n % 39, 'start_date': start, 'end_date': start,
+             'total_price': 100.0, 'status': statuses[n % len(statuses)]} for n, item_id in enumerate(picks)
+        ])
+        db.session.commit()
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, result
+
+
+def per_facet_counts(args):
+    """(facet counts, queries run) with one query per value, like a page without facet_counts() would run"""
+    places = places_by_id()
+    # A sort other than relevance matches a search term once up front, which suits a COUNT too
+    args = dict(args, sort='newest')
+    categories = [category for category, in db.session.query(RentalItem.category).distinct()]
+    counts = {'category': {}, 'city': {}}
+    for category in categories:
+        query, _ = filter_items(MultiDict(dict(args, category=category)))
+        counts['category'][category] = query.order_by(None).count()
+    for city in sorted({place[3] for place in places.values()}):
+        query, _ = filter_items(MultiDict(dict(args, location=city)))
+        counts['city'][city] = query.order_by(None).count()
+    queries = 1 + len(counts['category']) + len(counts['city'])
+    return {name: {value: n for value, n in values.items() if n} for name, values in counts.items()}, queries
+
+
+def page_ms(client, url, repeat, depth):
+    """(median ms of the first page, ms of reaching and loading the depth-th page)"""
+    first, _ = median_ms(lambda: client.get(url).get_json(), repeat)
+    start = time.perf_counter()
+    cursor = ''
+    for _ in range(depth):
+        cursor = client.get(f'{url}&cursor={cursor}').get_json()['next_cursor']
+        if cursor is None:
+            break
+    return first, (time.perf_counter() - start) * 1000 / depth
+
+
+def check_sort_order(client, sort, failures):
+    """Page through the Vehicles listings by sort and check every one comes once, in order"""
+    expected = RentalItem.query.filter_by(is_available=True, category='Vehicles').count()
+    seen, keys, cursor = [], [], ''
+    field = {'price_asc': 'price', 'price_desc': 'price', 'newest': 'id'}.get(sort)
+    while cursor is not None:
+        page = client.get(f'/api/items?category=Vehicles&sort={sort}&per_page=100&cursor={cursor}').get_json()
+        seen += [item['id'] for item in page['items']]
+        keys += [item[field] for item in page['items']] if field else []
+        cursor = page['next_cursor']
+    if len(seen) != expected or len(set(seen)) != expected:
+        failures.append(f'sort={sort}: paging listed {len(seen)} items, {len(set(seen))} distinct, '
+                        f'of {expected}')
+    if keys and keys != sorted(keys, reverse=sort in ('price_desc', 'newest')):
+        failures.append(f'sort={sort}: pages are out of order')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--rentals', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=20, help='page reached by following next cursors')
+    args = parser.parse_args()
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        bulk_seed_items(args.items)
+        create_location_index()
+        create_search_index(rebuild=True)
+        seed_rentals(args.rentals)
+        print(f'seeded {args.items} items and {args.rentals} rentals in {time.perf_counter() - start:.1f}s\n')
+
+        print(f"{'filters':<44}{'per facet ms':>13}{'queries':>9}{'facets ms':>11}{'source':>8}")
+        for filters in FILTERS:
+            query_args = MultiDict([pair.split('=') for pair in filters.split('&') if pair])
+            before, (expected, queries) = median_ms(lambda: per_facet_counts(query_args), max(1, args.repeat // 5))
+            after, facets = median_ms(lambda: facet_counts(query_args), args.repeat)
+            narrowed = any(name not in ('category', 'location') for name in query_args)
+            print(f'{filters or "(none)":<44}{before:>13.1f}{queries:>9}'
+                  f'{after:>11.2f}{"query" if narrowed else "table":>8}')
+            # The per-facet counts apply every filter; facet_counts() leaves out each facet's own
+            if 'category' not in query_args and dict(facets['category']) != expected['category']:
+                failures.append(f'{filters}: category facets {dict(facets["category"])} != {expected["category"]}')
+            if 'location' not in query_args and dict(facets['city']) != expected['city']:
+                failures.append(f'{filters}: city facets {dict(facets["city"])} != {expected["city"]}')
+
+        client = app.test_client()
+        print(f"\n{'sort':<12}{'page 1 ms':>11}{f'page {args.depth} ms':>12}"
+              f"{'no index p1':>13}{f'no index p{args.depth}':>14}")
+        timings = {}
+        for indexed in (True, False):
+            if not indexed:
+                for name in SORT_INDEXES:
+                    db.session.execute(db.text(f'DROP INDEX {name}'))
+                db.session.commit()
+            for sort in SORTS:
+                timings[sort, indexed] = page_ms(client, f'/api/items?sort={sort}&category=Tools', args.repeat,
+                                                 args.depth)
+        for index in RentalItem.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+        for sort in SORTS:
+            (first, deep), (first_scan, deep_scan) = timings[sort, True], timings[sort, False]
+            print(f'{sort:<12}{first:>11.2f}{deep:>12.2f}{first_scan:>13.2f}{deep_scan:>14.2f}')
+            check_sort_order(client, sort, failures)
+
+        facets, drifted = rebuild_catalog_facets()
+        if drifted:
+            failures.append(f'{drifted} facet or rental counts had drifted from a recount')
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('\nFacet counts agree with per-facet counts, and every sort pages through each item once.')
+
+
+if __name__ == '__main__':
+    main()
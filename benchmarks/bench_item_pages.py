@@ -0,0 +1,78 @@
+"""Response time of catalog pages as the catalog grows.
+
+Grows a scratch catalog through each size and times the first page, a deep
+page (cursor near the oldest item) and a filtered page of /items and
+/api/items. For comparison it also times loading every matching row, which
+is what /items did before pagination (skipped above --full-limit items).
+
+Usage: python benchmarks/bench_item_pages.py [--sizes 1000 100000 1000000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from seed_data import bulk_seed_items, use_scratch_database
+
+use_scratch_database('bench_item_pages')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from search import filter_items  # noqa: E402
+
+app = create_app()
+
+
+def median_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def get(client, url):
+    def fetch():
+        response = client.get(url)
+        assert response.status_code == 200, url
+    return fetch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--full-limit', type=int, default=100_000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    columns = ['/items', '/items deep', '/items?category', '/api/items', '/api/items deep', 'load all (old)']
+    print(f"{'items':>10}" + ''.join(f'{c:>17}' for c in columns) + '   (median ms)')
+
+    for size in args.sizes:
+        with app.app_context():
+            bulk_seed_items(size)
+            deep_cursor = RentalItem.query.order_by(RentalItem.id).offset(50).first().id
+
+        row = [
+            median_ms(get(client, '/items'), args.repeat),
+            median_ms(get(client, f'/items?cursor={deep_cursor}'), args.repeat),
+            median_ms(get(client, '/items?category=Tools'), args.repeat),
+            median_ms(get(client, '/api/items'), args.repeat),
+            median_ms(get(client, f'/api/items?cursor={deep_cursor}'), args.repeat),
+        ]
+
+        if size <= args.full_limit:
+            with app.test_request_context('/items'):
+                row.append(median_ms(lambda: filter_items({})[0].all(), max(1, args.repeat // 10)))
+        print(f'{size:>10}' + ''.join(f'{value:>17.2f}' for value in row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Location filters and nearby search over a large catalog, with and without the R*Tree.
+
+Seeds --items listings spread over every place of the gazetteer, each a few
+hundred metres off its place's centre, and times:
+
+- the catalog query of a location typed as text, matched with LIKE as
+  before places existed, against the same location resolved to a place
+  (a barangay, a city), with the number of items each matches;
+- the first page of /api/items?within=<km> around a place and around a
+  point with LOCATION_INDEX_ENABLED, which takes the R*Tree for boxes
+  holding at most LOCATION_INDEX_MAX_SHARE of the catalog, and with it
+  off, which filters the coordinates of every available item.
+
+Both nearby variants must return the same items, nearest first, none
+further than the radius, and paging through a search must reach every item
+a brute-force distance check finds. Exits non-zero otherwise.
+
+Usage: python benchmarks/bench_locations.py [--items 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+from seed_data import bulk_seed_items, use_scratch_database
+
+use_scratch_database('bench_locations')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from geo import create_location_index, distance_km, places_in, resolve_place  # noqa: E402
+from models import db, Place, RentalItem  # noqa: E402
+
+app = create_app({'METRICS_ENABLED': False})
+
+LOCATION_QUERIES = ['Lahug', 'Banilad, Mandaue', 'Mandaue', 'Cebu City', 'Toledo']
+NEARBY_QUERIES = ['location=Lahug&within=1', 'location=Lahug&within=5', 'location=Mactan&within=2',
+                  'lat=10.3157&lon=123.8854&within=10', 'location=Carcar&within=25']
+
+
+def spread_items(rng_seed=5):
+    """Give every item a random gazetteer place as its location and coordinates near it"""
+    rng = random.Random(rng_seed)
+    places = Place.query.all()
+    rows = []
+    for (item_id,) in db.session.query(RentalItem.id):
+        place = rng.choice(places)
+        rows.append({'item_id': item_id, 'location': place.label, 'place_id': place.id,
+                     'latitude': place.latitude + rng.uniform(-0.01, 0.01),
+                     'longitude': place.longitude + rng.uniform(-0.01, 0.01)})
+    # The triggers keep the R*Tree in step with these updates
+    db.session.execute(db.text(
+        'UPDATE rental_item SET location = :location, place_id = :place_id, latitude = :latitude, '
+        'longitude = :longitude WHERE id = :item_id'
+    ), rows)
+    db.session.commit()
+
+
+def timed(client, url, repeat):
+    """(median ms, items of the first page)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, url
+    return statistics.median(timings) * 1000, response.get_json()['items']
+
+
+def catalog_ms(condition, repeat, per_page=24):
+    """(median ms of the first catalog page of items matching condition, items matching it)"""
+    query = RentalItem.query.filter_by(is_available=True).filter(condition)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query.options(db.joinedload(RentalItem.owner)).order_by(RentalItem.id.desc()).limit(per_page + 1).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        bulk_seed_items(args.items)
+        create_location_index()
+        spread_items()
+        indexed = db.session.execute(db.text('SELECT count(*) FROM rental_item_rtree')).scalar()
+        print(f'seeded {args.items} items over {Place.query.count()} places in '
+              f'{time.perf_counter() - start:.1f}s, {indexed} in the R*Tree\n')
+        if indexed != args.items:
+            failures.append(f'the R*Tree holds {indexed} of {args.items} items')
+
+        client = app.test_client()
+        print(f"{'location':<20}{'LIKE ms':>9}{'matches':>9}{'place ms':>10}{'matches':>9}")
+        for text in LOCATION_QUERIES:
+            like, like_count = catalog_ms(RentalItem.location.ilike(f'%{text}%'), args.repeat)
+            place, place_count = catalog_ms(RentalItem.place_id.in_(places_in(resolve_place(text))), args.repeat)
+            print(f'{text:<20}{like:>9.2f}{like_count:>9}{place:>10.2f}{place_count:>9}')
+
+        print(f"\n{'nearby':<34}{'scan ms':>9}{'indexed ms':>11}{'speedup':>9}{'nearest km':>12}")
+        for query in NEARBY_QUERIES:
+            url = f'/api/items?{query}'
+            app.config['LOCATION_INDEX_ENABLED'] = False
+            scan, scanned = timed(client, url, args.repeat)
+            app.config['LOCATION_INDEX_ENABLED'] = True
+            indexed, items = timed(client, url, args.repeat)
+            distances = [item['distance_km'] for item in items]
+            print(f'{query:<34}{scan:>9.2f}{indexed:>11.2f}{scan / indexed:>8.1f}x'
+                  f'{distances[0] if distances else "-":>12}')
+
+            radius = float(query.rsplit('within=', 1)[1])
+            if [item['id'] for item in items] != [item['id'] for item in scanned]:
+                failures.append(f'{query}: the R*Tree and the scan list different items')
+            if distances != sorted(distances):
+                failures.append(f'{query}: items are not nearest first')
+            if any(distance > radius * 1.01 for distance in distances):
+                failures.append(f'{query}: an item is further than {radius} km')
+
+        # Nothing inside the radius may be missing from the pages of a search
+        lahug = Place.query.filter_by(name='Lahug').one()
+        center = (lahug.latitude, lahug.longitude)
+        brute = {item_id for item_id, lat, lon in db.session.query(RentalItem.id, RentalItem.latitude,
+                                                                    RentalItem.longitude)
+                 if distance_km(center, lat, lon) <= 0.99}
+        paged, cursor = set(), ''
+        while cursor is not None:
+            page = client.get(f'/api/items?location=Lahug&within=1&per_page=100&cursor={cursor}').get_json()
+            paged.update(item['id'] for item in page['items'])
+            cursor = page['next_cursor']
+        if brute - paged:
+            failures.append(f'paging through 1 km around Lahug missed {len(brute - paged)} of the '
+                            f'{len(brute)} items a brute-force check finds')
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('\nEvery nearby search listed the same items with the index as without, nearest first.')
+
+
+if __name__ == '__main__':
+    main()
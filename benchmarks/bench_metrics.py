@@ -0,0 +1,87 @@
+"""Overhead of the request metrics.
+
+Serves the same mix of pages (/items, /api/items, a rent page and an
+availability calendar) from three apps on one database: metrics off,
+metrics on, and metrics on with Server-Timing headers. Rounds of requests
+alternate between the apps so drift affects all three alike. Reports the
+median time per request of each and the overhead against metrics off, then
+the cost of a /metrics scrape and a sample Server-Timing header.
+
+Usage: python benchmarks/bench_metrics.py [--items 2000] [--rounds 30] [--batch 40]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_metrics')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+MODES = [
+    ('metrics off', {'METRICS_ENABLED': False}),
+    ('metrics on', {'METRICS_ENABLED': True, 'SERVER_TIMING': False}),
+    ('+ Server-Timing', {'METRICS_ENABLED': True, 'SERVER_TIMING': True, 'METRICS_TOKEN': 'bench-metrics'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--batch', type=int, default=40, help='requests per round and app')
+    args = parser.parse_args()
+
+    apps = [(label, create_app(config)) for label, config in MODES]
+    with apps[0][1].app_context():
+        db.create_all()
+        create_search_index()
+        seed(args.items, user_count=20)
+        item_ids = [item_id for item_id, in db.session.query(RentalItem.id).limit(50)]
+
+    paths = []
+    for n in range(args.batch):
+        item_id = item_ids[n % len(item_ids)]
+        paths.append(['/items', '/api/items?category=Tools', f'/rent/{item_id}',
+                      f'/item/{item_id}/availability'][n % 4])
+
+    clients = {}
+    for label, app in apps:
+        client = app.test_client()
+        client.post('/login', data={'username': 'user15', 'password': PASSWORD})
+        for path in paths:  # warm up templates and caches
+            assert client.get(path).status_code == 200, path
+        clients[label] = client
+
+    timings = {label: [] for label, _ in apps}
+    for _ in range(args.rounds):
+        for label, _ in apps:
+            client = clients[label]
+            start = time.perf_counter()
+            for path in paths:
+                client.get(path)
+            timings[label].append((time.perf_counter() - start) / len(paths))
+
+    baseline = statistics.median(timings[apps[0][0]])
+    print(f"{'mode':<18}{'us per request':>16}{'overhead':>10}")
+    for label, _ in apps:
+        per_request = statistics.median(timings[label])
+        print(f'{label:<18}{per_request * 1e6:>16.0f}{(per_request / baseline - 1) * 100:>9.1f}%')
+
+    label, app = apps[2]
+    client = clients[label]
+    start = time.perf_counter()
+    body = client.get('/metrics', headers={'Authorization': 'Bearer bench-metrics'}).get_data()
+    scrape_ms = (time.perf_counter() - start) * 1000
+    print(f'\n/metrics: {len(body.splitlines())} lines, {len(body) / 1024:.1f} KB, {scrape_ms:.1f} ms')
+    print('Server-Timing:', client.get('/items').headers['Server-Timing'])
+
+
+if __name__ == '__main__':
+    main()
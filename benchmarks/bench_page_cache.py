@@ -0,0 +1,94 @@
+"""Anonymous page throughput with and without the page cache.
+
+Builds a scratch catalog of --items listings and replays the same seeded
+stream of anonymous requests (/, /items with a spread of filters and
+searches, /about, /contact) against two apps on that database: page cache
+off (PAGE_CACHE_SIZE=0) and on. Reports requests per second of each and the
+hit rate the cached app saw, then the cost of the old ORDER BY random()
+featured query against one draw of the precomputed sample.
+
+Usage: python benchmarks/bench_page_cache.py [--items 50000] [--requests 2000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from urllib.parse import urlencode
+
+from seed_data import CATEGORIES, bulk_seed_items, use_scratch_database
+
+use_scratch_database('bench_page_cache')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from page_cache import sample_item_ids  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+MODES = [('cache off', {'PAGE_CACHE_SIZE': 0}), ('cache on', {})]
+SEARCHES = ['', '', '', 'drill', 'speaker', 'tent', 'bike', 'camera', 'van']
+
+
+def request_stream(count, rng):
+    """Anonymous traffic: mostly the home page and the first pages of the catalog"""
+    paths = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.3:
+            paths.append('/')
+        elif roll < 0.9:
+            query = {key: value for key, value in (('category', rng.choice(['', '', *CATEGORIES])),
+                                                   ('search', rng.choice(SEARCHES))) if value}
+            paths.append('/items' + ('?' + urlencode(query) if query else ''))
+        else:
+            paths.append(rng.choice(['/about', '/contact']))
+    return paths
+
+
+def median_ms(fn, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per app')
+    args = parser.parse_args()
+
+    apps = [(label, create_app(config)) for label, config in MODES]
+    with apps[0][1].app_context():
+        db.create_all()
+        bulk_seed_items(args.items)
+        create_search_index(rebuild=True)
+
+    paths = request_stream(args.requests, random.Random(5))
+    print(f'{args.items} listings, {len(paths)} anonymous requests over {len(set(paths))} distinct URLs\n')
+    print(f"{'mode':<12}{'req/s':>9}{'ms/request':>12}{'hit rate':>10}")
+    for label, app in apps:
+        client = app.test_client()
+        hits = 0
+        start = time.perf_counter()
+        for path in paths:
+            response = client.get(path)
+            assert response.status_code == 200, path
+            hits += response.headers.get('X-Cache') == 'HIT'
+        elapsed = time.perf_counter() - start
+        print(f'{label:<12}{len(paths) / elapsed:>9.0f}{elapsed / len(paths) * 1000:>12.2f}{hits / len(paths):>10.1%}')
+
+    with apps[1][1].app_context():
+        random_scan = median_ms(lambda: RentalItem.query.filter_by(is_available=True).order_by(
+            db.func.random()).limit(6).all())
+        sample = median_ms(lambda: sample_item_ids(6))
+    print(f'\nfeatured items: ORDER BY random() {random_scan:.2f} ms per page view, '
+          f'sample_item_ids() {sample:.2f} ms per refresh')
+
+
+if __name__ == '__main__':
+    main()
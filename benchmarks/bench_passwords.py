@@ -0,0 +1,104 @@
+"""Login throughput against password hashing cost.
+
+For each hashing method, stores one user's password under it and has
+--threads clients POST /login for --seconds seconds through the Flask
+test client. Then it reports logins per second and the p50/p95 login
+latency, inline on the request threads and on a PASSWORD_HASH_WORKERS
+pool. Pick the strongest method whose numbers still cover the peak login
+rate of one worker times the number of workers.
+
+Usage: python benchmarks/bench_passwords.py [--threads 8] [--seconds 3] [--workers 2]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_passwords')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app  # noqa: E402
+from harness import percentile  # noqa: E402
+from models import db, User  # noqa: E402
+
+METHODS = [
+    'pbkdf2:sha256:100000',
+    'pbkdf2:sha256:300000',
+    'pbkdf2:sha256:600000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+]
+
+
+def hash_ms(method, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        generate_password_hash(PASSWORD, method=method)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def login_loop(app, stop, timings):
+    client = app.test_client()
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': 'user10', 'password': PASSWORD})
+        assert response.status_code == 302
+        timings.append(time.perf_counter() - start)
+
+
+def measure(app, threads, seconds):
+    stop = threading.Event()
+    timings = []
+    workers = [threading.Thread(target=login_loop, args=(app, stop, timings)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    # Logins still running at the deadline finish and count, so divide by the time until the last one did
+    elapsed = time.perf_counter() - start
+    ms = [duration * 1000 for duration in timings]
+    return len(timings) / elapsed, percentile(ms, 0.5), percentile(ms, 0.95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='concurrent login clients')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS of the pooled run')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, {args.threads} concurrent clients\n')
+    print(f"{'':<33}{'inline':>24}{f'pool of {args.workers}':>24}")
+    print(f"{'method':<24}{'hash ms':>9}" + f"{'logins/s':>10}{'p50 ms':>7}{'p95 ms':>7}" * 2)
+    for method in METHODS:
+        row = f'{method:<24}{hash_ms(method):>9.1f}'
+        for workers in (0, args.workers):
+            app = create_app({'PASSWORD_HASH_METHOD': method, 'PASSWORD_HASH_WORKERS': workers,
+                              'METRICS_ENABLED': False})
+            with app.app_context():
+                if method == METHODS[0] and workers == 0:
+                    db.create_all()
+                    seed(0, user_count=11)
+                # Stored under the method measured, so no login in the run rehashes
+                User.query.filter_by(username='user10').update(
+                    {'password': generate_password_hash(PASSWORD, method=method)})
+                db.session.commit()
+            rate, p50, p95 = measure(app, args.threads, args.seconds)
+            row += f'{rate:>10.1f}{p50:>7.0f}{p95:>7.0f}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Payment submission throughput with the gateway called inline and from the payment pool.
+
+--threads renters, each on its own client, pay --payments pending rentals
+one after the other against a fake gateway that takes --latency seconds per
+charge. Inline (PAYMENT_PROCESSING_ASYNC off) every request waits for the
+gateway, which is how payments worked before the pool; queued the request
+only records the payment and PAYMENT_WORKERS threads charge it. Reports the
+submissions per second and p50/p95 latency the renters saw, and how long it
+took until every payment was settled.
+
+Usage: python benchmarks/bench_payments.py [--threads 8] [--payments 10] [--latency 0.3] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_payments')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from harness import percentile  # noqa: E402
+from models import db, Payment, Rental, RentalItem, User  # noqa: E402
+import payments  # noqa: E402
+
+
+def create_rentals(renters, per_renter):
+    """{username: [rental id, ...]} of new pending rentals"""
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    items = RentalItem.query.all()
+    rentals = {}
+    for n, renter in enumerate(renters):
+        rows = [Rental(item_id=items[(n * per_renter + i) % len(items)].id, renter_id=renter.id,
+                       start_date=today + timedelta(days=1), end_date=today + timedelta(days=2), total_price=100)
+                for i in range(per_renter)]
+        db.session.add_all(rows)
+        db.session.flush()
+        rentals[renter.username] = [rental.id for rental in rows]
+    db.session.commit()
+    return rentals
+
+
+def payer(app, username, rental_ids, barrier, timings):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    barrier.wait()
+    for rental_id in rental_ids:
+        start = time.perf_counter()
+        response = client.post(f'/payment/{rental_id}', data={'payment_method': 'gcash',
+                                                              'idempotency_key': uuid.uuid4().hex})
+        assert response.status_code == 302
+        timings.append(time.perf_counter() - start)
+
+
+def unsettled(app, rental_ids):
+    with app.app_context():
+        return Payment.query.filter(Payment.rental_id.in_(rental_ids),
+                                    Payment.status.in_(['pending', 'processing'])).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='renters paying at once')
+    parser.add_argument('--payments', type=int, default=10, help='payments per renter')
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds the gateway takes per charge')
+    parser.add_argument('--workers', type=int, default=4, help='PAYMENT_WORKERS of the queued run')
+    args = parser.parse_args()
+
+    print(f'{args.threads} renters x {args.payments} payments, gateway latency {args.latency * 1000:.0f} ms\n')
+    print(f"{'mode':<22}{'submits/s':>10}{'p50 ms':>8}{'p95 ms':>8}{'settled after s':>17}")
+    for label, asynchronous in (('inline', False), (f'queued, {args.workers} workers', True)):
+        app = create_app({'PAYMENT_PROCESSING_ASYNC': asynchronous, 'PAYMENT_WORKERS': args.workers,
+                          'METRICS_ENABLED': False})
+        app.extensions['payment_gateway'] = payments.FakeGateway(latency=args.latency)
+        with app.app_context():
+            if not asynchronous:
+                db.create_all()
+                seed(args.threads * args.payments, user_count=10 + args.threads, rentals_per_item=0)
+            renters = User.query.order_by(User.id).offset(10).limit(args.threads).all()
+            rentals = create_rentals(renters, args.payments)
+        rental_ids = [rental_id for ids in rentals.values() for rental_id in ids]
+
+        timings = []
+        barrier = threading.Barrier(args.threads + 1)
+        threads = [threading.Thread(target=payer, args=(app, username, ids, barrier, timings))
+                   for username, ids in rentals.items()]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        submitted = time.perf_counter() - start
+        while unsettled(app, rental_ids):
+            time.sleep(0.02)
+        settled = time.perf_counter() - start
+
+        ms = [duration * 1000 for duration in timings]
+        print(f'{label:<22}{len(timings) / submitted:>10.1f}{percentile(ms, 0.5):>8.0f}'
+              f'{percentile(ms, 0.95):>8.0f}{settled:>17.2f}')
+        if asynchronous:
+            with app.app_context():
+                payments.payment_pool().shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
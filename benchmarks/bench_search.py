@@ -0,0 +1,64 @@
+"""Listing search through the FTS5 index versus the LIKE fallback.
+
+Seeds a scratch catalog, builds the search index and times the first page of
+/api/items for a set of search terms with the index enabled and disabled.
+
+Usage: python benchmarks/bench_search.py [--items 100000] [--repeat 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from seed_data import bulk_seed_items, use_scratch_database
+
+use_scratch_database('bench_search')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+app = create_app()
+
+TERMS = ['drill', 'karaoke machine', 'port', 'heavy duty generator', 'kayak mabolo', 'delivery available',
+         'nothing matches this']
+
+
+def median_ms(client, url, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, url
+    return statistics.median(timings) * 1000, len(response.get_json()['items'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        bulk_seed_items(args.items)
+        start = time.perf_counter()
+        create_search_index(rebuild=True)
+        print(f'Indexed {args.items} items in {time.perf_counter() - start:.2f}s\n')
+
+    client = app.test_client()
+    print(f"{'search':<24}{'FTS5 ms':>10}{'hits':>6}{'LIKE ms':>10}{'hits':>6}{'speedup':>9}")
+    for term in TERMS:
+        url = f'/api/items?search={term}'
+        app.config['SEARCH_INDEX_ENABLED'] = True
+        fts_ms, fts_hits = median_ms(client, url, args.repeat)
+        app.config['SEARCH_INDEX_ENABLED'] = False
+        like_ms, like_hits = median_ms(client, url, args.repeat)
+        print(f'{term:<24}{fts_ms:>10.2f}{fts_hits:>6}{like_ms:>10.2f}{like_hits:>6}{like_ms / fts_ms:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Cold start of a web worker: import time and time to first request.
+
+Runs fresh interpreters that import wsgi.py (which builds the app) and
+serve GET /items once through the test client, the work a gunicorn worker
+does when it boots. Reports the median import time, first-request time
+and whole process wall time over --runs, then the `python -X importtime`
+self time per top-level package, and whether Pillow and multiprocessing
+were loaded.
+
+With --compare <git revision> the same measurements are taken on that
+revision, exported with `git archive`, against the same database.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--compare <rev>]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from seed_data import seed, use_scratch_database
+
+use_scratch_database('bench_startup')
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+import wsgi
+imported = time.perf_counter()
+response = wsgi.application.test_client().get('/items')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import ms': (imported - start) * 1000, 'first request ms': (served - imported) * 1000,
+                  'pillow': 'PIL.Image' in sys.modules, 'multiprocessing': 'multiprocessing' in sys.modules}))
+'''
+
+
+def cold_starts(tree, runs):
+    timings = {'import ms': [], 'first request ms': [], 'process ms': []}
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', WORKER], cwd=tree, capture_output=True, text=True,
+                                check=True).stdout
+        timings['process ms'].append((time.perf_counter() - start) * 1000)
+        result = json.loads(output.splitlines()[-1])
+        timings['import ms'].append(result['import ms'])
+        timings['first request ms'].append(result['first request ms'])
+    medians = {name: statistics.median(values) for name, values in timings.items()}
+    medians.update(pillow=result['pillow'], multiprocessing=result['multiprocessing'])
+    return medians
+
+
+def import_profile(tree):
+    """Self time in ms of every top-level package imported by wsgi"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import wsgi'], cwd=tree,
+                            capture_output=True, text=True, check=True).stderr
+    packages = {}
+    for line in stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not fields[0].split(':')[-1].strip().isdigit():
+            continue
+        package = fields[2].strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(fields[0].split(':')[-1]) / 1000
+    return packages
+
+
+def export_revision(revision):
+    tree = tempfile.mkdtemp()
+    archive = subprocess.run(['git', 'archive', revision], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', tree], input=archive, check=True)
+    return tree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--items', type=int, default=200)
+    parser.add_argument('--compare', metavar='REV', help='git revision to measure as well')
+    parser.add_argument('--top', type=int, default=8, help='packages to list in the import profile')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+    from search import create_search_index
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        create_search_index()
+        seed(args.items)
+
+    trees = [('working tree', ROOT)]
+    if args.compare:
+        trees.insert(0, (args.compare, export_revision(args.compare)))
+
+    columns = ['import ms', 'first request ms', 'process ms', 'pillow', 'multiprocessing']
+    print(f"{'tree':<16}" + ''.join(f'{c:>18}' for c in columns) + f'   (median of {args.runs})')
+    profiles = {}
+    for label, tree in trees:
+        result = cold_starts(tree, args.runs)
+        print(f'{label:<16}' + ''.join(f'{result[c]:>18.1f}' if isinstance(result[c], float) else f'{str(result[c]):>18}'
+                                       for c in columns))
+        profiles[label] = import_profile(tree)
+
+    print('\nimport self time by package (ms)')
+    print(f"{'package':<20}" + ''.join(f'{label:>16}' for label, _ in trees))
+    total = {label: sum(profile.values()) for label, profile in profiles.items()}
+    last = profiles[trees[-1][0]]
+    first = profiles[trees[0][0]]
+    packages = sorted(set(first) | set(last), key=lambda p: -max(first.get(p, 0), last.get(p, 0)))
+    for package in packages[:args.top]:
+        print(f'{package:<20}' + ''.join(f'{profiles[label].get(package, 0):>16.1f}' for label, _ in trees))
+    print(f"{'total':<20}" + ''.join(f'{total[label]:>16.1f}' for label, _ in trees))
+
+
+if __name__ == '__main__':
+    main()
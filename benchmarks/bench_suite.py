@@ -0,0 +1,208 @@
+"""Benchmark suite of the main user flows, with saved baselines.
+
+Seeds a scratch database with seed_scale(--scale) and replays a seeded
+script of journeys from --threads concurrent users. In a renter journey
+the user browses /items, searches, opens a rent page and its calendar,
+books dates and pays for them. Every fourth journey is an owner's: open
+manage-availability for one of their listings, block a few days and
+unblock them again. Requests go through the Flask test client in this
+process, or with --http through keep-alive connections to gunicorn
+running --workers processes on the same database.
+
+Reports requests, errors, throughput and p50/p95/p99 latency per step.
+--save NAME writes the results to benchmarks/baselines/NAME.json (or to
+NAME if it ends in .json). --compare NAME prints the change against a saved
+baseline and exits 1 if p50 or p95 of a step, or the total throughput, got
+worse by more than --tolerance. Compare only runs with the same settings
+on the same machine.
+
+Usage:
+    python benchmarks/bench_suite.py [--scale 1] [--threads 2] [--journeys 100] [--http --workers 2]
+    python benchmarks/bench_suite.py --save before
+    python benchmarks/bench_suite.py --compare before
+"""
+import argparse
+import http.client
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from harness import ROOT, AppClient, Client, gunicorn_server, load_baseline, print_summary, regressions, \
+    save_baseline, summarize
+from seed_data import CATEGORIES, LISTINGS, PASSWORD, SCALE_OWNERS, seed_scale, use_scratch_database
+
+use_scratch_database('bench_suite')
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+SEARCHES = [name.split()[-1].lower() for names in LISTINGS.values() for name in names]
+STEPS = ['browse /items', 'search /items', 'rent page', 'availability', 'book', 'payment page', 'pay',
+         'manage availability', 'block dates', 'unblock dates']
+
+
+class Journeys:
+    """The seeded script of one simulated renter and owner pair, timing every request"""
+
+    def __init__(self, renter, owner, rng, item_ids, owned_ids):
+        self.renter_client = renter
+        self.owner_client = owner
+        self.rng = rng
+        self.item_ids = item_ids
+        self.owned_ids = owned_ids
+        self.samples = {}
+        self.first_day = date.today() + timedelta(days=1)
+
+    def step(self, name, expected, method, path, form=None, json_body=None, client=None):
+        start = time.perf_counter()
+        try:
+            status, location = (client or self.renter_client).request(method, path, form, json_body)
+        except (OSError, http.client.HTTPException):
+            status, location = None, None
+        self.samples.setdefault(name, []).append((status == expected, time.perf_counter() - start))
+        return location or ''
+
+    def renter(self):
+        rng = self.rng
+        query = {'category': rng.choice(['', *CATEGORIES])}
+        if rng.random() < 0.3:
+            query['start_date'] = (self.first_day + timedelta(days=rng.randrange(90))).isoformat()
+        self.step('browse /items', 200, 'GET', '/items?' + urlencode(query))
+        self.step('search /items', 200, 'GET', '/items?' + urlencode({'search': rng.choice(SEARCHES)}))
+
+        item_id = rng.choice(self.item_ids)
+        self.step('rent page', 200, 'GET', f'/rent/{item_id}')
+        self.step('availability', 200, 'GET', f'/item/{item_id}/availability?format=bitmap')
+
+        start = self.first_day + timedelta(days=rng.randrange(365))
+        end = start + timedelta(days=rng.randint(1, 6))
+        location = self.step('book', 302, 'POST', f'/rent/{item_id}',
+                             form={'start_date': start.isoformat(), 'end_date': end.isoformat()})
+        # Dates somebody already holds send the renter back to the rent page instead
+        if '/payment/' in location:
+            path = '/payment/' + location.rsplit('/payment/', 1)[1]
+            self.step('payment page', 200, 'GET', path)
+            self.step('pay', 302, 'POST', path, form={'payment_method': rng.choice(['gcash', 'card'])})
+
+    def owner(self):
+        rng = self.rng
+        owner = self.owner_client
+        item_id = rng.choice(self.owned_ids)
+        self.step('manage availability', 200, 'GET', f'/manage-availability/{item_id}', client=owner)
+        start = self.first_day + timedelta(days=rng.randrange(365))
+        end = start + timedelta(days=rng.randint(0, 4))
+        days = {'ranges': [{'from': start.isoformat(), 'to': end.isoformat()}]}
+        self.step('block dates', 200, 'POST', f'/block-dates/{item_id}', json_body=days, client=owner)
+        self.step('unblock dates', 200, 'POST', f'/unblock-dates/{item_id}', json_body=days, client=owner)
+
+    def run(self, count):
+        for n in range(count):
+            if n % 4 == 3:
+                self.owner()
+            else:
+                self.renter()
+
+
+def user_loop(make_client, n, args, item_ids, owned, barrier, results):
+    owner_count = SCALE_OWNERS * args.scale
+    renter, owner = make_client(), make_client()
+    renter.request('POST', '/login', {'username': f'user{owner_count + n}', 'password': PASSWORD})
+    owner.request('POST', '/login', {'username': f'user{n % owner_count}', 'password': PASSWORD})
+
+    journeys = Journeys(renter, owner, random.Random(args.seed + n), item_ids, owned[n % owner_count + 1])
+    journeys.run(4)  # warm up connections, templates and caches
+    journeys.samples.clear()
+    barrier.wait()
+    journeys.run(args.journeys)
+    results.append(journeys.samples)
+
+
+def run(make_client, args, item_ids, owned):
+    results = []
+    barrier = threading.Barrier(args.threads + 1)
+    threads = [threading.Thread(target=user_loop, args=(make_client, n, args, item_ids, owned, barrier, results))
+               for n in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = {}
+    for thread_samples in results:
+        for step, rows in thread_samples.items():
+            samples.setdefault(step, []).extend(rows)
+    return summarize(dict(sorted(samples.items(), key=lambda pair: STEPS.index(pair[0]))), elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=1, help='seed_scale() factor: 500 users, 1,000 listings each')
+    parser.add_argument('--threads', type=int, default=2, help='concurrent users')
+    parser.add_argument('--journeys', type=int, default=100, help='journeys per user')
+    parser.add_argument('--seed', type=int, default=17)
+    parser.add_argument('--http', action='store_true', help='drive gunicorn instead of the test client')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers with --http')
+    parser.add_argument('--save', metavar='NAME', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='NAME', help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore latency changes smaller than this')
+    args = parser.parse_args()
+
+    settings = {'scale': args.scale, 'threads': args.threads, 'journeys': args.journeys, 'seed': args.seed,
+                'driver': f'gunicorn x{args.workers}' if args.http else 'test client'}
+    baseline = load_baseline(args.compare) if args.compare else None
+    if baseline and baseline['settings'] != settings:
+        print(f"warning: baseline measured with {baseline['settings']}, this run uses {settings}\n")
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_scale(args.scale, rng_seed=args.seed)
+        create_search_index(rebuild=True)
+        owned = {}
+        for item_id, owner_id in db.session.query(RentalItem.id, RentalItem.owner_id):
+            owned.setdefault(owner_id, []).append(item_id)
+        item_ids = sorted(item_id for ids in owned.values() for item_id in ids)
+        db.session.remove()
+        db.engine.dispose()
+
+    if args.http:
+        gunicorn = shutil.which('gunicorn')
+        if not gunicorn:
+            sys.exit('gunicorn is not installed (pip install -r requirements.txt)')
+        log_path = os.path.join(tempfile.mkdtemp(), 'gunicorn.log')
+        with open(log_path, 'w') as log, gunicorn_server(gunicorn, args.workers, os.environ, log) as port:
+            summary = run(lambda: Client(port), args, item_ids, owned)
+    else:
+        summary = run(lambda: AppClient(app), args, item_ids, owned)
+
+    print(f"scale {args.scale}, {args.threads} users x {args.journeys} journeys, {settings['driver']}\n")
+    print_summary(summary, baseline)
+
+    failed = []
+    if summary['total']['errors']:
+        failed.append(f"{summary['total']['errors']} requests got an unexpected status")
+    if baseline:
+        failed += regressions(summary, baseline, args.tolerance, args.min_ms)
+    if args.save:
+        print(f'\nsaved baseline {save_baseline(args.save, summary, settings)}')
+    if failed:
+        print('\nFAIL\n  ' + '\n  '.join(failed))
+        sys.exit(1)
+    if baseline:
+        print(f"\nno step got more than {args.tolerance:.0%} slower than {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
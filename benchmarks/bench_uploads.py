@@ -0,0 +1,116 @@
+"""Throughput of concurrent add_item uploads, inline versus background processing.
+
+Several threads, each logged in as its own user, post listings with a large
+JPEG. Reports add_item latency and requests per second for both modes, and
+for background mode how long the image workers take to finish the queue.
+
+Usage: python benchmarks/bench_uploads.py [--uploaders 8] [--uploads 4] [--size 4000x3000]
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('bench_uploads')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from uploads import image_pool, remove_image_files  # noqa: E402
+
+app = create_app()
+
+
+def make_jpeg(width, height):
+    """A noisy photo-sized JPEG, so it compresses about as badly as a real photo"""
+    image = Image.merge('RGB', [Image.effect_noise((width, height), 40 + 10 * band) for band in range(3)])
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def uploader(username, payload, uploads, latencies):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    for n in range(uploads):
+        start = time.perf_counter()
+        response = client.post('/add-item', content_type='multipart/form-data', data={
+            'title': f'Upload {username} {n}', 'description': 'benchmark upload', 'price': '100',
+            'location': 'Lahug', 'category': 'Tools', 'image': (io.BytesIO(payload), 'photo.jpg'),
+        })
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 302, response.status_code
+
+
+def run(args, payload, background):
+    app.config['IMAGE_PROCESSING_ASYNC'] = background
+    latencies = []
+    threads = [threading.Thread(target=uploader, args=(f'user{n}', payload, args.uploads, latencies))
+               for n in range(args.uploaders)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    requests_done = time.perf_counter() - start
+
+    with app.app_context():
+        while RentalItem.query.filter_by(image_status='pending').count():
+            time.sleep(0.05)
+        all_done = time.perf_counter() - start
+
+        failed = RentalItem.query.filter_by(image_status='failed').count()
+        for item in RentalItem.query.all():
+            remove_image_files(item.image_filename, item.variant_widths)
+        RentalItem.query.delete()
+        db.session.commit()
+
+    latencies.sort()
+    return {
+        'p50 ms': statistics.median(latencies) * 1000,
+        'p95 ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        'req/s': len(latencies) / requests_done,
+        'images ready s': all_done,
+        'failed': failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--uploaders', type=int, default=8)
+    parser.add_argument('--uploads', type=int, default=4, help='uploads per uploader')
+    parser.add_argument('--size', default='4000x3000')
+    args = parser.parse_args()
+
+    width, height = (int(n) for n in args.size.split('x'))
+    payload = make_jpeg(width, height)
+    print(f'{args.uploaders} uploaders x {args.uploads} uploads of a {args.size} JPEG '
+          f'({len(payload) / 1024 / 1024:.1f} MB), {app.config["IMAGE_WORKERS"]} image workers\n')
+
+    with app.app_context():
+        db.create_all()
+        seed(0, user_count=max(args.uploaders, 2), owner_count=1)
+
+    # Start the pool up front so worker spawn time is not billed to the first uploads
+    with app.app_context():
+        image_pool().submit(int).result()
+
+    results = {'inline': run(args, payload, background=False),
+               'background': run(args, payload, background=True)}
+
+    columns = list(results['inline'])
+    print(f"{'mode':<12}" + ''.join(f'{c:>16}' for c in columns))
+    for mode, result in results.items():
+        print(f'{mode:<12}' + ''.join(f'{result[c]:>16.2f}' for c in columns))
+
+
+if __name__ == '__main__':
+    main()
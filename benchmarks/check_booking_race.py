@@ -0,0 +1,100 @@
+"""Concurrent booking stress test for a single item.
+
+Many threads, each logged in as its own renter, post overlapping rental
+requests for the same item at the same moment. Afterwards no two rentals may
+share a day, and every rental must have exactly one blocked period covering
+it. Exits non-zero on a double booking.
+
+Usage: python benchmarks/check_booking_race.py [--bookers 16] [--rounds 20]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('check_booking_race')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, BlockedPeriod, Rental, RentalItem  # noqa: E402
+
+app = create_app()
+
+
+def booker(username, item_id, rounds, barrier, outcomes, rng_seed):
+    rng = random.Random(rng_seed)
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': PASSWORD})
+    first_day = date.today() + timedelta(days=1)
+    for _ in range(rounds):
+        start = first_day + timedelta(days=rng.randrange(60))
+        end = start + timedelta(days=rng.randrange(1, 6))
+        # Every thread posts its n-th request at the same moment
+        barrier.wait()
+        response = client.post(f'/rent/{item_id}', data={
+            'start_date': start.isoformat(), 'end_date': end.isoformat(),
+        })
+        booked = response.status_code == 302 and '/payment/' in response.headers['Location']
+        outcomes.append(booked)
+
+
+def find_overlaps(ranges):
+    ranges = sorted(ranges)
+    return [(a, b) for a, b in zip(ranges, ranges[1:]) if b[0] <= a[1]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookers', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(1, user_count=args.bookers + 10, rentals_per_item=0)
+        item_id = RentalItem.query.first().id
+
+    outcomes = []
+    barrier = threading.Barrier(args.bookers)
+    # Renters come after the ten owners seed() creates
+    threads = [threading.Thread(target=booker, args=(f'user{10 + n}', item_id, args.rounds, barrier, outcomes, n))
+               for n in range(args.bookers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        rentals = Rental.query.filter_by(item_id=item_id).all()
+        periods = BlockedPeriod.query.filter_by(item_id=item_id).all()
+        rental_ranges = [(r.start_date.date(), r.end_date.date()) for r in rentals]
+        period_ranges = {p.rental_id: (p.start_date, p.end_date) for p in periods}
+
+    failures = []
+    for a, b in find_overlaps(rental_ranges):
+        failures.append(f'double booking: {a[0]}..{a[1]} and {b[0]}..{b[1]}')
+    for a, b in find_overlaps(period_ranges.values()):
+        failures.append(f'overlapping blocked periods: {a[0]}..{a[1]} and {b[0]}..{b[1]}')
+    for rental, rental_range in zip(rentals, rental_ranges):
+        if period_ranges.get(rental.id) != rental_range:
+            failures.append(f'rental {rental.id} has no matching blocked period')
+
+    print(f'{len(outcomes)} booking requests from {args.bookers} threads in {elapsed:.2f}s')
+    print(f'{sum(outcomes)} booked, {len(outcomes) - sum(outcomes)} rejected, '
+          f'{len(rentals)} rentals and {len(periods)} blocked periods stored')
+
+    if failures:
+        print('\n' + '\n'.join(failures[:20]))
+        sys.exit(1)
+    print('\nNo overlapping rentals.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Repeat-visit caching check for static files and uploads.
+
+Uploads one listing image, then loads / and /items the way a browser would:
+the first visit downloads every stylesheet, script and image the pages link
+to, the repeat visit skips assets that are still fresh and revalidates the
+rest with If-None-Match. Exits non-zero if any asset is downloaded again, or
+if uploads do not answer Range requests with 206.
+
+Usage: python benchmarks/check_caching.py
+"""
+import io
+import os
+import re
+import sys
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('check_caching')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem  # noqa: E402
+from uploads import remove_image_files  # noqa: E402
+
+app = create_app()
+
+PAGES = ['/', '/items']
+# Requested without a version token, the way script.js hardcodes its fallback
+# image path, so these must be revalidated instead
+UNVERSIONED = ['/static/images/logo.png']
+ASSET_PATTERN = re.compile(r'''(?:href|src)="([^"]+)"|srcset="([^"]+)"|url\('([^']+)'\)''')
+
+
+def page_assets(html):
+    urls = set()
+    for href, srcset, css_url in ASSET_PATTERN.findall(html):
+        if srcset:
+            urls.update(candidate.split()[0] for candidate in srcset.split(','))
+        else:
+            urls.add(href or css_url)
+    return sorted(url for url in urls if url.startswith(('/static/', '/uploads/')))
+
+
+def is_fresh(response):
+    # What a browser may reuse without asking the server again
+    cache_control = response.cache_control
+    return bool(cache_control.immutable or (cache_control.max_age and not cache_control.no_cache))
+
+
+def upload_listing(client):
+    buffer = io.BytesIO()
+    Image.new('RGB', (1600, 1200), (200, 120, 40)).save(buffer, 'JPEG')
+    client.post('/login', data={'username': 'user0', 'password': PASSWORD})
+    response = client.post('/add-item', content_type='multipart/form-data', data={
+        'title': 'Cached camera', 'description': 'caching check', 'price': '100',
+        'location': 'Lahug', 'category': 'Electronics', 'image': (io.BytesIO(buffer.getvalue()), 'camera.jpg'),
+    })
+    assert response.status_code == 302, response.status_code
+    client.get('/logout')
+
+
+def main():
+    app.config['IMAGE_PROCESSING_ASYNC'] = False
+    with app.app_context():
+        db.create_all()
+        seed(10)
+
+    client = app.test_client()
+    upload_listing(client)
+
+    cache = {}
+    missing = []
+    failures = []
+    print(f"{'asset':<64}{'first':>7}{'repeat':>10}")
+    try:
+        visits = [page_assets(client.get(path).get_data(as_text=True)) for path in PAGES] + [UNVERSIONED]
+        for assets in visits:
+            for url in assets:
+                if url in cache:
+                    continue
+                first = client.get(url)
+                cache[url] = first
+                if first.status_code == 404:
+                    missing.append(url)
+                    continue
+                if first.status_code != 200:
+                    failures.append(f'{url}: HTTP {first.status_code} on first load')
+                    continue
+                if not first.get_etag()[0] or first.get_etag()[1]:
+                    failures.append(f'{url}: no strong ETag')
+
+                if is_fresh(first):
+                    repeat = 'cached'
+                else:
+                    revalidated = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+                    repeat = revalidated.status_code
+                    if repeat != 304:
+                        failures.append(f'{url}: downloaded again on repeat load (HTTP {repeat})')
+                print(f'{url[:63]:<64}{first.status_code:>7}{repeat:>10}')
+
+        uploads = [url for url in cache if url.startswith('/uploads/')]
+        if not uploads:
+            failures.append('no upload linked from ' + ', '.join(PAGES))
+        for url in uploads[:1]:
+            partial = client.get(url, headers={'Range': 'bytes=0-99'})
+            print(f'\nRange request for {url}: HTTP {partial.status_code}, {len(partial.data)} bytes')
+            if partial.status_code != 206 or len(partial.data) != 100:
+                failures.append(f'{url}: Range request not answered with 206')
+    finally:
+        with app.app_context():
+            for item in RentalItem.query.filter(RentalItem.image_filename.isnot(None)):
+                remove_image_files(item.image_filename, item.variant_widths)
+
+    if missing:
+        print('\nLinked but not on disk: ' + ', '.join(missing))
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('\nEvery asset is cached or revalidated with 304 on repeat loads.')
+
+
+if __name__ == '__main__':
+    main()
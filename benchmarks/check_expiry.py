@@ -0,0 +1,131 @@
+"""Expiry sweep over a large backlog of abandoned checkouts, within a time budget.
+
+Seeds --items listings and --rentals pending rentals, each with its blocked
+period: most were booked two hours ago and never paid, some of those have a
+payment on its way, one that failed or one stuck pending for two hours, and
+some were booked just now. Then one expiry sweep must expire exactly the
+unpaid ones past their hold (failed and stuck payments included), delete exactly their blocked periods, report the days
+they held, leave the dashboard counters matching a recount and finish
+within --budget seconds. A second sweep must find nothing. Exits non-zero
+otherwise.
+
+Usage: python benchmarks/check_expiry.py [--items 2000] [--rentals 100000] [--budget 30]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from seed_data import bulk_seed_items, use_scratch_database
+
+use_scratch_database('check_expiry')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from expiry import expire_unpaid_rentals  # noqa: E402
+from models import db, BlockedPeriod, Payment, Rental, RentalItem  # noqa: E402
+from user_stats import rebuild_user_stats  # noqa: E402
+
+app = create_app({'METRICS_ENABLED': False})
+
+# Share of each kind of rental in the backlog, by rental number modulo 10
+ABANDONED, STUCK, IN_FLIGHT, FAILED, FRESH = range(6), (6,), (7,), (8,), (9,)
+
+
+def seed_backlog(item_count, rental_count, chunk_size=20_000):
+    """Insert the rentals, their blocked periods and payments; returns (expected expiries, their days)"""
+    rng = random.Random(3)
+    item_ids = [item_id for (item_id,) in db.session.query(RentalItem.id).order_by(RentalItem.id)]
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    now = datetime.utcnow()
+    expected = days = 0
+    rentals, periods, payments = [], [], []
+
+    def flush():
+        for table, rows in ((Rental.__table__, rentals), (BlockedPeriod.__table__, periods),
+                            (Payment.__table__, payments)):
+            if rows:
+                db.session.execute(table.insert(), rows)
+            rows.clear()
+        db.session.commit()
+
+    for n in range(rental_count):
+        rental_id = n + 1
+        # Each item's rentals follow one another four days apart, so their periods never overlap
+        start = today + timedelta(days=1 + 4 * (n // item_count))
+        length = rng.randint(1, 3)
+        kind = n % 10
+        rentals.append({'id': rental_id, 'item_id': item_ids[n % item_count], 'renter_id': 11 + n % 39,
+                        'start_date': start, 'end_date': start + timedelta(days=length - 1),
+                        'total_price': 100.0 * length, 'status': 'pending',
+                        'created_at': now if kind in FRESH else now - timedelta(hours=2)})
+        periods.append({'item_id': item_ids[n % item_count], 'start_date': start.date(),
+                        'end_date': (start + timedelta(days=length - 1)).date(), 'reason': 'rented',
+                        'rental_id': rental_id})
+        if kind in IN_FLIGHT or kind in FAILED or kind in STUCK:
+            payments.append({'rental_id': rental_id, 'amount': 100.0 * length, 'method': 'gcash',
+                             'status': {6: 'pending', 7: 'processing', 8: 'failed'}[kind],
+                             'idempotency_key': f'backlog-{rental_id}', 'attempts': 1,
+                             'created_at': now - timedelta(hours=2) if kind in STUCK else now})
+        if kind in ABANDONED or kind in FAILED or kind in STUCK:
+            expected += 1
+            days += length
+        if len(rentals) >= chunk_size:
+            flush()
+    flush()
+    return expected, days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--rentals', type=int, default=100_000)
+    parser.add_argument('--budget', type=float, default=30, help='seconds the sweep may take')
+    args = parser.parse_args()
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        bulk_seed_items(args.items)
+        start = time.perf_counter()
+        expected, expected_days = seed_backlog(args.items, args.rentals)
+        print(f'seeded {args.rentals} pending rentals on {args.items} items '
+              f'in {time.perf_counter() - start:.1f}s, {expected} past their hold and unpaid')
+
+        start = time.perf_counter()
+        expired, days = expire_unpaid_rentals()
+        elapsed = time.perf_counter() - start
+        print(f'sweep expired {expired} rentals and released {days} blocked days in {elapsed:.2f}s '
+              f'({expired / elapsed:.0f} rentals/s, budget {args.budget:.0f}s)')
+
+        if (expired, days) != (expected, expected_days):
+            failures.append(f'expected {expected} rentals and {expected_days} days, got {expired} and {days}')
+        if elapsed > args.budget:
+            failures.append(f'sweep took {elapsed:.2f}s, over the {args.budget:.0f}s budget')
+        statuses = dict(db.session.query(Rental.status, db.func.count(Rental.id)).group_by(Rental.status).all())
+        if statuses.get('expired') != expected or statuses.get('pending') != args.rentals - expected:
+            failures.append(f'rentals by status: {statuses}')
+        orphaned = db.session.query(BlockedPeriod).join(Rental, BlockedPeriod.rental_id == Rental.id).filter(
+            Rental.status == 'expired').count()
+        if orphaned:
+            failures.append(f'{orphaned} blocked periods still belong to expired rentals')
+        if BlockedPeriod.query.count() != args.rentals - expected:
+            failures.append(f'{BlockedPeriod.query.count()} blocked periods left, '
+                            f'expected {args.rentals - expected}')
+        again = expire_unpaid_rentals()
+        if again != (0, 0):
+            failures.append(f'a second sweep still expired {again[0]} rentals')
+        users, drifted = rebuild_user_stats()
+        if drifted:
+            failures.append(f'{drifted} of {users} users had drifted dashboard counters')
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('\nEvery unpaid rental past its hold was expired, and nothing else.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Duplicate payment submissions and webhook deliveries for the same rentals.
+
+For every pending rental, --clients clients logged in as its renter submit
+the payment form at the same moment: half of them resend one form (the same
+idempotency key, like a double click) and the rest post forms of their own
+(other tabs). The fake gateway is slow and fails a share of its calls, so
+retries overlap the duplicates. A second pass uses a gateway that answers
+through the webhook, and delivers every callback twice at once.
+
+Afterwards every rental must have exactly one payment, the gateway must have
+charged it under one key, every completed payment must have approved its
+rental under a transaction id of its own, and the dashboard counters must
+still match a recount. Exits non-zero otherwise.
+
+Usage: python benchmarks/check_payment_race.py [--rentals 20] [--clients 6]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('check_payment_race')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, Payment, Rental, RentalItem, User  # noqa: E402
+from payments import FakeGateway, payment_pool, webhook_signature  # noqa: E402
+from user_stats import rebuild_user_stats  # noqa: E402
+
+app = create_app({'PAYMENT_RETRY_DELAY': 0.01, 'PAYMENT_MAX_ATTEMPTS': 5, 'METRICS_ENABLED': False,
+                  'PAYMENT_WEBHOOK_SECRET': 'check-payment-race'})
+
+
+def create_rentals(count, offset):
+    """Pending rentals of `count` renters from the offset-th on, each on an item of its own"""
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    # Renters come after the ten owners seed() creates
+    renters = User.query.order_by(User.id).offset(10 + offset).limit(count).all()
+    items = RentalItem.query.order_by(RentalItem.id).offset(offset).limit(count).all()
+    rentals = [Rental(item_id=item.id, renter_id=renter.id, start_date=today + timedelta(days=1),
+                      end_date=today + timedelta(days=3), total_price=item.price * 3)
+               for renter, item in zip(renters, items)]
+    db.session.add_all(rentals)
+    db.session.commit()
+    return [(rental.id, renter.username) for rental, renter in zip(rentals, renters)]
+
+
+def submit_duplicates(rentals, clients):
+    """Post each rental's payment form from `clients` clients at once"""
+    def payer(username, rental_id, key, barrier):
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        barrier.wait()
+        client.post(f'/payment/{rental_id}', data={'payment_method': 'gcash', 'idempotency_key': key})
+
+    for rental_id, username in rentals:
+        shared_key = uuid.uuid4().hex
+        barrier = threading.Barrier(clients)
+        threads = [threading.Thread(target=payer, args=(username, rental_id,
+                                                        shared_key if n % 2 == 0 else uuid.uuid4().hex, barrier))
+                   for n in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def deliver_twice(gateway):
+    """Post every pending callback to the webhook from two threads at once"""
+    def post(body, signature, barrier):
+        barrier.wait()
+        response = app.test_client().post('/payments/webhook', data=body, content_type='application/json',
+                                          headers={'X-Signature': signature})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    for key, status, transaction_id in gateway.callbacks:
+        body = json.dumps({'reference': key, 'status': status, 'transaction_id': transaction_id}).encode()
+        with app.app_context():
+            signature = webhook_signature(body)
+        barrier = threading.Barrier(2)
+        threads = [threading.Thread(target=post, args=(body, signature, barrier)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def wait_for_settlement():
+    with app.app_context():
+        payment_pool().shutdown(wait=True)
+    # The next pass gets a fresh pool
+    import payments
+    payments._payment_pool = None
+
+
+def check(rentals, gateway):
+    failures = []
+    with app.app_context():
+        for rental_id, _ in rentals:
+            rental = db.session.get(Rental, rental_id)
+            payments = Payment.query.filter_by(rental_id=rental_id).all()
+            if len(payments) != 1:
+                failures.append(f'rental {rental_id} has {len(payments)} payments')
+                continue
+            payment = payments[0]
+            if payment.status == 'completed' and rental.status != 'approved':
+                failures.append(f'rental {rental_id} is {rental.status} after its payment completed')
+            if payment.status not in ('completed', 'failed'):
+                failures.append(f'payment {payment.id} is still {payment.status}')
+        keys = {payment.idempotency_key: payment.rental_id for payment in Payment.query}
+        charged = Counter(keys.get(key) for key in gateway.charges)
+        failures += [f'rental {rental_id} was charged under {count} keys'
+                     for rental_id, count in charged.items() if count > 1]
+        if None in charged:
+            failures.append(f'{charged[None]} charges have no payment')
+        transactions = Counter(payment.transaction_id for payment in Payment.query if payment.transaction_id)
+        failures += [f'transaction {txn} is shared by {count} payments' for txn, count in transactions.items()
+                     if count > 1]
+        users, drifted = rebuild_user_stats()
+        if drifted:
+            failures.append(f'{drifted} of {users} users had drifted dashboard counters')
+        statuses = Counter(payment.status for payment in Payment.query)
+    return failures, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rentals', type=int, default=20, help='rentals paid in each pass')
+    parser.add_argument('--clients', type=int, default=6, help='simultaneous submissions per rental')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.rentals * 2, user_count=10 + args.rentals * 2, rentals_per_item=0)
+
+    failures = []
+    start = time.perf_counter()
+    passes = [('direct answers', FakeGateway(latency=0.05, error_rate=0.3, seed=1)),
+              ('webhook answers', FakeGateway(latency=0.05, error_rate=0.3, deferred=True, seed=2))]
+    for n, (label, gateway) in enumerate(passes):
+        app.extensions['payment_gateway'] = gateway
+        with app.app_context():
+            rentals = create_rentals(args.rentals, n * args.rentals)
+        submit_duplicates(rentals, args.clients)
+        wait_for_settlement()
+        deliver_twice(gateway)
+        pass_failures, statuses = check(rentals, gateway)
+        failures += pass_failures
+        print(f'{label}: {len(rentals) * args.clients} submissions for {len(rentals)} rentals, '
+              f'{gateway.calls} gateway calls, {len(gateway.charges)} charges')
+    print(f'payments by status: {dict(statuses)} ({time.perf_counter() - start:.1f}s)')
+
+    if failures:
+        print('\n' + '\n'.join(failures[:20]))
+        sys.exit(1)
+    print('\nEvery rental was paid once.')
+
+
+if __name__ == '__main__':
+    main()
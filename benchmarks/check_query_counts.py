@@ -0,0 +1,96 @@
+"""Per-route query budget check.
+
+Counts the SQL statements each listing route issues on a small seeded
+catalog, grows the catalog tenfold and counts again. Exits non-zero if a
+route goes over its budget or its query count changes with the data size,
+which is how an N+1 query shows up.
+
+Usage: python benchmarks/check_query_counts.py [--items 50] [--growth 10]
+"""
+import argparse
+import os
+import sys
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('check_query_counts')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db  # noqa: E402
+
+# Count what the routes themselves run, not what the page cache saves them
+app = create_app({'PAGE_CACHE_SIZE': 0})
+
+# Logged-in requests include one query for Flask-Login's user loader
+BUDGETS = [
+    ('anonymous', '/items', 2),
+    ('user0', '/items', 3),
+    ('user0', '/dashboard', 5),
+    ('user0', '/my-listings', 4),
+    ('user10', '/dashboard', 5),
+    ('user10', '/my-rentals', 5),
+]
+
+
+def count_queries(engine, client):
+    counts = {}
+    queries = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        for user, path, _ in BUDGETS:
+            client.get('/logout')
+            if user != 'anonymous':
+                client.post('/login', data={'username': user, 'password': PASSWORD})
+            client.get(path)  # leave out one-time work such as probing for optional tables
+            queries.clear()
+            response = client.get(path)
+            assert response.status_code == 200, f'{path} as {user}: HTTP {response.status_code}'
+            counts[user, path] = len(queries)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50)
+    parser.add_argument('--growth', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        seed(args.items)
+        engine = db.engine
+
+    client = app.test_client()
+    small = count_queries(engine, client)
+
+    with app.app_context():
+        seed(args.items * (args.growth - 1), rentals_per_item=3)
+    large = count_queries(engine, client)
+
+    failures = []
+    print(f"{'route':<28}{'budget':>8}{'small':>8}{'large':>8}")
+    for user, path, budget in BUDGETS:
+        key = (user, path)
+        print(f'{path + " (" + user + ")":<28}{budget:>8}{small[key]:>8}{large[key]:>8}')
+        if large[key] != small[key]:
+            failures.append(f'{path} as {user}: query count grows with data ({small[key]} -> {large[key]})')
+        if max(small[key], large[key]) > budget:
+            failures.append(f'{path} as {user}: {max(small[key], large[key])} queries, budget is {budget}')
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print('\nAll routes within their query budget.')
+
+
+if __name__ == '__main__':
+    main()
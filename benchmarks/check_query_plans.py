@@ -0,0 +1,123 @@
+"""Query-plan regression check for the hot routes.
+
+Seeds a scratch SQLite database, requests each route through the Flask test
+client while recording every SELECT/UPDATE/DELETE it issues, then runs
+EXPLAIN QUERY PLAN on each statement. Exits non-zero if any of them falls
+back to a full table scan.
+
+Usage: python benchmarks/check_query_plans.py [--items 500] [-v]
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+from seed_data import PASSWORD, seed, use_scratch_database
+
+use_scratch_database('check_query_plans')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from models import db, RentalItem, Rental  # noqa: E402
+from geo import create_location_index  # noqa: E402
+from search import create_search_index  # noqa: E402
+
+# Plan the queries the routes run, not the page cache's copies of them
+app = create_app({'PAGE_CACHE_SIZE': 0})
+
+# A plain "SCAN <table>" is a full table scan; scans of a covering index are fine
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+# Tables meant to be read whole: one row per (category, place) however large the catalog grows
+SMALL_TABLES = {'catalog_facet'}
+
+
+def route_requests(client, fixtures):
+    """Yield (label, response) for every route under test"""
+    owner_item_id, other_item_id, rental_id = fixtures
+    future = (datetime.now().date() + timedelta(days=200)).isoformat()
+
+    yield 'GET /', client.get('/')
+    yield 'GET /items', client.get('/items')
+    yield 'GET /items?category', client.get('/items?category=Tools')
+    yield 'GET /items?search', client.get('/items?search=drill&location=lahug')
+    yield 'GET /items?location', client.get('/items?location=Mandaue')
+    yield 'GET /items?within', client.get('/items?location=Lahug&within=5')
+    yield 'GET /api/items?lat&lon&within', client.get('/api/items?lat=10.31&lon=123.95&within=2')
+    yield 'GET /items?sort=price_asc', client.get('/items?sort=price_asc&max_price=800')
+    yield 'GET /items?sort=popular', client.get('/items?sort=popular&category=Tools')
+    yield 'GET /api/items?facets&search', client.get('/api/items?facets=1&search=drill&sort=price_desc')
+    yield 'GET /items?start_date', client.get(f'/items?start_date={future}&end_date={future}')
+    yield 'GET /api/items?start_date', client.get(f'/api/items?start_date={future}&category=Tools')
+    yield 'GET /item/<id>/availability', client.get(f'/item/{other_item_id}/availability')
+    yield 'POST /login', client.post('/login', data={'username': 'user0', 'password': PASSWORD})
+    yield 'GET /dashboard', client.get('/dashboard')
+    yield 'GET /my-listings', client.get('/my-listings')
+    yield 'GET /rent/<id>', client.get(f'/rent/{other_item_id}')
+    yield 'GET /manage-availability/<id>', client.get(f'/manage-availability/{owner_item_id}')
+    yield 'POST /block-dates/<id>', client.post(f'/block-dates/{owner_item_id}', json={'dates': [future]})
+    yield 'POST /unblock-dates/<id>', client.post(f'/unblock-dates/{owner_item_id}', json={'dates': [future]})
+    client.get('/logout')
+    client.post('/login', data={'username': 'user10', 'password': PASSWORD})
+    yield 'GET /my-rentals', client.get('/my-rentals')
+    yield 'GET /payment/<id>', client.get(f'/payment/{rental_id}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every query plan')
+    args = parser.parse_args()
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        # No ANALYZE on purpose: the app never runs it, so check the plans it really gets
+        seed(args.items)
+        create_search_index(rebuild=True)
+        create_location_index()
+        fixtures = (RentalItem.query.filter_by(owner_id=1).first().id,
+                    RentalItem.query.filter(RentalItem.owner_id != 1).first().id,
+                    Rental.query.filter_by(renter_id=11).first().id)
+        engine = db.engine
+
+    recorded = []
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')) and not executemany:
+            recorded.append((statement, parameters))
+
+    # Requests run outside any outer app context so each one gets a fresh session
+    client = app.test_client()
+    for label, response in route_requests(client, fixtures):
+        if response.status_code >= 400:
+            failures.append(f'{label}: HTTP {response.status_code}')
+        statements, recorded[:] = list(recorded), []
+
+        with engine.connect() as conn:
+            for statement, parameters in statements:
+                plan = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+                details = [row[-1] for row in plan]
+                scans = [d for d in details
+                         if FULL_SCAN.match(d) and FULL_SCAN.match(d).group(1) not in SMALL_TABLES]
+                if scans:
+                    failures.append(f'{label}: {", ".join(scans)}\n    {" ".join(statement.split())}')
+                if args.verbose:
+                    print(f'{label}: {" ".join(statement.split())}')
+                    for detail in details:
+                        print(f'    {detail}')
+        print(f'{label:<32} {len(statements):>3} queries')
+
+    if failures:
+        print('\nFull table scans found:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print('\nNo full table scans.')
+
+
+if __name__ == '__main__':
+    main()
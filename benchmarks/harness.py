@@ -0,0 +1,172 @@
+"""Pieces shared by the load test and the benchmark suite.
+
+Clients for the Flask test client and for a gunicorn server, latency
+percentiles, and baselines saved as JSON under benchmarks/baselines/ so a
+later run can be compared against them.
+"""
+import http.client
+import json
+import os
+import socket
+import subprocess
+import time
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, 'benchmarks', 'baselines')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start, see the server log')
+
+
+@contextmanager
+def gunicorn_server(gunicorn, workers, env, log):
+    """Serve wsgi:application on a free port with `workers` processes; yields the port"""
+    port = free_port()
+    server = subprocess.Popen([gunicorn, '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+                               '--timeout', '120', 'wsgi:application'],
+                              cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for(port)
+        yield port
+    finally:
+        server.terminate()
+        server.wait()
+
+
+class Client:
+    """One keep-alive connection with a session cookie"""
+
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, form=None, json_body=None):
+        """Send a request and return (status, Location header)"""
+        headers = {'Cookie': self.cookie} if self.cookie else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, response.getheader('Location')
+
+
+class AppClient:
+    """The same interface over app.test_client(), for in-process runs"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        response.close()
+        return response.status_code, response.headers.get('Location')
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples, elapsed):
+    """Per-step stats of {step: [(ok, seconds), ...]} gathered over `elapsed` seconds"""
+    summary = {}
+    for step, rows in samples.items():
+        timings = [seconds * 1000 for _, seconds in rows]
+        summary[step] = {
+            'requests': len(rows),
+            'errors': sum(1 for ok, _ in rows if not ok),
+            'req_s': len(rows) / elapsed,
+            'p50_ms': percentile(timings, 0.50),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+        }
+    total = sum(len(rows) for rows in samples.values())
+    summary['total'] = {
+        'requests': total,
+        'errors': sum(stats['errors'] for stats in summary.values()),
+        'req_s': total / elapsed,
+        **{key: percentile([seconds * 1000 for rows in samples.values() for _, seconds in rows], fraction)
+           for key, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99))},
+    }
+    return summary
+
+
+def baseline_path(name):
+    return name if name.endswith('.json') else os.path.join(BASELINES, f'{name}.json')
+
+
+def save_baseline(name, summary, settings):
+    """Write the summary and the settings it was measured with; returns the path"""
+    path = baseline_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                  text=True).stdout.strip() or None
+    except OSError:
+        revision = None
+    with open(path, 'w') as f:
+        json.dump({'settings': settings, 'revision': revision, 'saved_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'steps': summary}, f, indent=2, sort_keys=True)
+        f.write('\n')
+    return path
+
+
+def load_baseline(name):
+    with open(baseline_path(name)) as f:
+        return json.load(f)
+
+
+def regressions(summary, baseline, tolerance, min_ms):
+    """Steps that got slower than the baseline by more than tolerance (a fraction) and min_ms.
+
+    p50 and p95 latency and throughput are compared; p99 is reported but too
+    noisy over a few hundred requests to fail a run on.
+    """
+    found = []
+    for step, stats in summary.items():
+        before = baseline['steps'].get(step)
+        if before is None:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if stats[key] > before[key] * (1 + tolerance) and stats[key] - before[key] > min_ms:
+                found.append(f'{step}: {key} {before[key]:.1f} -> {stats[key]:.1f}')
+        if step == 'total' and stats['req_s'] < before['req_s'] * (1 - tolerance):
+            found.append(f"{step}: req/s {before['req_s']:.1f} -> {stats['req_s']:.1f}")
+    return found
+
+
+def print_summary(summary, baseline=None):
+    print(f"{'step':<22}{'requests':>9}{'errors':>7}{'req/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}"
+          + ('   p50 / p95 vs baseline' if baseline else ''))
+    for step, stats in summary.items():
+        line = (f"{step:<22}{stats['requests']:>9}{stats['errors']:>7}{stats['req_s']:>8.1f}"
+                f"{stats['p50_ms']:>8.1f}{stats['p95_ms']:>8.1f}{stats['p99_ms']:>8.1f}")
+        before = baseline['steps'].get(step) if baseline else None
+        if before:
+            line += (f"   {(stats['p50_ms'] / before['p50_ms'] - 1) * 100:+6.1f}%"
+                     f" / {(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+6.1f}%")
+        print(line)
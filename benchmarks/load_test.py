@@ -0,0 +1,176 @@
+"""Multi-worker load test of the production WSGI entry point.
+
+Seeds a scratch SQLite database, runs `flask upgrade-db` on it and starts
+gunicorn with --workers processes serving wsgi:application. Then --clients
+threads, each logged in as its own renter, loop for --duration seconds
+over the catalog (GET /items with filters), rent pages (GET /rent/<id>)
+and booking requests (POST /rent/<id>) for a small set of hot items, so
+writers in different workers contend for the same database file.
+
+Reports requests, status codes and latency per endpoint, then scans the
+server log for "database is locked" and tracebacks and checks that no two
+rentals of an item overlap. Exits non-zero on any server error.
+
+Usage:
+    python benchmarks/load_test.py [--workers 4] [--clients 16] [--duration 20]
+
+To see the failure mode the SQLite tuning prevents, run it with the old
+settings:
+
+    python benchmarks/load_test.py --journal-mode DELETE --busy-timeout 0
+"""
+import argparse
+import http.client
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+
+from harness import ROOT, Client, gunicorn_server, percentile
+from seed_data import PASSWORD, seed, use_scratch_database
+
+DATABASE = use_scratch_database('load_test')
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from models import db, Rental, RentalItem  # noqa: E402
+
+app = create_app()
+
+SEARCHES = ['', 'drill', 'speaker', 'tent', 'bike']
+CATEGORIES = ['', 'Tools', 'Electronics', 'Sports']
+
+
+def client_loop(port, username, item_ids, hot_ids, stop, results, rng_seed):
+    rng = random.Random(rng_seed)
+    client = Client(port)
+    client.request('POST', '/login', {'username': username, 'password': PASSWORD})
+    first_day = date.today() + timedelta(days=1)
+    while not stop.is_set():
+        roll = rng.random()
+        if roll < 0.5:
+            name = 'GET /items'
+            query = {'search': rng.choice(SEARCHES), 'category': rng.choice(CATEGORIES),
+                     'page': rng.randint(1, 3)}
+            if rng.random() < 0.3:
+                query['start_date'] = (first_day + timedelta(days=rng.randrange(60))).isoformat()
+            call = ('GET', '/items?' + urlencode(query), None)
+        elif roll < 0.8:
+            name = 'GET /rent/<id>'
+            call = ('GET', f'/rent/{rng.choice(item_ids)}', None)
+        else:
+            name = 'POST /rent/<id>'
+            start = first_day + timedelta(days=rng.randrange(90))
+            end = start + timedelta(days=rng.randrange(1, 5))
+            call = ('POST', f'/rent/{rng.choice(hot_ids)}',
+                    {'start_date': start.isoformat(), 'end_date': end.isoformat()})
+
+        request_start = time.perf_counter()
+        try:
+            status, _ = client.request(*call)
+        except (OSError, http.client.HTTPException) as e:
+            status = type(e).__name__
+            client = Client(port)
+            client.request('POST', '/login', {'username': username, 'password': PASSWORD})
+        results.append((name, status, time.perf_counter() - request_start))
+
+
+def overlapping_rentals():
+    """Pairs of rentals of the same item that share a day"""
+    overlaps = 0
+    with app.app_context():
+        rentals = {}
+        for rental in Rental.query.all():
+            rentals.setdefault(rental.item_id, []).append((rental.start_date.date(), rental.end_date.date()))
+    for ranges in rentals.values():
+        ranges.sort()
+        overlaps += sum(1 for a, b in zip(ranges, ranges[1:]) if b[0] <= a[1])
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--hot', type=int, default=5, help='items that all booking requests go to')
+    parser.add_argument('--journal-mode', default='WAL')
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='milliseconds')
+    args = parser.parse_args()
+
+    gunicorn = shutil.which('gunicorn')
+    if not gunicorn:
+        sys.exit('gunicorn is not installed (pip install -r requirements.txt)')
+
+    app.config['SQLITE_JOURNAL_MODE'] = args.journal_mode
+    app.config['SQLITE_BUSY_TIMEOUT'] = args.busy_timeout
+    with app.app_context():
+        db.create_all()
+        seed(args.items, user_count=args.clients + 10, rentals_per_item=1)
+        item_ids = [item_id for item_id, in db.session.query(RentalItem.id)]
+        hot_ids = item_ids[:args.hot]
+        db.session.remove()
+        db.engine.dispose()
+
+    env = dict(os.environ, SQLITE_JOURNAL_MODE=args.journal_mode, SQLITE_BUSY_TIMEOUT=str(args.busy_timeout))
+    upgrade = subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'upgrade-db'], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    if upgrade.returncode:
+        sys.exit(upgrade.stdout + upgrade.stderr)
+
+    log_path = os.path.join(tempfile.mkdtemp(), 'gunicorn.log')
+    with open(log_path, 'w') as log, gunicorn_server(gunicorn, args.workers, env, log) as port:
+        stop = threading.Event()
+        results = []
+        threads = [threading.Thread(target=client_loop,
+                                    args=(port, f'user{10 + n}', item_ids, hot_ids, stop, results, n))
+                   for n in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+    with open(log_path) as log:
+        server_log = log.read()
+    locked = server_log.count('database is locked')
+    tracebacks = server_log.count('Traceback')
+
+    print(f'{args.workers} gunicorn workers, {args.clients} clients, {elapsed:.0f}s, '
+          f'journal_mode={args.journal_mode} busy_timeout={args.busy_timeout}ms\n')
+    print(f"{'endpoint':<18}{'requests':>9}{'req/s':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}   statuses")
+    names = sorted({name for name, _, _ in results})
+    errors = 0
+    for name in names:
+        rows = [(status, seconds) for n, status, seconds in results if n == name]
+        timings = [seconds * 1000 for _, seconds in rows]
+        statuses = {}
+        for status, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        errors += sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+        print(f'{name:<18}{len(rows):>9}{len(rows) / elapsed:>8.1f}{statistics.median(timings):>8.1f}'
+              f'{percentile(timings, 0.95):>8.1f}{percentile(timings, 0.99):>8.1f}   '
+              + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)))
+
+    overlaps = overlapping_rentals()
+    print(f'\ntotal {len(results)} requests, {len(results) / elapsed:.1f} req/s')
+    print(f'server errors: {errors}, "database is locked" in log: {locked}, tracebacks: {tracebacks}, '
+          f'overlapping rentals: {overlaps}')
+    if errors or locked or tracebacks or overlaps:
+        print(f'server log: {log_path}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
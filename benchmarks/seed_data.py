@@ -0,0 +1,294 @@
+"""Synthetic data shared by the benchmark and check scripts.
+
+Call use_scratch_database() before importing app so the scripts never touch
+instance/rentalhub.db.
+
+Run as a script it fills an empty database with seed_scale(): --scale 1 is
+500 users, 1,000 listings and about 24,000 rentals with their blocked
+periods and payments. The data depends only on --scale and --seed.
+
+Usage:
+    python benchmarks/seed_data.py --database sqlite:////tmp/rentalhub.db [--scale 1] [--seed 17]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+LISTINGS = {
+    'Tools': ['Drill', 'Ladder', 'Generator', 'Pressure Washer', 'Lawn Mower', 'Welding Machine'],
+    'Furniture': ['Monobloc Chairs', 'Folding Table', 'Sofa', 'Tent', 'Wardrobe'],
+    'Electronics': ['Speaker', 'Projector', 'Camera', 'Karaoke Machine', 'Laptop', 'Drone'],
+    'Party Supplies': ['Lechon Roaster', 'Chafing Dish', 'Balloon Arch', 'Videoke', 'Fog Machine'],
+    'Sports': ['Mountain Bike', 'Kayak', 'Surfboard', 'Badminton Set', 'Snorkel Gear'],
+    'Vehicles': ['Motorcycle', 'Van', 'Scooter', 'Multicab', 'Pickup Truck'],
+}
+CATEGORIES = list(LISTINGS)
+ADJECTIVES = ['Heavy Duty', 'Portable', 'Compact', 'Professional', 'Vintage', 'Electric', 'Large', 'Brand New']
+LOCATIONS = ['Lahug', 'Mabolo', 'Banilad', 'Talamban', 'Mandaue', 'Lapu-Lapu']
+FILLER = ['well maintained', 'pickup only', 'delivery available', 'with manual', 'cash or gcash',
+          'clean and tested', 'weekend rates', 'deposit required', 'good condition', 'free setup']
+PASSWORD = 'password'
+
+
+def listing(rng, owner_id):
+    """Column values for one random listing"""
+    category = rng.choice(CATEGORIES)
+    name = f'{rng.choice(ADJECTIVES)} {rng.choice(LISTINGS[category])}'
+    location = rng.choice(LOCATIONS)
+    return {
+        'title': name,
+        'description': f'{name} for rent in {location}, ' + ', '.join(rng.sample(FILLER, 3)) + '.',
+        'price': rng.randint(50, 2000),
+        'location': f'{location}, Cebu',
+        'category': category,
+        'owner_id': owner_id,
+    }
+
+
+def use_scratch_database(name):
+    path = os.path.join(tempfile.mkdtemp(), f'{name}.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + path
+    return path
+
+
+def seed(item_count, user_count=50, owner_count=10, rentals_per_item=1, rng_seed=7):
+    """Add item_count items, each with rentals, blocked periods and payments.
+
+    Users are created on the first call only; later calls grow the catalog of
+    the same owners so a script can compare small and large datasets.
+    """
+    from passwords import hash_password
+    from models import db, User, RentalItem, Rental, Payment
+
+    rng = random.Random(rng_seed + RentalItem.query.count())
+
+    users = User.query.order_by(User.id).all()
+    if not users:
+        password = hash_password(PASSWORD)
+        users = [User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+                 for i in range(user_count)]
+        db.session.add_all(users)
+        db.session.flush()
+    owners, renters = users[:owner_count], users[owner_count:]
+
+    items = [RentalItem(**listing(rng, owners[i % len(owners)].id)) for i in range(item_count)]
+    db.session.add_all(items)
+    db.session.flush()
+
+    today = datetime.combine(datetime.now().date(), datetime.min.time())
+    for n, item in enumerate(items):
+        start = today + timedelta(days=rng.randrange(0, 30))
+        for _ in range(rentals_per_item):
+            length = rng.randrange(1, 10)
+            rental = Rental(item_id=item.id, renter_id=renters[n % len(renters)].id, start_date=start,
+                            end_date=start + timedelta(days=length), total_price=item.price * (length + 1),
+                            status=rng.choice(['pending', 'approved']))
+            db.session.add(rental)
+            db.session.flush()
+            rental.create_blocked_dates()
+            if rental.status == 'approved':
+                db.session.add(Payment(rental_id=rental.id, amount=rental.total_price, method='gcash',
+                                       status='completed'))
+            start += timedelta(days=length + rng.randrange(2, 10))
+    db.session.commit()
+
+
+def bulk_seed_items(total, chunk_size=50_000, rng_seed=11):
+    """Grow the catalog to `total` items with plain multi-row inserts.
+
+    Used for the large catalog benchmarks where going through the ORM one
+    object at a time would dominate the run. Items get no rentals, and the
+    search index is not updated (run create_search_index(rebuild=True)).
+    """
+    from models import db, User, RentalItem
+
+    if not User.query.first():
+        seed(0)
+    owner_ids = [user.id for user in User.query.order_by(User.id).limit(10)]
+
+    rng = random.Random(rng_seed)
+    created_at = datetime.utcnow()
+    current = RentalItem.query.count()
+    while current < total:
+        batch = min(chunk_size, total - current)
+        db.session.execute(RentalItem.__table__.insert(), [
+            dict(listing(rng, owner_ids[n % len(owner_ids)]), created_at=created_at, is_available=True)
+            for n in range(current, current + batch)
+        ])
+        db.session.commit()
+        current += batch
+
+
+def bulk_seed_periods(max_gap=60, max_length=10, horizon_days=365, history_days=0, chunk_size=100_000, rng_seed=13):
+    """Give every item owner blocks scattered from history_days ago to horizon_days ahead.
+
+    Periods are gaps of up to max_gap free days followed by up to max_length
+    blocked days, so an item gets about horizon_days / 35 periods by default.
+    Returns (periods, blocked days) inserted.
+    """
+    from models import db, BlockedPeriod, RentalItem
+
+    rng = random.Random(rng_seed)
+    today = datetime.now().date()
+    rows = []
+    periods = days = 0
+
+    def flush():
+        db.session.execute(BlockedPeriod.__table__.insert(), rows)
+        db.session.commit()
+        rows.clear()
+
+    item_ids = [item_id for (item_id,) in db.session.query(RentalItem.id).order_by(RentalItem.id)]
+    for item_id in item_ids:
+        cursor = today - timedelta(days=history_days)
+        while True:
+            cursor += timedelta(days=rng.randint(0, max_gap))
+            length = rng.randint(1, max_length)
+            if cursor + timedelta(days=length - 1) > today + timedelta(days=horizon_days):
+                break
+            rows.append({'item_id': item_id, 'start_date': cursor, 'end_date': cursor + timedelta(days=length - 1),
+                         'reason': 'owner_blocked'})
+            periods += 1
+            days += length
+            cursor += timedelta(days=length)
+        if len(rows) >= chunk_size:
+            flush()
+    flush()
+    return periods, days
+
+
+SCALE_USERS = 500
+SCALE_OWNERS = 50
+SCALE_ITEMS = 1000
+
+
+def seed_scale(scale=1, history_days=180, horizon_days=120, chunk_size=50_000, rng_seed=17):
+    """Fill an empty database with scale x 500 users, 1,000 listings and their booking history.
+
+    Every listing gets a timeline from history_days ago to horizon_days ahead:
+    rentals of 2 to 7 days and the odd owner block, with gaps of up to two
+    weeks between them. Past rentals were returned, the current one is rented
+    and later ones are approved (paid) or pending (unpaid); about one in ten
+    was cancelled, freeing its days and refunding its payment. Rows go in with
+    multi-row inserts and explicit ids, so the search index is not updated
+    (run create_search_index(rebuild=True)). Returns the row count per table.
+    """
+    from passwords import hash_password
+    from models import db, User, RentalItem, Rental, BlockedPeriod, Payment
+
+    if User.query.first():
+        raise RuntimeError('seed_scale() needs an empty database')
+
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    today = now.date()
+    user_count, owner_count, item_count = SCALE_USERS * scale, SCALE_OWNERS * scale, SCALE_ITEMS * scale
+    counts = {'user': user_count, 'rental_item': 0, 'rental': 0, 'blocked_period': 0, 'payment': 0}
+
+    password = hash_password(PASSWORD)
+    db.session.execute(User.__table__.insert(), [
+        {'id': i + 1, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password': password,
+         'phone': f'09{rng.randrange(10 ** 9):09d}', 'created_at': now - timedelta(days=rng.randrange(730))}
+        for i in range(user_count)
+    ])
+    # user0 .. user{owner_count - 1} list the items, everybody else rents them
+    renter_ids = range(owner_count + 1, user_count + 1)
+
+    items, rentals, periods, payments = [], [], [], []
+
+    def flush():
+        for table, rows in ((RentalItem.__table__, items), (Rental.__table__, rentals),
+                            (BlockedPeriod.__table__, periods), (Payment.__table__, payments)):
+            if rows:
+                db.session.execute(table.insert(), rows)
+                counts[table.name] += len(rows)
+                rows.clear()
+        db.session.commit()
+
+    for item_id in range(1, item_count + 1):
+        item = dict(listing(rng, rng.randrange(owner_count) + 1), id=item_id, is_available=True,
+                    created_at=now - timedelta(days=history_days + rng.randrange(365)))
+        items.append(item)
+
+        day = today - timedelta(days=history_days)
+        while True:
+            day += timedelta(days=rng.randint(0, 14))
+            length = rng.randint(2, 7)
+            last_day = day + timedelta(days=length - 1)
+            if last_day > today + timedelta(days=horizon_days):
+                break
+
+            if rng.random() < 0.1:
+                periods.append({'item_id': item_id, 'start_date': day, 'end_date': last_day,
+                                'reason': rng.choice(['owner_blocked', 'maintenance']), 'rental_id': None})
+                day = last_day + timedelta(days=1)
+                continue
+
+            rental_id = counts['rental'] + len(rentals) + 1
+            created_at = datetime.combine(day, datetime.min.time()) - timedelta(days=rng.randint(1, 30),
+                                                                                 seconds=rng.randrange(86400))
+            if last_day < today:
+                status = 'returned'
+            elif day <= today:
+                status = 'rented'
+            else:
+                status = 'approved' if rng.random() < 0.7 else 'pending'
+            cancelled = rng.random() < 0.1
+            paid = status != 'pending'
+
+            rentals.append({'id': rental_id, 'item_id': item_id, 'renter_id': rng.choice(renter_ids),
+                            'start_date': datetime.combine(day, datetime.min.time()),
+                            'end_date': datetime.combine(last_day, datetime.min.time()),
+                            'total_price': item['price'] * length,
+                            'status': 'cancelled' if cancelled else status, 'created_at': created_at})
+            if paid:
+                payments.append({'rental_id': rental_id, 'amount': item['price'] * length,
+                                 'method': rng.choice(['gcash', 'gcash', 'card', 'cash']),
+                                 'status': 'refunded' if cancelled else 'completed',
+                                 'transaction_id': f'TXN-{rental_id}-{created_at:%Y%m%d%H%M%S}',
+                                 'created_at': created_at + timedelta(minutes=rng.randint(1, 120))})
+            if not cancelled:
+                periods.append({'item_id': item_id, 'start_date': day, 'end_date': last_day,
+                                'reason': 'rented', 'rental_id': rental_id})
+                day = last_day + timedelta(days=1)
+
+        if len(periods) >= chunk_size:
+            flush()
+    flush()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill an empty database with synthetic RentalHub data.')
+    parser.add_argument('--database', required=True, help='SQLAlchemy URL, e.g. sqlite:////tmp/rentalhub.db')
+    parser.add_argument('--scale', type=int, default=1, help='multiples of 500 users and 1,000 listings')
+    parser.add_argument('--seed', type=int, default=17)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import create_app
+    from models import db
+    from search import create_search_index
+
+    app = create_app()
+    start = time.perf_counter()
+    with app.app_context():
+        db.create_all()
+        try:
+            counts = seed_scale(args.scale, rng_seed=args.seed)
+        except RuntimeError as e:
+            sys.exit(f'{e}: {args.database} already has users')
+        create_search_index(rebuild=True)
+    print(', '.join(f'{count:,} {table}' for table, count in counts.items())
+          + f' in {time.perf_counter() - start:.1f}s')
+    print(f'log in as user0 .. user{counts["user"] - 1} with password "{PASSWORD}"; '
+          f'the first {SCALE_OWNERS * args.scale} users own the listings')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Expiry of rentals that were booked but never paid.
+
+Booking blocks the rental's days at once, so an abandoned checkout would
+hold them forever. expire_unpaid_rentals() marks rentals still 'pending'
+RENTAL_HOLD_MINUTES after they were booked, with no payment on its way, as
+'expired' and deletes their blocked periods. A payment counts as on its way
+while it is completed, or pending or processing for less than
+PAYMENT_CONFIRM_MINUTES; a charge that completes after its rental expired
+is refunded by settle_payment(). Rentals are expired in batches of
+RENTAL_EXPIRY_BATCH_SIZE per transaction, with one UPDATE and one DELETE
+each.
+
+wsgi.py starts a sweeper thread in every worker that runs it each
+RENTAL_EXPIRY_INTERVAL seconds; sweeps of several workers skip what another
+one already expired. Each sweep first queues again the payments a restart
+left pending, see requeue_stale_payments() in payments.py.
+`flask --app app expire-rentals` runs one sweep, e.g. from cron.
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, BlockedPeriod, Payment, Rental, lock_items_availability
+from payments import requeue_stale_payments
+
+# A payment in one of these states may still approve the rental, for PAYMENT_CONFIRM_MINUTES
+UNSETTLED_PAYMENT_STATUSES = ('pending', 'processing')
+
+
+def _unpaid(cutoff, payment_cutoff):
+    """Conditions of a rental whose hold ran out before cutoff, with no payment since payment_cutoff"""
+    live_payment = db.or_(
+        Payment.status == 'completed',
+        db.and_(Payment.status.in_(UNSETTLED_PAYMENT_STATUSES), Payment.created_at >= payment_cutoff),
+    )
+    return (
+        Rental.status == 'pending',
+        Rental.created_at < cutoff,
+        ~db.exists().where(Payment.rental_id == Rental.id, live_payment),
+    )
+
+
+def expire_unpaid_rentals(now=None, batch_size=None):
+    """Expire every unpaid rental past its hold and release its days.
+
+    Returns (rentals expired, blocked days released).
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=config['RENTAL_HOLD_MINUTES'])
+    unpaid = _unpaid(cutoff, now - timedelta(minutes=config['PAYMENT_CONFIRM_MINUTES']))
+    batch_size = batch_size or config['RENTAL_EXPIRY_BATCH_SIZE']
+    expired = days = 0
+    while True:
+        batch = db.session.execute(db.select(Rental.id, Rental.item_id).where(*unpaid).order_by(
+            Rental.created_at).limit(batch_size)).all()
+        if not batch:
+            break
+        rental_ids = [rental_id for rental_id, _ in batch]
+
+        lock_items_availability({item_id for _, item_id in batch})
+        # Checked again under the lock: a payment may have arrived since the select
+        count = db.session.execute(db.update(Rental).where(Rental.id.in_(rental_ids), *unpaid).values(
+            status='expired'
+        ).execution_options(synchronize_session=False)).rowcount
+        # By id alone, so the lookup is by primary key, not through the growing set of expired rentals
+        released = [rental_id for rental_id, status in db.session.execute(
+            db.select(Rental.id, Rental.status).where(Rental.id.in_(rental_ids))) if status == 'expired']
+        periods = db.session.execute(db.select(BlockedPeriod.start_date, BlockedPeriod.end_date).where(
+            BlockedPeriod.rental_id.in_(released))).all()
+        db.session.execute(db.delete(BlockedPeriod).where(BlockedPeriod.rental_id.in_(released)).execution_options(
+            synchronize_session=False))
+        db.session.commit()
+
+        expired += count
+        days += sum((end - start).days + 1 for start, end in periods)
+        if len(batch) < batch_size:
+            break
+    return expired, days
+
+
+def sweep(app):
+    """Requeue stale payments, then one expiry sweep, recorded on /metrics"""
+    with app.app_context():
+        try:
+            requeued = requeue_stale_payments()
+            if requeued:
+                print(f"Queued {requeued} stale pending payments again")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error requeueing stale payments: {e}")
+        start = time.perf_counter()
+        try:
+            expired, days = expire_unpaid_rentals()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error expiring unpaid rentals: {e}")
+            return
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.inc(metrics.rentals_expired, amount=expired)
+            metrics.inc(metrics.days_reclaimed, amount=days)
+            metrics.observe(metrics.expiry_sweep_seconds, time.perf_counter() - start)
+
+
+_sweeper = None
+
+
+def start_expiry_sweeper(app):
+    """Sweep every RENTAL_EXPIRY_INTERVAL seconds on a daemon thread of this process; 0 turns it off"""
+    global _sweeper
+    interval = app.config['RENTAL_EXPIRY_INTERVAL']
+    if _sweeper is not None or interval <= 0:
+        return
+
+    def run():
+        while True:
+            # Jittered, so the workers of one server do not all sweep at the same moment
+            time.sleep(interval * random.uniform(0.8, 1.2))
+            sweep(app)
+
+    _sweeper = threading.Thread(target=run, name='rental-expiry', daemon=True)
+    _sweeper.start()
@@ -0,0 +1,110 @@
+"""Streaming CSV and NDJSON exports of rentals, payments and blocked periods.
+
+export_chunks() selects plain columns (no ORM objects) and reads them with
+yield_per, so the driver hands over EXPORT_BATCH_SIZE rows at a time and
+each batch is written out and dropped before the next one is fetched. Served
+through a generator response, an export of millions of rows holds one batch
+in memory, not the whole table.
+
+Owners export their own listings from /export/<dataset>; the accounting
+team runs `flask --app app export <dataset>` over everything.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from models import db, BlockedPeriod, Payment, Rental, RentalItem, User
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Rental dates are stored as datetimes at midnight but mean whole days
+_DATE_ONLY = {'start_date', 'end_date'}
+
+
+def _rentals():
+    return db.select(
+        Rental.id, Rental.item_id, RentalItem.title.label('item_title'), RentalItem.owner_id,
+        Rental.renter_id, User.username.label('renter'), Rental.start_date, Rental.end_date,
+        Rental.total_price, Rental.status, Rental.created_at
+    ).outerjoin(RentalItem, Rental.item_id == RentalItem.id).outerjoin(User, Rental.renter_id == User.id)
+
+
+def _payments():
+    return db.select(
+        Payment.id, Payment.rental_id, Rental.item_id, RentalItem.owner_id, Rental.renter_id,
+        Payment.amount, Payment.method, Payment.status, Payment.transaction_id, Payment.created_at
+    ).outerjoin(Rental, Payment.rental_id == Rental.id).outerjoin(RentalItem, Rental.item_id == RentalItem.id)
+
+
+def _blocked_periods():
+    return db.select(
+        BlockedPeriod.id, BlockedPeriod.item_id, RentalItem.owner_id, BlockedPeriod.start_date,
+        BlockedPeriod.end_date, BlockedPeriod.reason, BlockedPeriod.rental_id
+    ).outerjoin(RentalItem, BlockedPeriod.item_id == RentalItem.id)
+
+
+# dataset: (base query, id column for the order, item column, (first day, last day) columns of the date filter)
+DATASETS = {
+    'rentals': (_rentals, Rental.id, Rental.item_id, (Rental.start_date, Rental.end_date)),
+    'payments': (_payments, Payment.id, Rental.item_id, (Payment.created_at, Payment.created_at)),
+    'blocked-periods': (_blocked_periods, BlockedPeriod.id, BlockedPeriod.item_id,
+                        (BlockedPeriod.start_date, BlockedPeriod.end_date)),
+}
+
+
+def export_query(dataset, owner_id=None, item_id=None, since=None, until=None):
+    """The select of one dataset, narrowed to an owner's items, one item and rows touching since..until.
+
+    Rentals and blocked periods match when they overlap the range, payments
+    when they were made within it. since and until are inclusive dates.
+    """
+    build, id_column, item_column, (first_day, last_day) = DATASETS[dataset]
+    query = build()
+    if owner_id is not None:
+        query = query.where(RentalItem.owner_id == owner_id)
+    if item_id is not None:
+        query = query.where(item_column == item_id)
+    if since is not None:
+        query = query.where(last_day >= _day_bound(last_day, since))
+    if until is not None:
+        # Before the start of the next day, so datetimes during the last day count
+        query = query.where(first_day < _day_bound(first_day, until + timedelta(days=1)))
+    return query.order_by(id_column)
+
+
+def _day_bound(column, day):
+    """day as a value comparable with column, midnight for DateTime columns"""
+    return day if column.type.python_type is date else datetime.combine(day, datetime.min.time())
+
+
+def _value(name, value):
+    if isinstance(value, datetime):
+        return value.date().isoformat() if name in _DATE_ONLY else value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def export_chunks(dataset, fmt, batch_size=None, **filters):
+    """Yield an export as text, one chunk per batch of rows, CSV starting with its header"""
+    result = db.session.execute(export_query(dataset, **filters).execution_options(
+        yield_per=batch_size or current_app.config['EXPORT_BATCH_SIZE']))
+    columns = list(result.keys())
+
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        for rows in result.partitions():
+            writer.writerows([_value(name, value) for name, value in zip(columns, row)] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()  # the header of an export without rows
+    else:
+        for rows in result.partitions():
+            yield ''.join(json.dumps({name: _value(name, value) for name, value in zip(columns, row)}) + '\n'
+                          for row in rows)
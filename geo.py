@@ -0,0 +1,256 @@
+"""Listing locations: the gazetteer, place resolution and nearby search.
+
+The place table holds the cities and barangays of data/cebu_places.csv with
+their coordinates. resolve_place() maps an owner's free-text location, e.g.
+"lahug, cebu city" or "Lahug, Cebu", to one place, and every item stores the
+place it resolved to and its coordinates. /items then filters a location by
+place instead of LIKE, and ?within=<km> lists items around it, nearest
+first.
+
+On SQLite an R*Tree of item coordinates, kept current by triggers, answers
+the bounding box of a nearby search; other databases, or a database whose
+index has not been built yet, filter the coordinates of every item.
+"""
+import csv
+import math
+import os
+import re
+import unicodedata
+
+from flask import current_app
+
+from models import db, Place, RentalItem, forget_optional_table, optional_table_exists
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cebu_places.csv')
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LON = 111.320  # at the equator, times cos(latitude) elsewhere
+# Share of the catalog in the search box above which filtering the coordinates of every item
+# is faster than looking up the box's items by id (about the break-even in bench_locations.py)
+LOCATION_INDEX_MAX_SHARE = 0.1
+# Words that say what kind of place follows but not which one
+_NOISE_WORDS = {'city', 'brgy', 'barangay', 'municipality', 'of', 'province', 'philippines'}
+
+location_index = db.table('rental_item_rtree', db.column('id'), db.column('min_lat'), db.column('max_lat'),
+                          db.column('min_lon'), db.column('max_lon'))
+LOCATION_INDEX_DDL = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS rental_item_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)',
+    """CREATE TRIGGER IF NOT EXISTS trg_rental_item_rtree_insert AFTER INSERT ON rental_item
+    WHEN NEW.latitude IS NOT NULL BEGIN
+        INSERT INTO rental_item_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_rental_item_rtree_update AFTER UPDATE OF latitude, longitude ON rental_item
+    BEGIN
+        DELETE FROM rental_item_rtree WHERE id = OLD.id;
+        INSERT INTO rental_item_rtree SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+        WHERE NEW.latitude IS NOT NULL;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_rental_item_rtree_delete AFTER DELETE ON rental_item BEGIN
+        DELETE FROM rental_item_rtree WHERE id = OLD.id;
+    END""",
+]
+
+
+def location_index_available():
+    if not current_app.config['LOCATION_INDEX_ENABLED'] or db.engine.dialect.name != 'sqlite':
+        return False
+    return optional_table_exists('rental_item_rtree')
+
+
+def normalize_place(text):
+    """Lowercase words of a place name without accents, punctuation or words like 'city'"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode().lower()
+    return ' '.join(word for word in re.findall(r'[a-z0-9]+', text) if word not in _NOISE_WORDS)
+
+
+def _gazetteer():
+    """[(normalized name, place id, kind, city, latitude, longitude, name)] in gazetteer order.
+
+    Kept in the app's gazetteer_cache, which load_gazetteer() clears, so other
+    processes see places it adds within GAZETTEER_REFRESH seconds.
+    """
+    cache = current_app.extensions['gazetteer_cache']
+    places = cache.get('places')
+    if places is None:
+        places = [(normalize_place(place.name), place.id, place.kind, place.city, place.latitude, place.longitude,
+                   place.name) for place in Place.query.order_by(Place.id)]
+        cache.set('places', places)
+    return places
+
+
+def load_gazetteer(path=GAZETTEER_PATH):
+    """Add the places of a gazetteer CSV (name, city, kind, latitude, longitude), updating known ones.
+
+    Returns the number of places in the file.
+    """
+    existing = {(place.name, place.city): place for place in Place.query}
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        place = existing.get((row['name'], row['city']))
+        if place is None:
+            place = Place(name=row['name'], city=row['city'])
+            db.session.add(place)
+        place.kind = row['kind']
+        place.latitude = float(row['latitude'])
+        place.longitude = float(row['longitude'])
+    db.session.commit()
+    current_app.extensions['gazetteer_cache'].clear()
+    return len(rows)
+
+
+def resolve_place(text):
+    """The gazetteer place a free-text location names, as a row of _gazetteer(), or None.
+
+    A barangay wins over a city, and of two barangays with the same name the
+    one whose city the text also names. Otherwise the place named first wins:
+    "Mandaue, Cebu" is Mandaue City.
+    """
+    words = f' {normalize_place(text or "")} '
+    named = [(words.find(f' {key} '), place) for place in _gazetteer()
+             for key in (place[0],) if key and f' {key} ' in words]
+    if not named:
+        return None
+    cities = {place[3] for _, place in named if place[2] == 'city'}
+    barangays = [place for _, place in named if place[2] == 'barangay']
+    if barangays:
+        return next((place for place in barangays if place[3] in cities), barangays[0])
+    return min(named, key=lambda pair: pair[0])[1]
+
+
+def locate_item(item):
+    """Set an item's place and coordinates from its location text, before it is flushed"""
+    place = resolve_place(item.location)
+    item.place_id, item.latitude, item.longitude = (place[1], place[4], place[5]) if place else (None, None, None)
+
+
+def geocode_items(only_missing=True):
+    """Resolve the location text of items, one UPDATE per distinct text; returns the items placed"""
+    query = db.session.query(RentalItem.location).distinct()
+    if only_missing:
+        query = query.filter(RentalItem.place_id.is_(None))
+    placed = 0
+    for location, in query.all():
+        place = resolve_place(location)
+        if place is None:
+            continue
+        update = db.update(RentalItem).where(RentalItem.location == location)
+        if only_missing:
+            update = update.where(RentalItem.place_id.is_(None))
+        placed += db.session.execute(update.values(place_id=place[1], latitude=place[4],
+                                                   longitude=place[5])).rowcount
+    db.session.commit()
+    return placed
+
+
+def create_location_index(rebuild=False):
+    """Load the gazetteer if the place table is empty, place unplaced items and build the R*Tree.
+
+    rebuild resolves every item again and refills the R*Tree. Returns the
+    number of items placed.
+    """
+    if not Place.query.first():
+        load_gazetteer()
+    if db.engine.dialect.name == 'sqlite':
+        created = not db.inspect(db.engine).has_table('rental_item_rtree')
+        for statement in LOCATION_INDEX_DDL:
+            db.session.execute(db.text(statement))
+        if created or rebuild:
+            db.session.execute(db.text('DELETE FROM rental_item_rtree'))
+            db.session.execute(db.text(
+                'INSERT INTO rental_item_rtree SELECT id, latitude, latitude, longitude, longitude '
+                'FROM rental_item WHERE latitude IS NOT NULL'
+            ))
+        db.session.commit()
+        forget_optional_table('rental_item_rtree')
+    return geocode_items(only_missing=not rebuild)
+
+
+def places_by_id():
+    """{place id: row of _gazetteer()}"""
+    return {place[1]: place for place in _gazetteer()}
+
+
+def places_in(place):
+    """Ids of a place and, for a city, of its barangays"""
+    if place[2] == 'barangay':
+        return [place[1]]
+    return [row[1] for row in _gazetteer() if row[3] == place[3]]
+
+
+def parse_radius(args):
+    """The ?within=<km> radius of a nearby search, or None; capped at MAX_SEARCH_RADIUS_KM"""
+    try:
+        radius = float(args.get('within', ''))
+    except ValueError:
+        return None
+    if not radius > 0:
+        return None
+    return min(radius, current_app.config['MAX_SEARCH_RADIUS_KM'])
+
+
+def parse_center(args):
+    """(latitude, longitude) of ?lat=&lon=, or of the place ?location= names; None if neither works"""
+    try:
+        latitude, longitude = float(args['lat']), float(args['lon'])
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+    except (KeyError, ValueError):
+        pass
+    place = resolve_place(args.get('location', ''))
+    return (place[4], place[5]) if place else None
+
+
+def nearby_search(args):
+    """(center, radius) of the nearby search in args, or None"""
+    radius = parse_radius(args)
+    center = parse_center(args) if radius else None
+    return (center, radius) if center else None
+
+
+def item_distances(items, center):
+    """{item id: km from center} of the items that have coordinates"""
+    return {item.id: distance_km(center, item.latitude, item.longitude) for item in items
+            if item.latitude is not None}
+
+
+def _box_is_selective(box):
+    """Whether at most LOCATION_INDEX_MAX_SHARE of the catalog lies in an R*Tree box.
+
+    Looks in the R*Tree alone, and no further than that share.
+    """
+    catalog = db.session.scalar(db.select(db.func.max(RentalItem.id))) or 0
+    share = int(catalog * LOCATION_INDEX_MAX_SHARE)
+    return db.session.scalar(db.select(location_index.c.id).where(*box).offset(share).limit(1)) is None
+
+
+def distance_km(center, latitude, longitude):
+    """Great-circle distance between center and a point"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*center, latitude, longitude))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def filter_nearby(query, center, radius):
+    """Narrow an item query to items within radius km of center.
+
+    Returns (query, rank): rank is the squared distance in km, flat-earth,
+    which orders items like their real distance at catalog scale.
+    """
+    latitude, longitude = center
+    lon_km = KM_PER_DEGREE_LON * math.cos(math.radians(latitude))
+    dlat, dlon = radius / KM_PER_DEGREE_LAT, radius / lon_km
+    box = (location_index.c.min_lat <= latitude + dlat, location_index.c.max_lat >= latitude - dlat,
+           location_index.c.min_lon <= longitude + dlon, location_index.c.max_lon >= longitude - dlon)
+    if location_index_available() and _box_is_selective(box):
+        # A subquery rather than a join, so SQLite searches the R*Tree first and looks the
+        # items in the box up by id, instead of probing the R*Tree once per listed item
+        query = query.filter(RentalItem.id.in_(db.select(location_index.c.id).where(*box)))
+    else:
+        query = query.filter(RentalItem.latitude.between(latitude - dlat, latitude + dlat),
+                             RentalItem.longitude.between(longitude - dlon, longitude + dlon))
+
+    north = (RentalItem.latitude - latitude) * KM_PER_DEGREE_LAT
+    east = (RentalItem.longitude - longitude) * lon_km
+    rank = north * north + east * east
+    # The box has corners further away than radius
+    return query.filter(rank <= radius * radius), rank
@@ -0,0 +1,103 @@
+"""Derivatives for uploaded listing images.
+
+These functions run inside the image worker processes, so this module only
+depends on Pillow and must not import the Flask app. The web process imports
+it for the file naming helpers alone, so Pillow is imported where it is used.
+"""
+import os
+
+FULL_SIZE = (1200, 1200)
+THUMBNAIL_SIZE = (300, 300)
+
+# Pillow format name and file extension of each variant format
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+VARIANT_QUALITY = {'webp': 80, 'jpeg': 82}
+
+
+def variant_name(filename, width, fmt):
+    """File name of the `width` pixel wide `fmt` variant of an upload"""
+    stem = filename.rsplit('.', 1)[0]
+    return f"{width}w_{stem}.{VARIANT_FORMATS[fmt][1]}"
+
+
+def _save(image, path, image_format, **options):
+    # Write next to the target and rename, so a half-written file is never served
+    tmp_path = f"{path}.tmp"
+    image.save(tmp_path, image_format, **options)
+    os.replace(tmp_path, path)
+
+
+def save_variants(image, upload_folder, filename, widths, formats):
+    """Write every width/format variant of an RGB image.
+
+    Images are never upscaled: widths at or beyond the source are replaced
+    by one variant at the source's own width. Returns the widths written,
+    which are the ones a srcset may offer.
+    """
+    from PIL import Image
+
+    written = sorted({width for width in widths if width < image.width})
+    if any(width >= image.width for width in widths):
+        written.append(image.width)
+    for width in written:
+        variant = image
+        if width < image.width:
+            height = round(image.height * width / image.width)
+            variant = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            image_format, _ = VARIANT_FORMATS[fmt]
+            _save(variant, os.path.join(upload_folder, variant_name(filename, width, fmt)), image_format,
+                  quality=VARIANT_QUALITY[fmt], optimize=True)
+    return written
+
+
+def matches_widths(written, widths):
+    """Whether written is what save_variants() writes for widths, from a source of some width"""
+    if not written:
+        return False
+    source = written[-1]
+    return (written[:-1] == sorted({width for width in widths if width < source})
+            and (source in widths or any(width > source for width in widths)))
+
+
+def process_upload(source_path, upload_folder, filename, widths=(), formats=()):
+    """Resize a raw upload into the full-size image, its thumbnail and variants.
+
+    The raw file is removed once everything is written. Returns the variant
+    widths written.
+    """
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        image.thumbnail(FULL_SIZE, Image.Resampling.LANCZOS)
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        _save(image, os.path.join(upload_folder, filename), 'JPEG', quality=85)
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        _save(thumbnail, os.path.join(upload_folder, f"thumb_{filename}"), 'JPEG', quality=80)
+
+        written = save_variants(image, upload_folder, filename, widths, formats)
+
+    os.remove(source_path)
+    return written
+
+
+def backfill_variants(upload_folder, filename, widths, formats):
+    """Create the variants of an already processed full-size image"""
+    from PIL import Image
+
+    with Image.open(os.path.join(upload_folder, filename)) as image:
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return save_variants(image, upload_folder, filename, widths, formats)
+
+
+def variant_files(filename, widths, formats):
+    return [variant_name(filename, width, fmt) for width in widths for fmt in formats]
@@ -0,0 +1,243 @@
+"""Request timing metrics in the Prometheus text format.
+
+init_app() times every request and records its endpoint latency, the number
+and total time of its SQL statements and the time spent rendering templates.
+Other code records into the same registry through app.extensions['metrics'],
+e.g. the image and payment jobs and the expiry sweeper, and the hit counts of
+the app's caches are read at scrape time. With METRICS_TOKEN set, /metrics
+serves the registry to scrapers that send the token as a bearer token, and
+with SERVER_TIMING on, each response carries the same numbers in a
+Server-Timing header for the browser's network panel.
+
+Metrics live in the process that records them: with several gunicorn
+workers, each one reports its own counts.
+"""
+import bisect
+import hmac
+import threading
+import time
+
+from flask import Response, abort, current_app, g, has_app_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self._values.items()):
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            # Per-bucket counts (the last one is +Inf), sum
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, f"le={_bound(bound)}")} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+def _bound(bound):
+    return f'"{bound}"' if isinstance(bound, str) else f'"{float(bound)!r}"'
+
+
+class Metrics:
+    """The registry of one process. Recording takes a lock, rendering copies nothing."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter('rentalhub_http_requests_total', 'Requests served.',
+                                ('endpoint', 'method', 'status'))
+        self.request_seconds = Histogram('rentalhub_http_request_duration_seconds', 'Time to build a response.',
+                                         ('endpoint', 'method'))
+        self.db_queries = Histogram('rentalhub_db_queries_per_request', 'SQL statements run by one request.',
+                                    ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.db_seconds = Histogram('rentalhub_db_seconds_per_request', 'Time one request spent in SQL.',
+                                    ('endpoint',))
+        self.template_seconds = Histogram('rentalhub_template_render_seconds', 'Time to render a template.',
+                                          ('template',))
+        self.image_seconds = Histogram('rentalhub_image_job_seconds',
+                                       'Time from queueing an upload to its image job finishing.',
+                                       ('outcome',), (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+        self.payment_seconds = Histogram('rentalhub_payment_job_seconds',
+                                         'Time from queueing a payment to the gateway answering it.',
+                                         ('outcome',), (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+        self.rentals_expired = Counter('rentalhub_rentals_expired_total',
+                                       'Unpaid rentals expired after their hold ran out.')
+        self.days_reclaimed = Counter('rentalhub_blocked_days_reclaimed_total',
+                                      'Blocked days released by expiring unpaid rentals.')
+        self.expiry_sweep_seconds = Histogram('rentalhub_expiry_sweep_seconds', 'Time one expiry sweep took.')
+        self.caches = {}  # name: any object with stats()
+
+    def observe(self, histogram, value, *labels):
+        with self.lock:
+            histogram.observe(value, *labels)
+
+    def inc(self, counter, *labels, amount=1):
+        with self.lock:
+            counter.inc(*labels, amount=amount)
+
+    def cache_lookups(self):
+        lookups = Counter('rentalhub_cache_lookups_total', 'Cache lookups by result.', ('cache', 'result'))
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            lookups.inc(name, 'hit', amount=stats['hits'])
+            lookups.inc(name, 'miss', amount=stats['misses'])
+        return lookups
+
+    def render(self):
+        lookups = self.cache_lookups()
+        with self.lock:
+            families = [self.requests, self.request_seconds, self.db_queries, self.db_seconds,
+                        self.template_seconds, self.image_seconds, self.payment_seconds,
+                        self.rentals_expired, self.days_reclaimed, self.expiry_sweep_seconds, lookups]
+            return '\n'.join(line for family in families for line in family.render()) + '\n'
+
+
+class RequestTimer:
+    """Timings of the request being served, kept on flask.g"""
+    __slots__ = ('start', 'sql_count', 'sql_seconds', 'template_seconds', 'template_starts')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_starts = []
+
+
+def _timer():
+    return g.get('request_timer') if has_app_context() else None
+
+
+def serve_metrics():
+    """Prometheus scrape target; a 404 unless the request carries the METRICS_TOKEN bearer token"""
+    expected = f"Bearer {current_app.config['METRICS_TOKEN']}".encode()
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        abort(404)
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app, db):
+    """Record request, SQL and template timings of app into app.extensions['metrics']"""
+    metrics = app.extensions['metrics'] = Metrics()
+    metrics.caches = {name.removesuffix('_cache'): extension for name, extension in app.extensions.items()
+                      if name.endswith('_cache')}
+
+    @app.before_request
+    def start_request_timer():
+        g.request_timer = RequestTimer()
+
+    @app.after_request
+    def record_request_timer(response):
+        timer = g.pop('request_timer', None)
+        if timer is None:
+            return response
+        elapsed = time.perf_counter() - timer.start
+        endpoint = request.url_rule.endpoint if request.url_rule else 'unmatched'
+        with metrics.lock:
+            metrics.requests.inc(endpoint, request.method, response.status_code)
+            metrics.request_seconds.observe(elapsed, endpoint, request.method)
+            metrics.db_queries.observe(timer.sql_count, endpoint)
+            metrics.db_seconds.observe(timer.sql_seconds, endpoint)
+
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'app;dur={elapsed * 1000:.1f}, '
+                f'db;dur={timer.sql_seconds * 1000:.1f};desc="{timer.sql_count} queries", '
+                f'tpl;dur={timer.template_seconds * 1000:.1f}'
+            )
+        return response
+
+    # The start time lives on the statement's execution context, which a failed statement
+    # leaves behind with it, rather than on the pooled connection
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_query_start = time.perf_counter()
+
+    def record_statement(context):
+        started = getattr(context, 'metrics_query_start', None)
+        timer = _timer()
+        if started is not None and timer is not None:
+            timer.sql_count += 1
+            timer.sql_seconds += time.perf_counter() - started
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        record_statement(context)
+
+    def handle_error(exception_context):
+        # A statement that raised, e.g. on the overlap trigger or a locked database, still ran
+        if exception_context.execution_context is not None:
+            record_statement(exception_context.execution_context)
+
+    def before_render(sender, template, context, **extra):
+        timer = _timer()
+        if timer is not None:
+            timer.template_starts.append(time.perf_counter())
+
+    def after_render(sender, template, context, **extra):
+        timer = _timer()
+        if timer is not None and timer.template_starts:
+            elapsed = time.perf_counter() - timer.template_starts.pop()
+            # Only the outermost render counts towards the request, includes are part of it
+            if not timer.template_starts:
+                timer.template_seconds += elapsed
+            metrics.observe(metrics.template_seconds, elapsed, template.name)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(db.engine, 'handle_error', handle_error)
+    before_render_template.connect(before_render, app, weak=False)
+    template_rendered.connect(after_render, app, weak=False)
+    # Timings are not for the public: without a token there is no scrape target at all
+    if app.config['METRICS_TOKEN']:
+        app.add_url_rule('/metrics', 'metrics', serve_metrics)
+    return metrics
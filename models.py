@@ -0,0 +1,383 @@
+"""Database models and the extensions they are bound to.
+
+db and login_manager are created unbound here and attached to the app by
+create_app(), so importing the models never builds an application.
+"""
+from datetime import datetime
+
+from flask import current_app, url_for
+from flask_login import LoginManager, UserMixin
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+
+import images
+
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+login_manager.login_message_category = 'error'
+
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+    phone = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Place(db.Model):
+    """A city or municipality, or a barangay of one, from the bundled gazetteer"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    city = db.Column(db.String(100), nullable=False)  # the place itself for a city
+    kind = db.Column(db.String(20), nullable=False)  # 'city' or 'barangay'
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('uq_place_name_city', 'name', 'city', unique=True),
+    )
+
+    @property
+    def label(self):
+        return self.name if self.kind == 'city' else f'{self.name}, {self.city}'
+
+
+class RentalItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    location = db.Column(db.String(100), nullable=False)
+    # The gazetteer place the location text was resolved to, and its coordinates (see geo.py)
+    place_id = db.Column(db.Integer, db.ForeignKey('place.id'))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    category = db.Column(db.String(50), nullable=False)
+    image_filename = db.Column(db.String(300))
+    image_status = db.Column(db.String(20))  # 'pending', 'ready' or 'failed'; None for older items
+    image_attempts = db.Column(db.Integer, default=0)
+    image_widths = db.Column(db.String(50))  # comma-separated widths of the srcset variants
+    availability_version = db.Column(db.Integer, default=0)  # bumped by every booking or block of the item
+    rental_count = db.Column(db.Integer, default=0)  # rentals in BOOKED_RENTAL_STATUSES, see CATALOG_TRIGGERS
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    is_available = db.Column(db.Boolean, default=True)
+
+    owner = db.relationship('User', backref=db.backref('items', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_rental_item_available_category', 'is_available', 'category'),
+        db.Index('ix_rental_item_available_id', 'is_available', 'id'),
+        db.Index('ix_rental_item_owner_created', 'owner_id', 'created_at'),
+        db.Index('ix_rental_item_place_available_id', 'place_id', 'is_available', 'id'),
+        # Catalog sorts; SQLite appends the id, the cursor's tie-breaker. The price index also
+        # covers the facet counts of a price range, so those never read the table.
+        db.Index('ix_rental_item_available_price', 'is_available', 'price', 'category', 'place_id'),
+        db.Index('ix_rental_item_available_rental_count', 'is_available', 'rental_count'),
+    )
+
+    @property
+    def image_ready(self):
+        # Items listed before background processing have finished images but no status
+        return bool(self.image_filename) and self.image_status in (None, 'ready')
+
+    @property
+    def image_url(self):
+        if self.image_ready:
+            return url_for('uploaded_file', filename=self.image_filename)
+        if self.image_status == 'pending':
+            return url_for('static', filename='images/image-processing.svg')
+        return url_for('static', filename='images/default-item.jpg')
+
+    @property
+    def thumbnail_url(self):
+        if self.image_ready:
+            return url_for('uploaded_file', filename=f"thumb_{self.image_filename}")
+        if self.image_status == 'pending':
+            return url_for('static', filename='images/image-processing.svg')
+        return url_for('static', filename='images/default-item.jpg')
+
+    @property
+    def variant_widths(self):
+        if not self.image_ready or not self.image_widths:
+            return []
+        return [int(width) for width in self.image_widths.split(',')]
+
+    def srcset(self, fmt='jpeg'):
+        """srcset attribute value for the image variants in one format, '' if there are none"""
+        return ', '.join(
+            f"{url_for('uploaded_file', filename=images.variant_name(self.image_filename, width, fmt))} {width}w"
+            for width in self.variant_widths
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'price': self.price,
+            'location': self.location,
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'category': self.category,
+            'owner': self.owner.username,
+            'image_url': self.image_url,
+            'thumbnail_url': self.thumbnail_url,
+            'srcset': {fmt: self.srcset(fmt) for fmt in current_app.config['IMAGE_FORMATS']},
+            'url': url_for('renter.rent_item', item_id=self.id),
+        }
+
+
+class BlockedPeriod(db.Model):
+    """An inclusive range of days on which an item cannot be rented"""
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('rental_item.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(100))  # e.g., 'rented', 'maintenance', 'owner_blocked'
+    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=True, index=True)
+
+    item = db.relationship('RentalItem', backref=db.backref('blocked_periods', lazy=True))
+    rental = db.relationship('Rental', backref=db.backref('blocked_periods', lazy=True))
+
+    # Periods of one item never overlap, so each starts on a distinct day.
+    # Overlap checks seek on (item_id, end_date >= start) and filter start_date <= end.
+    __table_args__ = (
+        db.Index('uq_blocked_period_item_start', 'item_id', 'start_date', unique=True),
+        db.Index('ix_blocked_period_item_end', 'item_id', 'end_date'),
+    )
+
+    @property
+    def days(self):
+        return (self.end_date - self.start_date).days + 1
+
+
+# SQLite has no exclusion constraints, so a trigger rejects any period that
+# overlaps another period of the same item, whichever code path inserts it
+BLOCKED_PERIOD_OVERLAP_TRIGGER = DDL("""
+CREATE TRIGGER IF NOT EXISTS trg_blocked_period_no_overlap
+BEFORE INSERT ON blocked_period
+WHEN EXISTS (SELECT 1 FROM blocked_period
+             WHERE item_id = NEW.item_id AND end_date >= NEW.start_date AND start_date <= NEW.end_date)
+BEGIN
+    SELECT RAISE(ABORT, 'blocked period overlaps an existing period');
+END
+""")
+event.listen(BlockedPeriod.__table__, 'after_create', BLOCKED_PERIOD_OVERLAP_TRIGGER.execute_if(dialect='sqlite'))
+
+
+class Rental(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('rental_item.id'), nullable=False)
+    renter_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    item = db.relationship('RentalItem', backref=db.backref('rentals', lazy=True))
+    renter = db.relationship('User', backref=db.backref('rentals', lazy=True))
+
+    __table_args__ = (
+        db.Index('ix_rental_renter_created', 'renter_id', 'created_at'),
+        db.Index('ix_rental_item_status', 'item_id', 'status'),
+        db.Index('ix_rental_status_created', 'status', 'created_at'),
+    )
+
+    def create_blocked_dates(self):
+        """Block the whole rental period with a single interval"""
+        # reserve_item_dates has already taken the calendar lock, which retires the cached calendar
+        db.session.add(BlockedPeriod(
+            item_id=self.item_id,
+            start_date=self.start_date.date(),
+            end_date=self.end_date.date(),
+            reason='rented',
+            rental_id=self.id
+        ))
+
+    def remove_blocked_dates(self):
+        """Remove blocked dates associated with this rental"""
+        lock_item_availability(self.item_id)
+        BlockedPeriod.query.filter_by(rental_id=self.id).delete()
+
+
+class Payment(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    rental_id = db.Column(db.Integer, db.ForeignKey('rental.id'), nullable=False, index=True)
+    amount = db.Column(db.Float, nullable=False)
+    method = db.Column(db.String(20), nullable=False)
+    # 'pending' (queued), 'processing' (the gateway will call back), 'completed', 'failed' or 'refunded'
+    status = db.Column(db.String(20), default='pending')
+    transaction_id = db.Column(db.String(100))  # the gateway's reference
+    idempotency_key = db.Column(db.String(64), unique=True, index=True)  # None for payments made before keys
+    attempts = db.Column(db.Integer, default=0)  # gateway calls made for the current key
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    rental = db.relationship('Rental', backref=db.backref('payment', uselist=False))
+
+
+ACTIVE_RENTAL_STATUSES = ('approved', 'rented')
+# Rentals that count towards an item's popularity: abandoned, cancelled and expired ones do not
+BOOKED_RENTAL_STATUSES = ('approved', 'rented', 'returned')
+
+
+class UserStats(db.Model):
+    """Dashboard counters of one user, kept current by the USER_STATS_TRIGGERS"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    rentals = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    active_rentals = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    completed_payments = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    listings = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    pending_requests = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # on own listings
+
+
+def _rental_stats(row, sign):
+    """Statements adding (sign 1) or removing (sign -1) a rental row from the counters"""
+    active = ', '.join(f"'{status}'" for status in ACTIVE_RENTAL_STATUSES)
+    return f"""
+    INSERT OR IGNORE INTO user_stats (user_id) VALUES ({row}.renter_id);
+    UPDATE user_stats SET rentals = rentals + {sign},
+                          active_rentals = active_rentals + {sign} * ({row}.status IN ({active}))
+    WHERE user_id = {row}.renter_id;
+    UPDATE user_stats SET completed_payments = completed_payments + {sign} * (
+                              SELECT count(*) FROM payment WHERE rental_id = {row}.id AND status = 'completed')
+    WHERE user_id = {row}.renter_id;
+    UPDATE user_stats SET pending_requests = pending_requests + {sign}
+    WHERE {row}.status = 'pending' AND user_id = (SELECT owner_id FROM rental_item WHERE id = {row}.item_id);"""
+
+
+def _payment_stats(row, sign):
+    return f"""
+    UPDATE user_stats SET completed_payments = completed_payments + {sign}
+    WHERE {row}.status = 'completed' AND user_id = (SELECT renter_id FROM rental WHERE id = {row}.rental_id);"""
+
+
+def _item_stats(row, sign):
+    # Rentals of a deleted item no longer show as requests, like the join the dashboard used to run
+    return f"""
+    INSERT OR IGNORE INTO user_stats (user_id) VALUES ({row}.owner_id);
+    UPDATE user_stats SET listings = listings + {sign},
+                          pending_requests = pending_requests + {sign} * (
+                              SELECT count(*) FROM rental WHERE item_id = {row}.id AND status = 'pending')
+    WHERE user_id = {row}.owner_id;"""
+
+
+def _trigger(name, event_, table, body):
+    return DDL(f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {event_} ON {table}\nBEGIN{body}\nEND")
+
+
+# Every write to rental, payment or rental_item adjusts user_stats in the same
+# transaction, whichever code path makes it. Other databases get no triggers,
+# and the dashboard counts live there (see user_stats.dashboard_counters).
+USER_STATS_TRIGGERS = [
+    _trigger('trg_user_stats_rental_insert', 'INSERT', 'rental', _rental_stats('NEW', 1)),
+    _trigger('trg_user_stats_rental_delete', 'DELETE', 'rental', _rental_stats('OLD', -1)),
+    _trigger('trg_user_stats_rental_update', 'UPDATE OF status, renter_id, item_id', 'rental',
+             _rental_stats('OLD', -1) + _rental_stats('NEW', 1)),
+    _trigger('trg_user_stats_payment_insert', 'INSERT', 'payment', _payment_stats('NEW', 1)),
+    _trigger('trg_user_stats_payment_delete', 'DELETE', 'payment', _payment_stats('OLD', -1)),
+    _trigger('trg_user_stats_payment_update', 'UPDATE OF status, rental_id', 'payment',
+             _payment_stats('OLD', -1) + _payment_stats('NEW', 1)),
+    _trigger('trg_user_stats_item_insert', 'INSERT', 'rental_item', _item_stats('NEW', 1)),
+    _trigger('trg_user_stats_item_delete', 'DELETE', 'rental_item', _item_stats('OLD', -1)),
+    _trigger('trg_user_stats_item_update', 'UPDATE OF owner_id', 'rental_item',
+             _item_stats('OLD', -1) + _item_stats('NEW', 1)),
+]
+# After every table exists: the triggers reference tables other than their own
+for trigger in USER_STATS_TRIGGERS:
+    event.listen(db.metadata, 'after_create', trigger.execute_if(dialect='sqlite'))
+
+
+class CatalogFacet(db.Model):
+    """Available items of one category at one place, kept current by the CATALOG_TRIGGERS"""
+    category = db.Column(db.String(50), primary_key=True)
+    place_id = db.Column(db.Integer, primary_key=True)  # 0 for items whose location names no known place
+    items = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+def _facet_items(row, sign):
+    return f"""
+    INSERT OR IGNORE INTO catalog_facet (category, place_id) SELECT {row}.category, coalesce({row}.place_id, 0)
+    WHERE {row}.is_available;
+    UPDATE catalog_facet SET items = items + {sign}
+    WHERE {row}.is_available AND category = {row}.category AND place_id = coalesce({row}.place_id, 0);"""
+
+
+def _rental_count(row, sign):
+    booked = ', '.join(f"'{status}'" for status in BOOKED_RENTAL_STATUSES)
+    return f"""
+    UPDATE rental_item SET rental_count = coalesce(rental_count, 0) + {sign}
+    WHERE {row}.status IN ({booked}) AND id = {row}.item_id;"""
+
+
+# The catalog facet counts and every item's rental_count, adjusted in the same
+# transaction as the write that changes them. Other databases get no triggers,
+# and the catalog counts live there (see search.facet_counts and search.popularity).
+CATALOG_TRIGGERS = [
+    _trigger('trg_catalog_facet_item_insert', 'INSERT', 'rental_item', _facet_items('NEW', 1)),
+    _trigger('trg_catalog_facet_item_delete', 'DELETE', 'rental_item', _facet_items('OLD', -1)),
+    _trigger('trg_catalog_facet_item_update', 'UPDATE OF is_available, category, place_id', 'rental_item',
+             _facet_items('OLD', -1) + _facet_items('NEW', 1)),
+    _trigger('trg_rental_count_insert', 'INSERT', 'rental', _rental_count('NEW', 1)),
+    _trigger('trg_rental_count_delete', 'DELETE', 'rental', _rental_count('OLD', -1)),
+    _trigger('trg_rental_count_update', 'UPDATE OF status, item_id', 'rental',
+             _rental_count('OLD', -1) + _rental_count('NEW', 1)),
+]
+for trigger in CATALOG_TRIGGERS:
+    event.listen(db.metadata, 'after_create', trigger.execute_if(dialect='sqlite'))
+
+
+def lock_rental(rental_id):
+    """Hold the rental's row lock until the current transaction ends.
+
+    Payment submission and settlement of one rental take it first, so two of
+    them never both see the rental unpaid.
+    """
+    # Writes a column no trigger watches, to take the lock without changing anything
+    db.session.execute(db.update(Rental).where(Rental.id == rental_id).values(created_at=Rental.created_at))
+
+
+def lock_item_availability(item_id):
+    """Hold the item's calendar lock until the current transaction ends.
+
+    Every change to an item's blocked periods goes through here: the version bump
+    also retires the item's cached calendar.
+    """
+    # Bumping the version locks the item row (the whole database on SQLite) until
+    # commit, so concurrent changes to one item's calendar check and write one at a time
+    db.session.execute(db.update(RentalItem).where(RentalItem.id == item_id).values(
+        availability_version=db.func.coalesce(RentalItem.availability_version, 0) + 1
+    ))
+
+
+def lock_items_availability(item_ids):
+    """lock_item_availability() for many items in one statement"""
+    db.session.execute(db.update(RentalItem).where(RentalItem.id.in_(item_ids)).values(
+        availability_version=db.func.coalesce(RentalItem.availability_version, 0) + 1
+    ))
+
+
+def optional_table_exists(name):
+    """Whether the current app's database has one of the optional tables upgrade-db builds.
+
+    Checked once per app and remembered in app.extensions, missing or not; the
+    create_*() function that builds the table calls forget_optional_table().
+    """
+    tables = current_app.extensions.setdefault('optional_tables', {})
+    if name not in tables:
+        tables[name] = db.inspect(db.engine).has_table(name)
+    return tables[name]
+
+
+def forget_optional_table(name):
+    """Make optional_table_exists() look for name again"""
+    current_app.extensions.get('optional_tables', {}).pop(name, None)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return User.query.get(int(user_id))
@@ -0,0 +1,99 @@
+"""Cached catalog pages for anonymous visitors, and the featured listings.
+
+Every anonymous visitor sees the same /, /items, /about and /contact, so
+cached_page() keeps the rendered HTML in app.extensions['page_cache'], keyed
+by path and sorted query string, and serves the next anonymous visitor from
+it without running a query or a template. Logged-in users, visitors with
+flashed messages waiting and /items filtered by dates (which every booking
+changes) always get a fresh render.
+
+Listing changes call invalidate_catalog(). That empties the cache of the
+worker that made the change; other workers pick it up when their entries
+expire after PAGE_CACHE_TTL seconds.
+"""
+import functools
+import random
+from urllib.parse import urlencode
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from models import db, RentalItem
+
+
+def _page_key():
+    """Cache key of the current request, None if its response must not be shared"""
+    if request.method != 'GET' or request.args.get('start_date') or current_user.is_authenticated:
+        return None
+    if session.get('_flashes'):
+        return None
+    return f'page:{request.path}?{urlencode(sorted(request.args.items(multi=True)))}'
+
+
+def cached_page(view):
+    """Serve a GET view from the page cache to anonymous visitors"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _page_key()
+        if key is None:
+            return view(*args, **kwargs)
+
+        cache = current_app.extensions['page_cache']
+        body = cache.get(key)
+        if body is not None:
+            response = make_response(body)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            cache.set(key, response.get_data(as_text=True))
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+def invalidate_catalog():
+    """Drop this worker's cached pages after a listing changed"""
+    current_app.extensions['page_cache'].clear()
+
+
+def sample_item_ids(count):
+    """Up to count random ids of available items.
+
+    Each pick is one seek on (is_available, id) from a random id, instead of
+    ORDER BY random() sorting the whole catalog. Items after a long gap in
+    the ids are a little likelier to be picked, which is fine for a showcase.
+    """
+    # Two queries: SQLite answers a lone min() or max() from the index, but scans for both together
+    low = db.session.query(db.func.min(RentalItem.id)).scalar()
+    high = db.session.query(db.func.max(RentalItem.id)).scalar()
+    if low is None:
+        return []
+    picks = []
+    for _ in range(count * 3):
+        item_id = db.session.query(RentalItem.id).filter_by(is_available=True).filter(
+            RentalItem.id >= random.randint(low, high)
+        ).order_by(RentalItem.id).limit(1).scalar()
+        if item_id is not None and item_id not in picks:
+            picks.append(item_id)
+            if len(picks) == count:
+                break
+    return picks
+
+
+def featured_items(count=6):
+    """The home page sample, drawn again every FEATURED_REFRESH seconds"""
+    cache = current_app.extensions['featured_cache']
+    item_ids = cache.get('featured')
+    if item_ids is None:
+        item_ids = sample_item_ids(count)
+        cache.set('featured', item_ids)
+    if not item_ids:
+        return []
+
+    # Items deleted or taken off the catalog since the draw are left out
+    items = {item.id: item for item in RentalItem.query.filter_by(is_available=True).filter(
+        RentalItem.id.in_(item_ids)
+    )}
+    return [items[item_id] for item_id in item_ids if item_id in items]
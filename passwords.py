@@ -0,0 +1,63 @@
+"""Password hashing policy.
+
+PASSWORD_HASH_METHOD is a Werkzeug method string with its work factor, e.g.
+'scrypt:32768:8:1' (N, r, p) or 'pbkdf2:sha256:600000' (iterations), and
+every stored hash starts with the method string it was made with. A login
+whose hash was made with another method, or an older cost, stores a new
+hash of the password it just verified, so raising the cost upgrades users
+as they sign in.
+
+scrypt and PBKDF2 release the GIL. With PASSWORD_HASH_WORKERS above 0 the
+hashing runs on a pool of that many threads per process, so a burst of
+logins queues instead of running dozens of 32 MB scrypt hashes at once.
+"""
+import functools
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_hash_pool = None
+
+
+@functools.lru_cache(maxsize=8)
+def _policy(method):
+    """(full method string, a hash of a throwaway password) for a configured method"""
+    dummy = generate_password_hash('unused', method=method)
+    return dummy.split('$', 1)[0], dummy
+
+
+def hash_pool():
+    """The process-wide hashing thread pool, created on first use"""
+    global _hash_pool
+    if _hash_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _hash_pool = ThreadPoolExecutor(max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+                                        thread_name_prefix='password-hash')
+    return _hash_pool
+
+
+def _run(fn, *args):
+    if current_app.config['PASSWORD_HASH_WORKERS'] <= 0:
+        return fn(*args)
+    return hash_pool().submit(fn, *args).result()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def needs_rehash(stored_hash):
+    """Whether stored_hash was made with another method or cost than the configured one"""
+    return stored_hash.split('$', 1)[0] != _policy(current_app.config['PASSWORD_HASH_METHOD'])[0]
+
+
+def verify_password(stored_hash, password):
+    """Check a password against a stored hash, or against a dummy hash if there is none.
+
+    Hashing the dummy makes a login for an unknown username cost as long as
+    one for a known username, so response times do not tell which usernames exist.
+    """
+    if stored_hash is None:
+        _run(check_password_hash, _policy(current_app.config['PASSWORD_HASH_METHOD'])[1], password)
+        return False
+    return _run(check_password_hash, stored_hash, password)
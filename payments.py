@@ -0,0 +1,266 @@
+"""Payment submission, the gateway interface and settlement off the request thread.
+
+The payment form carries an idempotency key, which payment_key() scopes to
+the renter and the rental. submit_payment() records a 'pending' Payment
+under the scoped key and queues the charge: submitting the same key
+again, or paying a rental whose payment has not failed, returns the existing
+payment instead of charging twice. A pool of PAYMENT_WORKERS threads sends
+the charge to app.extensions['payment_gateway'] and retries gateway errors
+up to PAYMENT_MAX_ATTEMPTS times, so a slow gateway holds a payment worker,
+not a web worker.
+
+Whether the gateway answers the call itself or later at /payments/webhook,
+its answer goes through settle_payment(), which ignores answers for
+payments already settled, so duplicate and late callbacks change nothing.
+
+A queued charge lives only in its worker's pool, so a restart loses it. The
+expiry sweeper calls requeue_stale_payments(), which queues payments still
+'pending' PAYMENT_STALE_MINUTES after they were queued again.
+"""
+import hashlib
+import hmac
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, BlockedPeriod, Payment, Rental, lock_rental
+
+GATEWAY_STATUSES = ('completed', 'failed', 'processing')
+MAX_CLIENT_KEY_LENGTH = 64
+
+
+class GatewayError(Exception):
+    """A charge that may go through if tried again: a timeout, a 5xx, a dropped connection"""
+
+
+class PaymentGateway:
+    """What settlement needs from a payment provider"""
+
+    def charge(self, key, amount, method):
+        """Charge amount, returning (status, transaction_id).
+
+        status is 'completed', 'failed', or 'processing' when the outcome will
+        arrive at /payments/webhook. A repeated key must be treated as the same
+        charge, since a call that raised GatewayError may have gone through.
+        """
+        raise NotImplementedError
+
+
+class FakeGateway(PaymentGateway):
+    """Local gateway for development, checks and benchmarks.
+
+    Every charge succeeds, after `latency` seconds, except for a share
+    `error_rate` of calls that raise GatewayError. With deferred=True it
+    answers 'processing' and appends (key, status, transaction_id) to
+    `callbacks` for the caller to deliver to the webhook.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, deferred=False, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.deferred = deferred
+        self.calls = 0
+        self.charges = {}  # key: (status, transaction_id), one per charge actually made
+        self.callbacks = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def charge(self, key, amount, method):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self._rng.random() < self.error_rate:
+                raise GatewayError('fake gateway timed out')
+            if key not in self.charges:
+                self.charges[key] = ('completed', f'FAKE-{uuid.uuid4().hex[:16].upper()}')
+                if self.deferred:
+                    self.callbacks.append((key, *self.charges[key]))
+            status, transaction_id = self.charges[key]
+        return ('processing' if self.deferred else status), transaction_id
+
+
+def webhook_signature(body, secret=None):
+    """Hex HMAC-SHA256 of a webhook body, sent by the gateway in X-Signature"""
+    secret = secret or current_app.config['PAYMENT_WEBHOOK_SECRET']
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def payment_key(user_id, rental_id, client_key):
+    """The idempotency key stored for a client's key, also the gateway's reference of the charge.
+
+    Hashed with the renter and the rental, so a key one client picks can
+    neither collide with nor find another client's payment.
+    """
+    return hashlib.sha256(f'{user_id}:{rental_id}:{client_key}'.encode()).hexdigest()
+
+
+def submit_payment(rental_id, method, key):
+    """Record a payment of a rental under an idempotency key and queue its charge.
+
+    Returns the payment; an existing one, and nothing queued, when the key was
+    seen before or the rental already has a payment that has not failed.
+    Returns None when the key belongs to another rental or the rental is no
+    longer waiting for payment.
+    """
+    payment = Payment.query.filter_by(idempotency_key=key).first()
+    if payment is not None:
+        return payment if payment.rental_id == rental_id else None
+
+    lock_rental(rental_id)
+    rental = db.session.get(Rental, rental_id, populate_existing=True)
+    payment = Payment.query.filter_by(rental_id=rental_id).order_by(Payment.id.desc()).first()
+    if payment is not None and payment.status != 'failed':
+        db.session.rollback()
+        return payment
+    if rental.status != 'pending':
+        db.session.rollback()
+        return None
+
+    if payment is None:
+        payment = Payment(rental_id=rental_id)
+        db.session.add(payment)
+    # A failed payment is tried again under the new key
+    payment.amount = rental.total_price
+    payment.method = method
+    payment.status = 'pending'
+    payment.transaction_id = None
+    payment.idempotency_key = key
+    payment.attempts = 0
+    payment.created_at = datetime.utcnow()  # when the current attempt was queued
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same key was just used for another rental
+        db.session.rollback()
+        return None
+
+    queue_payment(payment)
+    return payment
+
+
+_payment_pool = None
+
+
+def payment_pool():
+    """Thread pool that talks to the gateway, started on first use"""
+    global _payment_pool
+    if _payment_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _payment_pool = ThreadPoolExecutor(max_workers=current_app.config['PAYMENT_WORKERS'],
+                                           thread_name_prefix='payment')
+    return _payment_pool
+
+
+def queue_payment(payment):
+    """Charge a committed pending payment on the payment pool, or right here without PAYMENT_PROCESSING_ASYNC"""
+    app = current_app._get_current_object()
+    queued = time.perf_counter()
+    if not app.config['PAYMENT_PROCESSING_ASYNC']:
+        charge_payment(app, payment.id, queued)
+        # Settled in charge_payment's own session
+        db.session.expire(payment)
+        return
+    payment_pool().submit(charge_payment, app, payment.id, queued)
+
+
+def charge_payment(app, payment_id, queued=None):
+    """Send a pending payment to the gateway, retrying gateway errors, and settle it with the answer"""
+    # Runs on a pool thread, outside any request
+    with app.app_context():
+        config = app.config
+        payment = db.session.get(Payment, payment_id)
+        if payment is None or payment.status != 'pending':
+            return
+        key, amount, method, attempts = payment.idempotency_key, payment.amount, payment.method, payment.attempts or 0
+
+        while True:
+            attempts += 1
+            db.session.execute(db.update(Payment).where(Payment.id == payment_id).values(attempts=attempts))
+            # Committed before the call, so the session holds no connection while the gateway thinks
+            db.session.commit()
+            try:
+                status, transaction_id = app.extensions['payment_gateway'].charge(key, amount, method)
+                break
+            except GatewayError as e:
+                print(f"Error charging payment {payment_id} (attempt {attempts}): {e}")
+                if attempts >= config['PAYMENT_MAX_ATTEMPTS']:
+                    status, transaction_id = 'failed', None
+                    break
+                time.sleep(config['PAYMENT_RETRY_DELAY'] * 2 ** (attempts - 1))
+            except Exception as e:
+                # Nothing reads the pool's futures: an error left unhandled here would leave the payment pending
+                print(f"Error charging payment {payment_id} (attempt {attempts}), not retried: {e}")
+                status, transaction_id = 'failed', None
+                break
+
+        try:
+            payment = settle_payment(key, status, transaction_id)
+        except Exception as e:
+            # Still pending, so the expiry sweeper queues it again once it is stale
+            db.session.rollback()
+            print(f"Error settling payment {payment_id}: {e}")
+            return
+
+        metrics = app.extensions.get('metrics')
+        if metrics is not None and queued is not None:
+            metrics.observe(metrics.payment_seconds, time.perf_counter() - queued, payment.status)
+
+
+def requeue_stale_payments(now=None):
+    """Queue again the payments still 'pending' PAYMENT_STALE_MINUTES after they were queued.
+
+    Each one is claimed by moving its created_at to now, so of several
+    workers sweeping at once only one queues it. Returns the number queued.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=current_app.config['PAYMENT_STALE_MINUTES'])
+    # One that used up its attempts is left to expire with its rental
+    stale = db.session.execute(db.select(Payment.id).where(
+        Payment.status == 'pending', Payment.idempotency_key.isnot(None), Payment.created_at < cutoff,
+        db.func.coalesce(Payment.attempts, 0) < current_app.config['PAYMENT_MAX_ATTEMPTS'])).scalars().all()
+    requeued = 0
+    for payment_id in stale:
+        claimed = db.session.execute(db.update(Payment).where(
+            Payment.id == payment_id, Payment.status == 'pending', Payment.created_at < cutoff
+        ).values(created_at=now)).rowcount
+        db.session.commit()
+        if claimed:
+            queue_payment(db.session.get(Payment, payment_id))
+            requeued += 1
+    return requeued
+
+
+def settle_payment(key, status, transaction_id=None):
+    """Apply a gateway answer to the payment with idempotency key `key`, and to its rental.
+
+    Returns the payment, or None for an unknown key. A completed charge
+    approves the rental, or is marked refunded if the rental was cancelled
+    while it was in flight.
+    """
+    payment = Payment.query.filter_by(idempotency_key=key).first()
+    if payment is None:
+        return None
+    lock_rental(payment.rental_id)
+    db.session.refresh(payment)
+    if payment.status not in ('pending', 'processing') or payment.idempotency_key != key:
+        db.session.rollback()
+        return payment
+
+    payment.transaction_id = transaction_id or payment.transaction_id
+    rental = db.session.get(Rental, payment.rental_id, populate_existing=True)
+    if status == 'completed' and rental.status != 'pending':
+        payment.status = 'refunded'
+    elif status == 'completed':
+        payment.status = 'completed'
+        rental.status = 'approved'
+        # Blocked dates are already created, just update the reason if needed
+        BlockedPeriod.query.filter_by(rental_id=rental.id).update({'reason': 'rented'})
+    else:
+        payment.status = status
+    db.session.commit()
+    return payment
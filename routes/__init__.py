@@ -0,0 +1 @@
+"""Blueprints of the site, registered by create_app()."""
@@ -0,0 +1,276 @@
+"""Operations endpoints and maintenance commands for the site admin.
+
+The site has no admin pages yet. The blueprint carries the CLI commands run
+as `flask --app app <command>`; cli_group=None registers them at the top
+level rather than under `flask admin`.
+"""
+import os
+import re
+from datetime import date, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+import images
+from availability import group_consecutive_dates
+from expiry import expire_unpaid_rentals
+from exports import DATASETS, FORMATS, export_chunks
+from geo import GAZETTEER_PATH, create_location_index, load_gazetteer
+from models import db, BlockedPeriod, Payment, RentalItem, BLOCKED_PERIOD_OVERLAP_TRIGGER
+from payments import queue_payment
+from search import create_catalog_facets, create_search_index, rebuild_catalog_facets
+from uploads import queue_image_processing
+from user_stats import create_user_stats, rebuild_user_stats
+
+admin_bp = Blueprint('admin', __name__, cli_group=None)
+
+
+@admin_bp.cli.command('migrate-blocked-dates')
+def migrate_blocked_dates():
+    """Merge legacy one-row-per-day blocked_date rows into blocked periods"""
+    db.create_all()
+
+    if not db.inspect(db.engine).has_table('blocked_date'):
+        click.echo('No legacy blocked_date table found, nothing to migrate.')
+        return
+
+    rows = db.session.execute(db.text(
+        'SELECT item_id, rental_id, reason, date FROM blocked_date ORDER BY item_id, rental_id, reason, date'
+    )).all()
+
+    grouped = {}
+    for item_id, rental_id, reason, day in rows:
+        if isinstance(day, str):
+            day = date.fromisoformat(day[:10])
+        grouped.setdefault(item_id, {}).setdefault((rental_id, reason), []).append(day)
+
+    # Old bookings raced past their availability check, so two rentals may hold the same day.
+    # Periods may not overlap: rentals claim their days first, in booking order, then owner
+    # blocks, and a day claimed twice stays with the first claim and is reported.
+    period_count = 0
+    conflicts = []
+    for item_id, groups in grouped.items():
+        taken = set()
+        for period in BlockedPeriod.query.filter_by(item_id=item_id):
+            taken.update(period.start_date + timedelta(days=n)
+                         for n in range((period.end_date - period.start_date).days + 1))
+        for rental_id, reason in sorted(groups, key=lambda group: (group[0] is None, group[0] or 0, group[1] or '')):
+            days = set(groups[rental_id, reason])
+            clashing = days & taken
+            if clashing:
+                owner = f'rental {rental_id}' if rental_id else f'owner block ({reason})'
+                conflicts.append(f'item {item_id}: {len(clashing)} days of {owner} were already blocked, '
+                                 f'{min(clashing)} to {max(clashing)}')
+            taken |= days
+            for start, end in group_consecutive_dates(days - clashing):
+                db.session.add(BlockedPeriod(item_id=item_id, start_date=start, end_date=end,
+                                             reason=reason, rental_id=rental_id))
+                period_count += 1
+
+    db.session.execute(db.text('DROP TABLE blocked_date'))
+    db.session.commit()
+
+    click.echo(f'Merged {len(rows)} blocked dates into {period_count} blocked periods.')
+    if conflicts:
+        click.echo(f'{len(conflicts)} bookings or blocks overlapped an earlier one; their overlapping days '
+                   f'were left out:')
+        for conflict in conflicts:
+            click.echo(f'  {conflict}')
+
+
+@admin_bp.cli.command('upgrade-db')
+def upgrade_db():
+    """Add missing tables, columns and indexes to an existing database"""
+    db.create_all()
+
+    inspector = db.inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(
+                    f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}'
+                ))
+                click.echo(f'Added column {table.name}.{column.name}')
+    db.session.commit()
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            connection.execute(BLOCKED_PERIOD_OVERLAP_TRIGGER)
+    # Before anything below updates items: their triggers would make the empty table look built
+    create_catalog_facets()
+    create_search_index()
+    placed = create_location_index()
+    if placed:
+        click.echo(f'Placed {placed} items on the map')
+    create_user_stats()
+    click.echo('Database is up to date.')
+
+
+@admin_bp.cli.command('process-images')
+@click.option('--retry-failed', is_flag=True, help='Also retry images that ran out of attempts.')
+def process_images(retry_failed):
+    """Process queued uploads left over from a restart, in this process"""
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    items = RentalItem.query.filter(RentalItem.image_status.in_(statuses)).all()
+
+    current_app.config['IMAGE_PROCESSING_ASYNC'] = False
+    for item in items:
+        item.image_status = 'pending'
+        item.image_attempts = 0
+        db.session.commit()
+        queue_image_processing(item)
+
+    ready = RentalItem.query.filter(RentalItem.id.in_([item.id for item in items]),
+                                    RentalItem.image_status == 'ready').count()
+    click.echo(f'Processed {ready} of {len(items)} queued images.')
+
+
+@admin_bp.cli.command('process-payments')
+def process_payments():
+    """Charge payments left queued by a restart, in this process"""
+    payments = Payment.query.filter(Payment.status == 'pending', Payment.idempotency_key.isnot(None)).all()
+
+    current_app.config['PAYMENT_PROCESSING_ASYNC'] = False
+    for payment in payments:
+        queue_payment(payment)
+
+    settled = Payment.query.filter(Payment.id.in_([payment.id for payment in payments]),
+                                   Payment.status != 'pending').count()
+    click.echo(f'Sent {settled} of {len(payments)} queued payments to the gateway.')
+
+
+@admin_bp.cli.command('expire-rentals')
+def expire_rentals():
+    """Expire rentals left unpaid past RENTAL_HOLD_MINUTES and release their dates"""
+    expired, days = expire_unpaid_rentals()
+    click.echo(f'Expired {expired} unpaid rentals, released {days} blocked days.')
+
+
+@admin_bp.cli.command('backfill-images')
+@click.option('--report', is_flag=True, help='Print the image bytes each catalog page sends before and after.')
+@click.option('--slot-width', default=400, help='CSS width of a grid image, for --report.')
+@click.option('--dpr', default=2, help='Device pixel ratio to assume, for --report.')
+def backfill_images(report, slot_width, dpr):
+    """Create srcset variants for images uploaded before variants existed"""
+    config = current_app.config
+    widths, formats = config['IMAGE_WIDTHS'], config['IMAGE_FORMATS']
+    wanted = ','.join(str(width) for width in widths)
+
+    items = RentalItem.query.filter(
+        RentalItem.image_filename.isnot(None),
+        db.or_(RentalItem.image_status.is_(None), RentalItem.image_status == 'ready'),
+        db.or_(RentalItem.image_widths.is_(None), RentalItem.image_widths != wanted)
+    ).all()
+
+    done = 0
+    for item in items:
+        # An image narrower than some widths already has its variants, with its own width for those
+        if item.image_widths and images.matches_widths(item.variant_widths, widths):
+            continue
+        try:
+            written = images.backfill_variants(config['UPLOAD_FOLDER'], item.image_filename, widths, formats)
+            item.image_widths = ','.join(str(width) for width in written)
+            done += 1
+        except Exception as e:
+            print(f"Error processing image for item {item.id}: {e}")
+    db.session.commit()
+    click.echo(f'Created variants for {done} of {len(items)} images.')
+
+    if report:
+        print_image_bytes_report(['/', '/items'], slot_width * dpr)
+
+
+def print_image_bytes_report(paths, needed_width):
+    """Compare full-size image bytes with the variants a browser would pick on each page"""
+    def file_size(url):
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], url.split('?')[0].rsplit('/', 1)[-1])
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    client = current_app.test_client()
+    click.echo(f"{'page':<12}{'images':>8}{'full size KB':>14}{'responsive KB':>15}{'saved':>8}")
+    for path in paths:
+        html = client.get(path).get_data(as_text=True)
+        before = after = count = 0
+        for picture in re.findall(r'<picture>(.*?)</picture>', html, re.S):
+            webp = re.search(r'<source type="image/webp" srcset="([^"]+)"', picture)
+            jpeg = re.search(r'<img[^>]* srcset="([^"]+)"', picture)
+            src = re.search(r'<img src="([^"]+)"', picture).group(1)
+            if '/uploads/' not in src:
+                continue
+            count += 1
+
+            if not webp:
+                # No variants: the page used to send the full image, now it sends the thumbnail
+                before += file_size(src.replace('thumb_', '', 1))
+                after += file_size(src)
+                continue
+
+            candidates = sorted((int(w[:-1]), url) for url, w in
+                                (c.strip().split(' ') for c in webp.group(1).split(',')))
+            chosen = next((url for width, url in candidates if width >= needed_width), candidates[-1][1])
+            largest_jpeg = jpeg.group(1).split(',')[-1].strip().split(' ')[0]
+            before += file_size(largest_jpeg)
+            after += file_size(chosen)
+
+        saved = f'{100 - 100 * after / before:.0f}%' if before else '-'
+        click.echo(f'{path:<12}{count:>8}{before / 1024:>14.1f}{after / 1024:>15.1f}{saved:>8}')
+
+
+@admin_bp.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Create the listing search index if needed and rebuild it from rental_item"""
+    db.create_all()
+    if create_search_index(rebuild=True):
+        click.echo(f'Indexed {RentalItem.query.count()} items.')
+    else:
+        click.echo('Full-text search needs SQLite FTS5, listings will be searched with LIKE.')
+
+
+@admin_bp.cli.command('rebuild-location-index')
+@click.option('--gazetteer', type=click.Path(exists=True, dir_okay=False), default=GAZETTEER_PATH,
+              show_default=True, help='CSV of places to load first: name, city, kind, latitude, longitude.')
+def rebuild_location_index(gazetteer):
+    """Reload the gazetteer, resolve every item's location again and rebuild the nearby-search index"""
+    db.create_all()
+    places = load_gazetteer(gazetteer)
+    placed = create_location_index(rebuild=True)
+    unplaced = RentalItem.query.filter(RentalItem.place_id.is_(None)).count()
+    click.echo(f'Loaded {places} places, placed {placed} items; {unplaced} items name no known place.')
+
+
+@admin_bp.cli.command('rebuild-catalog-facets')
+def rebuild_catalog_facets_command():
+    """Recount the catalog facet counts and every item's rental count"""
+    create_catalog_facets(fill=False)
+    facets, drifted = rebuild_catalog_facets()
+    click.echo(f'Recounted {facets} facets and the rental counts, {drifted} had drifted.')
+
+
+@admin_bp.cli.command('rebuild-user-stats')
+def rebuild_user_stats_command():
+    """Recount every user's dashboard counters from rentals, payments and listings"""
+    create_user_stats(fill=False)
+    users, drifted = rebuild_user_stats()
+    click.echo(f'Recounted {users} users, {drifted} had drifted counters.')
+
+
+@admin_bp.cli.command('export')
+@click.argument('dataset', type=click.Choice(list(DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(list(FORMATS)), default='csv', show_default=True)
+@click.option('--owner', 'owner_id', type=int, help="Only rows of this owner's listings.")
+@click.option('--item', 'item_id', type=int, help='Only rows of this listing.')
+@click.option('--from', 'since', type=click.DateTime(['%Y-%m-%d']), help='Only rows on or after this day.')
+@click.option('--to', 'until', type=click.DateTime(['%Y-%m-%d']), help='Only rows on or before this day.')
+@click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-',
+              help='File to write, standard output by default.')
+def export_data(dataset, fmt, owner_id, item_id, since, until, output):
+    """Write rentals, payments or blocked periods as CSV or NDJSON, streamed in batches"""
+    for chunk in export_chunks(dataset, fmt, owner_id=owner_id, item_id=item_id,
+                               since=since and since.date(), until=until and until.date()):
+        output.write(chunk)
@@ -0,0 +1,110 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_user, logout_user, login_required, current_user
+
+from models import db, User, RentalItem, Rental
+from passwords import hash_password, needs_rehash, verify_password
+from user_stats import dashboard_counters
+
+auth_bp = Blueprint('auth', __name__)
+
+DASHBOARD_REQUESTS_SHOWN = 50
+
+
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+
+        user = User.query.filter_by(username=username).first()
+
+        if verify_password(user.password if user else None, password):
+            if needs_rehash(user.password):
+                # The password is at hand only now: store it under the current hashing policy
+                user.password = hash_password(password)
+                db.session.commit()
+            login_user(user)
+            flash('Login successful!', 'success')
+            next_page = request.args.get('next')
+            return redirect(next_page) if next_page else redirect(url_for('auth.dashboard'))
+        else:
+            flash('Invalid username or password.', 'error')
+
+    return render_template('login.html')
+
+
+@auth_bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form['username']
+        email = request.form['email']
+        password = request.form['password']
+        confirm_password = request.form['confirm_password']
+        phone = request.form.get('phone', '')
+
+        if password != confirm_password:
+            flash('Passwords do not match.', 'error')
+            return render_template('register.html')
+
+        if User.query.filter_by(username=username).first():
+            flash('Username already exists.', 'error')
+            return render_template('register.html')
+
+        if User.query.filter_by(email=email).first():
+            flash('Email already registered.', 'error')
+            return render_template('register.html')
+
+        hashed_password = hash_password(password)
+
+        new_user = User(
+            username=username,
+            email=email,
+            password=hashed_password,
+            phone=phone
+        )
+
+        db.session.add(new_user)
+        db.session.commit()
+
+        flash('Registration successful! Please login.', 'success')
+        return redirect(url_for('auth.login'))
+
+    return render_template('register.html')
+
+
+@auth_bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('You have been logged out.', 'success')
+    return redirect(url_for('renter.index'))
+
+
+@auth_bp.route('/dashboard')
+@login_required
+def dashboard():
+    counters = dashboard_counters(current_user.id)
+    recent_rentals = Rental.query.filter_by(renter_id=current_user.id).options(
+        db.joinedload(Rental.item)
+    ).order_by(Rental.created_at.desc()).limit(5).all()
+
+    listings_preview = RentalItem.query.filter_by(owner_id=current_user.id).order_by(RentalItem.id).limit(3).all()
+
+    # The newest pending requests on the user's own items, with item and renter loaded in the same query
+    rental_requests = Rental.query.join(Rental.item).filter(
+        RentalItem.owner_id == current_user.id,
+        Rental.status == 'pending'
+    ).options(
+        db.contains_eager(Rental.item),
+        db.joinedload(Rental.renter)
+    ).order_by(Rental.created_at.desc()).limit(DASHBOARD_REQUESTS_SHOWN).all()
+
+    return render_template('dashboard.html',
+                           total_rentals=counters['rentals'],
+                           active_bookings=counters['active_rentals'],
+                           completed_payments=counters['completed_payments'],
+                           my_items=counters['listings'],
+                           pending_requests=counters['pending_requests'],
+                           recent_rentals=recent_rentals,
+                           listings_preview=listings_preview,
+                           rental_requests=rental_requests)
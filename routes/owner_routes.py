@@ -0,0 +1,290 @@
+from datetime import date, datetime, timedelta
+
+from flask import (Blueprint, Response, abort, current_app, render_template, request, redirect, url_for, flash,
+                   jsonify, stream_with_context)
+from flask_login import login_required, current_user
+
+from availability import block_item_dates, item_calendar, unblock_item_dates
+from exports import DATASETS, FORMATS, export_chunks
+from geo import locate_item
+from models import db, BlockedPeriod, Place, Rental, RentalItem, lock_item_availability
+from page_cache import invalidate_catalog
+from search import index_item, unindex_item
+from uploads import queue_image_processing, remove_image_files, save_image
+
+owner_bp = Blueprint('owner', __name__)
+
+
+@owner_bp.route('/add-item', methods=['GET', 'POST'])
+@login_required
+def add_item():
+    if request.method == 'POST':
+        title = request.form['title']
+        description = request.form['description']
+        price = float(request.form['price'])
+        location = request.form['location']
+        category = request.form['category']
+
+        # Handle image upload
+        image_filename = None
+        if 'image' in request.files:
+            file = request.files['image']
+            if file and file.filename != '':
+                image_filename = save_image(file)
+                if not image_filename:
+                    flash('Invalid image file. Please upload PNG, JPG, or GIF.', 'error')
+                    return render_template('add_item.html', places=known_places())
+
+        new_item = RentalItem(
+            title=title,
+            description=description,
+            price=price,
+            location=location,
+            category=category,
+            image_filename=image_filename,
+            image_status='pending' if image_filename else None,
+            owner_id=current_user.id
+        )
+        locate_item(new_item)
+
+        db.session.add(new_item)
+        db.session.flush()
+        index_item(new_item)
+        db.session.commit()
+        invalidate_catalog()
+
+        if image_filename:
+            queue_image_processing(new_item)
+
+        flash('Item listed successfully!', 'success')
+        return redirect(url_for('renter.items'))
+
+    return render_template('add_item.html', places=known_places())
+
+
+def known_places():
+    """Gazetteer places offered as suggestions for an item's location"""
+    return Place.query.order_by(Place.city, Place.kind.desc(), Place.name).all()
+
+
+@owner_bp.route('/delete-item/<int:item_id>', methods=['DELETE'])
+@login_required
+def delete_item(item_id):
+    item = RentalItem.query.get_or_404(item_id)
+
+    if item.owner_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Not authorized'}), 403
+
+    if item.image_filename:
+        remove_image_files(item.image_filename, item.variant_widths)
+
+    unindex_item(item)
+    db.session.delete(item)
+    db.session.commit()
+    invalidate_catalog()
+
+    return jsonify({'success': True, 'message': 'Item deleted successfully'})
+
+
+@owner_bp.route('/my-listings')
+@login_required
+def my_listings():
+    items = RentalItem.query.filter_by(owner_id=current_user.id).options(
+        db.selectinload(RentalItem.blocked_periods)
+    ).order_by(RentalItem.created_at.desc()).all()
+
+    # One grouped count instead of loading every item's rentals
+    rental_counts = dict(db.session.query(Rental.item_id, db.func.count(Rental.id)).join(Rental.item).filter(
+        RentalItem.owner_id == current_user.id
+    ).group_by(Rental.item_id).all())
+
+    return render_template('my_listings.html', items=items, rental_counts=rental_counts)
+
+
+@owner_bp.route('/export/<dataset>')
+@login_required
+def export(dataset):
+    """Stream the rentals, payments or blocked periods of the current owner's listings"""
+    if dataset not in DATASETS:
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': f"format must be one of {', '.join(FORMATS)}"}), 400
+    try:
+        since, until = (date.fromisoformat(request.args[key]) if request.args.get(key) else None
+                        for key in ('from', 'to'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'from and to must be dates like 2024-01-31'}), 400
+
+    chunks = export_chunks(dataset, fmt, owner_id=current_user.id, item_id=request.args.get('item_id', type=int),
+                           since=since, until=until)
+    return Response(stream_with_context(chunks), mimetype=FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename={dataset}.{fmt}'
+    })
+
+
+@owner_bp.route('/update-rental-status/<int:rental_id>/<status>')
+@login_required
+def update_rental_status(rental_id, status):
+    rental = Rental.query.get_or_404(rental_id)
+
+    if rental.item.owner_id != current_user.id:
+        flash('You are not authorized to update this rental.', 'error')
+        return redirect(url_for('auth.dashboard'))
+
+    rental.status = status
+    db.session.commit()
+
+    flash(f'Rental status updated to {status}.', 'success')
+    return redirect(url_for('auth.dashboard'))
+
+
+@owner_bp.route('/manage-availability/<int:item_id>')
+@login_required
+def manage_availability(item_id):
+    """Page for owners to manage item availability"""
+    item = RentalItem.query.get_or_404(item_id)
+
+    if item.owner_id != current_user.id:
+        flash('You are not authorized to manage this item.', 'error')
+        return redirect(url_for('auth.dashboard'))
+
+    # Get existing blocked periods
+    blocked_periods = BlockedPeriod.query.filter_by(item_id=item_id).order_by(BlockedPeriod.start_date).all()
+
+    return render_template('manage_availability.html',
+                           item=item,
+                           blocked_periods=blocked_periods,
+                           calendar=item_calendar(item))
+
+
+def parse_date_selection(data):
+    """Collect the days named by a JSON body's 'dates' list and 'ranges' of inclusive {from, to} pairs.
+
+    Returns (dates, invalid), invalid being the entries that could not be parsed,
+    reversed ranges and ranges longer than MAX_DATES_PER_REQUEST. Parsing stops
+    once the entries have named more than MAX_DATES_PER_REQUEST days, repeats
+    included; the entries after that are not read and count as invalid.
+    """
+    max_dates = current_app.config['MAX_DATES_PER_REQUEST']
+    dates = set()
+    named = 0
+    invalid = []
+    entries = [('date', entry) for entry in data.get('dates', [])] + \
+              [('range', entry) for entry in data.get('ranges', [])]
+    for n, (kind, entry) in enumerate(entries):
+        if named > max_dates:
+            invalid.extend(entry for _, entry in entries[n:])
+            break
+        try:
+            if kind == 'date':
+                dates.add(datetime.strptime(entry, '%Y-%m-%d').date())
+                named += 1
+                continue
+            start_date = datetime.strptime(entry['from'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(entry['to'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            invalid.append(entry)
+            continue
+        if end_date < start_date or (end_date - start_date).days >= max_dates:
+            invalid.append(entry)
+            continue
+        named += (end_date - start_date).days + 1
+        dates.update(start_date + timedelta(days=day) for day in range((end_date - start_date).days + 1))
+
+    return list(dates), invalid
+
+
+def date_selection_error(dates):
+    max_dates = current_app.config['MAX_DATES_PER_REQUEST']
+    if not dates:
+        return jsonify({'success': False, 'message': 'No valid dates given'}), 400
+    if len(set(dates)) > max_dates:
+        return jsonify({
+            'success': False,
+            'message': f"At most {max_dates} dates per request"
+        }), 400
+    return None
+
+
+@owner_bp.route('/block-dates/<int:item_id>', methods=['POST'])
+@login_required
+def block_dates(item_id):
+    """Block a list and/or ranges of dates at once"""
+    item = RentalItem.query.get_or_404(item_id)
+
+    if item.owner_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Not authorized'}), 403
+
+    data = request.get_json()
+    reason = data.get('reason', 'owner_blocked')
+    parsed_dates, invalid = parse_date_selection(data)
+    error = date_selection_error(parsed_dates)
+    if error:
+        return error
+
+    results = block_item_dates(item_id, parsed_dates, reason)
+    db.session.commit()
+
+    blocked_count = sum(1 for status in results.values() if status == 'blocked')
+    return jsonify({
+        'success': True,
+        'message': f'Successfully blocked {blocked_count} dates',
+        'blocked_count': blocked_count,
+        'results': {day.isoformat(): status for day, status in results.items()},
+        'invalid': invalid
+    })
+
+
+@owner_bp.route('/unblock-dates/<int:item_id>', methods=['POST'])
+@login_required
+def unblock_dates(item_id):
+    """Unblock a list and/or ranges of dates at once"""
+    item = RentalItem.query.get_or_404(item_id)
+
+    if item.owner_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Not authorized'}), 403
+
+    data = request.get_json()
+    parsed_dates, invalid = parse_date_selection(data)
+    error = date_selection_error(parsed_dates)
+    if error:
+        return error
+
+    results = unblock_item_dates(item_id, parsed_dates)
+    db.session.commit()
+
+    unblocked_count = sum(1 for status in results.values() if status == 'unblocked')
+    return jsonify({
+        'success': True,
+        'message': f'Successfully unblocked {unblocked_count} dates',
+        'unblocked_count': unblocked_count,
+        'results': {day.isoformat(): status for day, status in results.items()},
+        'invalid': invalid
+    })
+
+
+@owner_bp.route('/clear-all-blocks/<int:item_id>', methods=['POST'])
+@login_required
+def clear_all_blocks(item_id):
+    """Clear all owner-blocked dates"""
+    item = RentalItem.query.get_or_404(item_id)
+
+    if item.owner_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Not authorized'}), 403
+
+    # Only delete owner-blocked dates (not rental bookings)
+    lock_item_availability(item_id)
+    owner_blocks = BlockedPeriod.query.filter_by(item_id=item_id, rental_id=None)
+    # deleted_count stays a number of days, as when every blocked day had its own row
+    deleted_count = sum((period.end_date - period.start_date).days + 1 for period in owner_blocks)
+    deleted_periods = owner_blocks.delete()
+
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'message': f'All owner-blocked dates cleared',
+        'deleted_count': deleted_count,
+        'deleted_periods': deleted_periods
+    })
@@ -0,0 +1,289 @@
+import base64
+import functools
+import hashlib
+import hmac
+import uuid
+from datetime import datetime, date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, abort, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.exc import OperationalError
+
+from availability import bitmap_dates, item_calendar, reserve_item_dates
+from geo import item_distances, nearby_search
+from models import db, Rental, RentalItem, lock_rental
+from page_cache import cached_page, featured_items
+from payments import (GATEWAY_STATUSES, MAX_CLIENT_KEY_LENGTH, payment_key, settle_payment, submit_payment,
+                      webhook_signature)
+from search import SORTS, facet_counts, filter_items, paginate_items, parse_date_filter, parse_price_filter
+
+renter_bp = Blueprint('renter', __name__)
+
+
+@renter_bp.route('/')
+@cached_page
+def index():
+    return render_template('index.html', featured_items=featured_items())
+
+
+@renter_bp.route('/items')
+@cached_page
+def items():
+    category = request.args.get('category', '')
+    search = request.args.get('search', '')
+    location = request.args.get('location', '')
+    within = request.args.get('within', '')
+    sort = request.args.get('sort', '')
+    start_date, end_date = parse_date_filter(request.args)
+    min_price, max_price = parse_price_filter(request.args)
+
+    query, order = filter_items(request.args)
+    items, next_cursor = paginate_items(query, request.args, order)
+    facets = facet_counts(request.args)
+    nearby = nearby_search(request.args)
+    distances = item_distances(items, nearby[0]) if nearby else {}
+
+    next_url = None
+    if next_cursor:
+        next_url = url_for('renter.items', **dict(request.args.items(), cursor=next_cursor))
+    # The current filters without the cursor, for the facet, sort and first page links
+    filters = {name: value for name, value in request.args.items() if name != 'cursor' and value}
+
+    return render_template('items.html', items=items, search=search, category=category, location=location,
+                           within=within, sort=sort, sorts=SORTS, distances=distances, facets=facets,
+                           items_url=functools.partial(items_url, filters), min_price=min_price, max_price=max_price,
+                           start_date=start_date.isoformat() if start_date else '',
+                           end_date=end_date.isoformat() if end_date else '',
+                           next_url=next_url, is_first_page=not request.args.get('cursor'))
+
+
+def items_url(filters, **changes):
+    """URL of /items with some filters changed; a None value drops the filter"""
+    args = dict(filters, **changes)
+    return url_for('renter.items', **{name: value for name, value in args.items() if value is not None})
+
+
+@renter_bp.route('/api/items')
+def api_items():
+    """JSON listing of available items, paginated with the same cursor as /items.
+
+    Takes the same filters, including start_date/end_date to list only items free on those days, and
+    within=<km> of location or lat/lon to list items nearest first with their distance_km. facets=1
+    adds the counts per category, city and barangay.
+    """
+    query, order = filter_items(request.args)
+    items, next_cursor = paginate_items(query, request.args, order)
+    nearby = nearby_search(request.args)
+    distances = item_distances(items, nearby[0]) if nearby else {}
+
+    payload = {
+        'items': [dict(item.to_dict(), distance_km=round(distances[item.id], 2)) if item.id in distances
+                  else item.to_dict() for item in items],
+        'next_cursor': next_cursor
+    }
+    if request.args.get('facets') == '1':
+        payload['facets'] = {name: dict(counts) for name, counts in facet_counts(request.args).items()}
+    return jsonify(payload)
+
+
+@renter_bp.route('/rent/<int:item_id>', methods=['GET', 'POST'])
+@login_required
+def rent_item(item_id):
+    item = RentalItem.query.get_or_404(item_id)
+
+    if request.method == 'POST':
+        try:
+            # Parse dates without time components
+            start_date_str = request.form['start_date']
+            end_date_str = request.form['end_date']
+
+            start_date = datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date_str, '%Y-%m-%d').date()
+
+            # Validate date range
+            if start_date >= end_date:
+                flash('End date must be after start date.', 'error')
+                return redirect(url_for('renter.rent_item', item_id=item_id))
+
+            if start_date < datetime.now().date():
+                flash('Start date cannot be in the past.', 'error')
+                return redirect(url_for('renter.rent_item', item_id=item_id))
+
+            # FIX: Calculate days to match frontend (include both start and end days)
+            days = (end_date - start_date).days + 1  # Include both start and end days
+
+            if days < 1:
+                flash('Rental period must be at least 1 day', 'error')
+                return redirect(url_for('renter.rent_item', item_id=item_id))
+
+            total_price = item.price * days
+
+            # Check the dates and book them in one transaction, so concurrent requests cannot double-book
+            try:
+                new_rental = reserve_item_dates(item_id, current_user.id, start_date, end_date, total_price)
+            except OperationalError as e:
+                db.session.rollback()
+                print(f"Error reserving dates: {e}")
+                flash('Too many bookings at once, please try again.', 'error')
+                return redirect(url_for('renter.rent_item', item_id=item_id))
+
+            if new_rental is None:
+                flash('Selected dates are not available. Please choose different dates.', 'error')
+                return redirect(url_for('renter.rent_item', item_id=item_id))
+
+            flash('Rental request submitted successfully! Please proceed to payment.', 'success')
+            return redirect(url_for('renter.payment', rental_id=new_rental.id))
+
+        except ValueError as e:
+            flash('Invalid date format. Please select valid dates.', 'error')
+            return redirect(url_for('renter.rent_item', item_id=item_id))
+
+    # The calendar itself is fetched from item_availability
+    today = datetime.now().date().isoformat()
+
+    return render_template('rent_item.html', item=item, today=today)
+
+
+@renter_bp.route('/item/<int:item_id>/availability')
+def item_availability(item_id):
+    """Get available dates for an item"""
+    item = RentalItem.query.get_or_404(item_id)
+
+    # Blocked dates for the next 6 months
+    calendar = item_calendar(item)
+
+    if request.args.get('format') == 'bitmap':
+        # Compact format: a start date and a base64 bitset with one bit per day
+        response = jsonify({
+            'item_id': item_id,
+            'item_title': item.title,
+            'start': calendar['start'],
+            'days': calendar['days'],
+            'blocked_bitmap': calendar['blocked_bitmap']
+        })
+    else:
+        start_date = date.fromisoformat(calendar['start'])
+        bitmap = base64.b64decode(calendar['blocked_bitmap'])
+        response = jsonify({
+            'item_id': item_id,
+            'item_title': item.title,
+            'blocked_dates': bitmap_dates(start_date, calendar['days'], bitmap),
+            'blocked_ranges': calendar['blocked_ranges']
+        })
+    # Browsers revalidate with If-None-Match and get a 304 while the calendar is unchanged
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@renter_bp.route('/my-rentals')
+@login_required
+def my_rentals():
+    # Each rental shows its item, the item's owner and its payment: one query for each, not one per rental
+    rentals = Rental.query.filter_by(renter_id=current_user.id).options(
+        db.selectinload(Rental.item).selectinload(RentalItem.owner),
+        db.selectinload(Rental.payment)
+    ).order_by(Rental.created_at.desc()).all()
+    return render_template('my_rentals.html', rentals=rentals)
+
+
+@renter_bp.route('/payment/<int:rental_id>', methods=['GET', 'POST'])
+@login_required
+def payment(rental_id):
+    rental = Rental.query.get_or_404(rental_id)
+
+    if rental.renter_id != current_user.id:
+        flash('You are not authorized to view this payment.', 'error')
+        return redirect(url_for('renter.my_rentals'))
+
+    if request.method == 'POST':
+        method = request.form['payment_method']
+        # The form's key makes a double submit, or a retried request, pay once
+        key = request.form.get('idempotency_key') or request.headers.get('Idempotency-Key') or uuid.uuid4().hex
+        if len(key) > MAX_CLIENT_KEY_LENGTH:
+            flash('Invalid payment request, please try again.', 'error')
+            return redirect(url_for('renter.payment', rental_id=rental_id))
+        payment = submit_payment(rental_id, method, payment_key(current_user.id, rental_id, key))
+
+        if payment is None or payment.status == 'refunded':
+            flash('This rental can no longer be paid.', 'error')
+        elif payment.status == 'completed':
+            flash('Payment completed successfully! Your rental has been approved.', 'success')
+        elif payment.status == 'failed':
+            flash('Your payment did not go through, please try again.', 'error')
+        else:
+            flash('Payment received! Your rental will be approved as soon as the payment is confirmed.', 'success')
+        return redirect(url_for('renter.my_rentals'))
+
+    return render_template('payment.html', rental=rental, idempotency_key=uuid.uuid4().hex)
+
+
+@renter_bp.route('/payments/webhook', methods=['POST'])
+def payment_webhook():
+    """The gateway's callback with the outcome of a charge it answered 'processing'"""
+    # Only a secret of its own: anything guessable would let anyone mark a payment completed
+    secret = current_app.config['PAYMENT_WEBHOOK_SECRET']
+    if not secret:
+        abort(404)
+    body = request.get_data()
+    if not hmac.compare_digest(request.headers.get('X-Signature', ''), webhook_signature(body, secret)):
+        return jsonify({'success': False, 'message': 'Bad signature'}), 403
+
+    data = request.get_json(force=True, silent=True) or {}
+    if data.get('status') not in GATEWAY_STATUSES or not data.get('reference'):
+        return jsonify({'success': False, 'message': 'reference and a valid status are required'}), 400
+
+    payment = settle_payment(data['reference'], data['status'], data.get('transaction_id'))
+    if payment is None:
+        return jsonify({'success': False, 'message': 'Unknown payment'}), 404
+    return jsonify({'success': True, 'status': payment.status})
+
+
+@renter_bp.route('/cancel-rental/<int:rental_id>')
+@login_required
+def cancel_rental(rental_id):
+    """Cancel a rental and free up the dates"""
+    rental = Rental.query.get_or_404(rental_id)
+
+    if rental.renter_id != current_user.id:
+        flash('You are not authorized to cancel this rental.', 'error')
+        return redirect(url_for('renter.my_rentals'))
+
+    # A payment settling at the same time sees the rental cancelled and refunds itself
+    lock_rental(rental_id)
+    db.session.refresh(rental)
+
+    # Remove blocked dates
+    rental.remove_blocked_dates()
+
+    # Update rental status
+    rental.status = 'cancelled'
+
+    # Also cancel associated payment if exists; a failed one charged nothing
+    if rental.payment and rental.payment.status != 'failed':
+        rental.payment.status = 'refunded'
+
+    db.session.commit()
+
+    flash('Rental cancelled successfully.', 'success')
+    return redirect(url_for('renter.my_rentals'))
+
+
+@renter_bp.route('/about')
+@cached_page
+def about():
+    return render_template('about.html')
+
+
+@renter_bp.route('/contact', methods=['GET', 'POST'])
+@cached_page
+def contact():
+    if request.method == 'POST':
+        name = request.form['name']
+        email = request.form['email']
+        message = request.form['message']
+
+        flash('Thank you for your message! We will get back to you soon.', 'success')
+        return redirect(url_for('renter.contact'))
+
+    return render_template('contact.html')
@@ -0,0 +1,331 @@
+"""Catalog queries: filters, sorting, facet counts, full-text search and keyset pagination.
+
+On SQLite an FTS5 external-content table mirrors the searchable columns of
+rental_item; other databases, or a database whose index has not been built
+yet, fall back to LIKE matching. Likewise the catalog_facet table and
+rental_item.rental_count, both kept current by triggers (CATALOG_TRIGGERS in
+models.py), answer facet counts and the popularity sort there; elsewhere
+they are counted live.
+"""
+import re
+from datetime import date, datetime
+
+from flask import current_app
+
+import geo
+from models import (db, BOOKED_RENTAL_STATUSES, CATALOG_TRIGGERS, BlockedPeriod, CatalogFacet, Rental, RentalItem,
+                    forget_optional_table, optional_table_exists)
+
+search_index = db.table('rental_item_fts', db.column('rowid'), db.column('rank'), db.column('rental_item_fts'))
+
+# ?sort= choices besides the default (best match, nearest or newest), as (label, descending)
+SORTS = {
+    'newest': ('Newest', True),
+    'price_asc': ('Price: low to high', False),
+    'price_desc': ('Price: high to low', True),
+    'popular': ('Most rented', True),
+}
+
+
+def search_index_available():
+    if not current_app.config['SEARCH_INDEX_ENABLED'] or db.engine.dialect.name != 'sqlite':
+        return False
+    return optional_table_exists('rental_item_fts')
+
+
+def create_search_index(rebuild=False):
+    """Create the FTS5 listing index if it is missing and fill it from rental_item"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    if not db.inspect(db.engine).has_table('rental_item_fts'):
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE rental_item_fts USING fts5("
+            "title, description, location, category, "
+            "content='rental_item', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        rebuild = True
+    if rebuild:
+        db.session.execute(db.text("INSERT INTO rental_item_fts(rental_item_fts) VALUES ('rebuild')"))
+    db.session.commit()
+    forget_optional_table('rental_item_fts')
+    return True
+
+
+def _search_values(item):
+    return {'id': item.id, 'title': item.title, 'description': item.description,
+            'location': item.location, 'category': item.category}
+
+
+def index_item(item):
+    """Add an item to the search index, in the caller's transaction"""
+    if search_index_available():
+        db.session.execute(db.text(
+            'INSERT INTO rental_item_fts(rowid, title, description, location, category) '
+            'VALUES (:id, :title, :description, :location, :category)'
+        ), _search_values(item))
+
+
+def unindex_item(item):
+    """Remove an item from the search index, in the caller's transaction"""
+    if search_index_available():
+        db.session.execute(db.text(
+            'INSERT INTO rental_item_fts(rental_item_fts, rowid, title, description, location, category) '
+            "VALUES ('delete', :id, :title, :description, :location, :category)"
+        ), _search_values(item))
+
+
+def fts_query(search):
+    """Turn free text into an FTS5 query where every word must match as a prefix"""
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', search))
+
+
+def filter_items(args, for_facets=False):
+    """Build the available-items query for the catalog filters in args.
+
+    Returns (query, order): order is (sort key, descending) for paginate_items,
+    or None for newest first. Without a ?sort= choice a nearby search
+    (?within=<km> of ?location= or ?lat=&lon=) is ordered by squared
+    distance, and a search term that went through the search index by its
+    FTS5 relevance.
+
+    for_facets leaves out what facet_counts() counts by: the category, and a
+    location that names a gazetteer place.
+    """
+    category = args.get('category', '')
+    search = args.get('search', '')
+    location = args.get('location', '')
+    sort = args.get('sort', '')
+    start_date, end_date = parse_date_filter(args)
+    min_price, max_price = parse_price_filter(args)
+
+    query = RentalItem.query.filter_by(is_available=True)
+    if not for_facets:
+        query = query.options(db.joinedload(RentalItem.owner))
+    order = None
+
+    if category and not for_facets:
+        query = query.filter_by(category=category)
+    nearby = geo.nearby_search(args)
+    if search:
+        match = fts_query(search)
+        if match and search_index_available():
+            matches = search_index.c.rental_item_fts.op('MATCH')(match)
+            if sort in SORTS or nearby:
+                # Not ordered by relevance: matched once up front, since joined SQLite may start
+                # from a category or place index and run the MATCH again for every item it lists
+                query = query.filter(RentalItem.id.in_(db.select(search_index.c.rowid).where(matches)))
+            else:
+                query = query.join(search_index, search_index.c.rowid == RentalItem.id).filter(matches)
+                order = (search_index.c.rank, False)
+        else:
+            query = query.filter(db.or_(RentalItem.title.ilike(f'%{search}%'),
+                                        RentalItem.description.ilike(f'%{search}%')))
+    if nearby:
+        query, rank = geo.filter_nearby(query, *nearby)
+        order = (rank, False)
+    elif location:
+        place = geo.resolve_place(location)
+        if place and not for_facets:
+            query = query.filter(RentalItem.place_id.in_(geo.places_in(place)))
+        elif not place:
+            query = query.filter(RentalItem.location.ilike(f'%{location}%'))
+    if min_price is not None:
+        query = query.filter(RentalItem.price >= min_price)
+    if max_price is not None:
+        query = query.filter(RentalItem.price <= max_price)
+    if start_date:
+        # Anti-join: keep items with no blocked period overlapping the dates. Periods
+        # of an item never overlap, so the only one that can is the last to start on
+        # or before end_date: one seek on uq_blocked_period_item_start per item, however
+        # long the item's booking history is.
+        last_period_end = db.select(BlockedPeriod.end_date).where(
+            BlockedPeriod.item_id == RentalItem.id,
+            BlockedPeriod.start_date <= end_date
+        ).order_by(BlockedPeriod.start_date.desc()).limit(1).scalar_subquery()
+        query = query.filter(db.func.coalesce(last_period_end, date.min) < start_date)
+
+    if sort == 'newest':
+        order = None
+    elif sort in ('price_asc', 'price_desc'):
+        order = (RentalItem.price, SORTS[sort][1])
+    elif sort == 'popular':
+        order = (popularity(), True)
+
+    return query, order
+
+
+def popularity():
+    """An item's booked rentals: the trigger-kept rental_count, or a count where there is none"""
+    if catalog_facets_available():
+        return RentalItem.rental_count
+    return db.select(db.func.count(Rental.id)).where(
+        Rental.item_id == RentalItem.id, Rental.status.in_(BOOKED_RENTAL_STATUSES)
+    ).scalar_subquery()
+
+
+def parse_date_filter(args):
+    """Return the (start_date, end_date) availability filter in args, or (None, None).
+
+    A missing end date means a single day; unparsable or reversed ranges are ignored.
+    """
+    try:
+        start_date = datetime.strptime(args.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(args.get('end_date') or args.get('start_date'), '%Y-%m-%d').date()
+    except ValueError:
+        return None, None
+    if end_date < start_date:
+        return None, None
+    return start_date, end_date
+
+
+def parse_price_filter(args):
+    """Return the (min_price, max_price) filter in args; either is None if missing, unparsable or negative"""
+    prices = []
+    for name in ('min_price', 'max_price'):
+        try:
+            price = float(args.get(name, ''))
+        except ValueError:
+            price = None
+        prices.append(price if price is not None and price >= 0 else None)
+    return tuple(prices)
+
+
+def paginate_items(query, args, order=None):
+    """Keyset pagination: return (items, next_cursor).
+
+    Without an order the catalog is listed newest first and the cursor is the
+    id of the last item on the previous page, so every page is an index seek
+    on (is_available, id) no matter how deep it is. Otherwise items are listed
+    by the (sort key, descending) order, ties by id in the same direction,
+    and the cursor is "<key>:<id>" of the last item; a price or popularity
+    page is a seek on its (is_available, key) index.
+    """
+    config = current_app.config
+    per_page = args.get('per_page', config['ITEMS_PER_PAGE'], type=int) or config['ITEMS_PER_PAGE']
+    # A negative LIMIT means no limit at all to SQLite
+    per_page = max(1, min(per_page, config['MAX_ITEMS_PER_PAGE']))
+    cursor = args.get('cursor', '')
+
+    if order is None:
+        if cursor.isdigit():
+            query = query.filter(RentalItem.id < int(cursor))
+
+        # Fetch one extra row to know whether there is a next page
+        items = query.order_by(RentalItem.id.desc()).limit(per_page + 1).all()
+        next_cursor = str(items[per_page - 1].id) if len(items) > per_page else None
+
+        return items[:per_page], next_cursor
+
+    key, descending = order
+    try:
+        last_key, last_id = cursor.split(':')
+        last_key, last_id = float(last_key), int(last_id)
+        # Written so the key bound alone can seek: key <= last, then the ties after the last id
+        if descending:
+            query = query.filter(key <= last_key, db.or_(key < last_key, RentalItem.id < last_id))
+        else:
+            query = query.filter(key >= last_key, db.or_(key > last_key, RentalItem.id > last_id))
+    except ValueError:
+        pass
+
+    ordering = (key.desc(), RentalItem.id.desc()) if descending else (key, RentalItem.id)
+    rows = query.add_columns(key).order_by(*ordering).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        item, item_key = rows[per_page - 1]
+        next_cursor = f'{item_key!r}:{item.id}'
+
+    return [item for item, _ in rows[:per_page]], next_cursor
+
+
+def catalog_facets_available():
+    if not current_app.config['CATALOG_FACETS_ENABLED'] or db.engine.dialect.name != 'sqlite':
+        return False
+    return optional_table_exists(CatalogFacet.__tablename__)
+
+
+def facet_counts(args):
+    """Item counts for the facets of the /items filters in args.
+
+    Returns {'category': [(category, items)], 'city': [(city, items)],
+    'barangay': [("barangay, city", items)]}, largest first; barangays are
+    those of the selected location's city. Each facet counts the items that match
+    every filter but its own, so it shows what picking one of its values
+    would list. All of them come from one set of (category, place, items)
+    rows: the catalog_facet table when nothing but the category and location
+    narrows the catalog, else one query grouped by category and place.
+    """
+    category = args.get('category', '')
+    place = None if geo.nearby_search(args) else geo.resolve_place(args.get('location', ''))
+    narrowed = (args.get('search') or parse_date_filter(args)[0] or parse_price_filter(args) != (None, None)
+                or geo.nearby_search(args) or (args.get('location') and place is None))
+
+    if not narrowed and catalog_facets_available():
+        rows = db.session.execute(db.select(CatalogFacet.category, CatalogFacet.place_id, CatalogFacet.items).where(
+            CatalogFacet.items > 0)).all()
+    else:
+        query, _ = filter_items(args, for_facets=True)
+        rows = query.with_entities(RentalItem.category, RentalItem.place_id, db.func.count()).group_by(
+            RentalItem.category, RentalItem.place_id).all()
+
+    places = geo.places_by_id()
+    selected = set(geo.places_in(place)) if place else None
+    categories, cities, barangays = {}, {}, {}
+    for row_category, place_id, items in rows:
+        if selected is None or place_id in selected:
+            categories[row_category] = categories.get(row_category, 0) + items
+        row_place = places.get(place_id)
+        if row_place is None or (category and row_category != category):
+            continue
+        cities[row_place[3]] = cities.get(row_place[3], 0) + items
+        if place and row_place[2] == 'barangay' and row_place[3] == place[3]:
+            label = f'{row_place[6]}, {row_place[3]}'  # like Place.label: barangay names repeat across cities
+            barangays[label] = barangays.get(label, 0) + items
+
+    def largest_first(counts):
+        return sorted(counts.items(), key=lambda pair: (-pair[1], pair[0]))
+    return {'category': largest_first(categories), 'city': largest_first(cities),
+            'barangay': largest_first(barangays)}
+
+
+def create_catalog_facets(fill=True):
+    """Create catalog_facet and the catalog triggers if they are missing, and fill the table if it is empty"""
+    CatalogFacet.__table__.create(db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            for trigger in CATALOG_TRIGGERS:
+                connection.execute(trigger)
+    forget_optional_table(CatalogFacet.__tablename__)
+    # Any available item adds a row, so an empty table next to available items was never built
+    if fill and not CatalogFacet.query.first() and RentalItem.query.filter_by(is_available=True).first():
+        rebuild_catalog_facets()
+
+
+def rebuild_catalog_facets():
+    """Recount the facet table and every item's rental_count from the source tables.
+
+    Returns (facets, drifted): the number of (category, place) facets and how
+    many of them, or of the items' rental counts, differed from the recount.
+    """
+    place_id = db.func.coalesce(RentalItem.place_id, 0)
+    expected = db.session.execute(db.select(RentalItem.category, place_id, db.func.count()).where(
+        RentalItem.is_available == db.true()).group_by(RentalItem.category, place_id)).all()
+    current = {(facet.category, facet.place_id): facet.items for facet in CatalogFacet.query if facet.items}
+    drifted = sum(1 for category, facet_place, items in expected if current.pop((category, facet_place), 0) != items)
+    drifted += len(current)
+
+    booked = db.select(db.func.count(Rental.id)).where(
+        Rental.item_id == RentalItem.id, Rental.status.in_(BOOKED_RENTAL_STATUSES)).scalar_subquery()
+    drifted += db.session.execute(db.update(RentalItem).where(
+        db.func.coalesce(RentalItem.rental_count, -1) != booked).values(rental_count=booked).execution_options(
+        synchronize_session=False)).rowcount
+
+    CatalogFacet.query.delete()
+    if expected:
+        db.session.execute(CatalogFacet.__table__.insert(), [
+            {'category': category, 'place_id': facet_place, 'items': items} for category, facet_place, items in expected
+        ])
+    db.session.commit()
+    return len(expected), drifted
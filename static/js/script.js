@@ -37,7 +37,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     if (startDateInput && endDateInput && daysCount && totalPrice) {
         const dailyRate = parseFloat(totalPrice.textContent.replace('₱', '')) || 0;
-        let blockedDates = [];
+        let isBlocked = () => false;
         let flatpickrStart, flatpickrEnd;
 
         // Fetch availability data if we're on a rental page
@@ -54,7 +54,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (itemId) {
                 fetchAvailability(itemId);
             } else {
-                initializeDatePickers([]);
+                initializeDatePickers();
             }
         }
 
@@ -90,23 +90,23 @@ document.addEventListener('DOMContentLoaded', function() {
 
         async function fetchAvailability(itemId) {
             try {
-                const response = await fetch(`/item/${itemId}/availability`);
+                const response = await fetch(`/item/${itemId}/availability?format=bitmap`);
                 const data = await response.json();
-                blockedDates = data.blocked_dates.map(date => new Date(date));
-                initializeDatePickers(blockedDates);
-                renderCalendarPreview(blockedDates);
+                isBlocked = availabilityLookup(data);
+                initializeDatePickers();
+                renderCalendarPreview();
             } catch (error) {
                 console.error('Error fetching availability:', error);
-                initializeDatePickers([]);
+                initializeDatePickers();
             }
         }
 
-        function initializeDatePickers(blockedDates) {
+        function initializeDatePickers() {
             // Initialize start date picker
             flatpickrStart = flatpickr(startDateInput, {
                 minDate: 'today',
                 dateFormat: 'Y-m-d',
-                disable: blockedDates,
+                disable: [date => isBlocked(date)],
                 onChange: function(selectedDates, dateStr, instance) {
                     if (selectedDates.length > 0) {
                         flatpickrEnd.set('minDate', selectedDates[0]);
@@ -124,7 +124,7 @@ document.addEventListener('DOMContentLoaded', function() {
             flatpickrEnd = flatpickr(endDateInput, {
                 minDate: 'today',
                 dateFormat: 'Y-m-d',
-                disable: blockedDates,
+                disable: [date => isBlocked(date)],
                 onChange: function(selectedDates, dateStr, instance) {
                     if (selectedDates.length > 0) {
                         calculatePrice();
@@ -171,8 +171,7 @@ document.addEventListener('DOMContentLoaded', function() {
             // Check if any date in the range is blocked
             const currentDate = new Date(start);
             while (currentDate <= end) {
-                const dateString = currentDate.toISOString().split('T')[0];
-                if (blockedDates.some(blocked => blocked.toISOString().split('T')[0] === dateString)) {
+                if (isBlocked(currentDate)) {
                     showError('Selected dates include unavailable dates. Please check the calendar.');
                     return;
                 }
@@ -201,7 +200,7 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
 
-        function renderCalendarPreview(blockedDates) {
+        function renderCalendarPreview() {
             const calendarEl = document.getElementById('calendarPreview');
             if (!calendarEl) return;
 
@@ -237,16 +236,12 @@ document.addEventListener('DOMContentLoaded', function() {
             // Days of the month
             for (let day = 1; day <= daysInMonth; day++) {
                 const date = new Date(currentYear, currentMonth, day);
-                const dateString = date.toISOString().split('T')[0];
                 const isToday = day === today.getDate() && currentMonth === today.getMonth();
-                const isBlocked = blockedDates.some(blocked =>
-                    blocked.toISOString().split('T')[0] === dateString
-                );
                 const isPast = date < today;
 
                 let dayClass = 'calendar-day';
                 if (isToday) dayClass += ' today';
-                if (isBlocked || isPast) {
+                if (isBlocked(date) || isPast) {
                     dayClass += ' unavailable';
                 } else {
                     dayClass += ' available';
@@ -310,8 +305,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 // Final validation for blocked dates
                 const currentDate = new Date(start);
                 while (currentDate <= end) {
-                    const dateString = currentDate.toISOString().split('T')[0];
-                    if (blockedDates.some(blocked => blocked.toISOString().split('T')[0] === dateString)) {
+                    if (isBlocked(currentDate)) {
                         e.preventDefault();
                         showError('Selected dates include unavailable dates. Please choose different dates.');
                         return;
@@ -521,6 +515,29 @@ function showToast(message, type = 'success') {
     }, 5000);
 }
 
+// Day lookup for the compact availability format (/item/<id>/availability?format=bitmap):
+// day i after data.start is blocked when bit (i & 7) of byte (i >> 3) is set.
+// Returns isBlocked(date), which takes a Date or a 'YYYY-MM-DD' string and runs in O(1).
+function availabilityLookup(data) {
+    const bytes = Uint8Array.from(atob(data.blocked_bitmap), c => c.charCodeAt(0));
+    const [year, month, day] = data.start.split('-').map(Number);
+    const start = Date.UTC(year, month - 1, day);
+
+    return function isBlocked(date) {
+        let time;
+        if (typeof date === 'string') {
+            const [y, m, d] = date.split('-').map(Number);
+            time = Date.UTC(y, m - 1, d);
+        } else {
+            // Calendar widgets hand out local midnights, compare by calendar day
+            time = Date.UTC(date.getFullYear(), date.getMonth(), date.getDate());
+        }
+        const index = Math.round((time - start) / 86400000);
+        if (index < 0 || index >= data.days) return false;
+        return (bytes[index >> 3] & (1 << (index & 7))) !== 0;
+    };
+}
+
 // Image error handling
 document.addEventListener('DOMContentLoaded', function() {
     const images = document.querySelectorAll('img');
@@ -0,0 +1,152 @@
+"""Listing image uploads and the background jobs that resize them.
+
+add_item commits the item with image_status 'pending' and queues its raw
+upload on a process pool. A done-callback marks the item 'ready', or requeues
+it until IMAGE_MAX_ATTEMPTS and then marks it 'failed'. Pillow and the
+process pool are only imported once an image is actually uploaded.
+"""
+import functools
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+import images
+from models import db, RentalItem
+from page_cache import invalidate_catalog
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+
+def allowed_file(filename):
+    return '.' in filename and \
+        filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def save_image(file):
+    """Check an uploaded image and store it for background processing"""
+    from PIL import Image
+
+    if file and allowed_file(file.filename):
+        # Generate secure filename
+        filename = secure_filename(file.filename)
+        # Add timestamp, a hash of the content and a random token to make the filename
+        # unique, even for concurrent uploads. Upload URLs never change content, so
+        # they can be cached as immutable.
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        digest = hashlib.sha256(file.read()).hexdigest()[:12]
+        file.seek(0)
+        filename = f"{timestamp}_{digest}_{uuid.uuid4().hex[:4]}_{filename}"
+
+        raw_path = os.path.join(current_app.config['RAW_UPLOAD_FOLDER'], filename)
+
+        try:
+            # Only parse the headers here, decoding and resizing happen in the image workers
+            Image.open(file).verify()
+            file.seek(0)
+            file.save(raw_path)
+            return filename
+        except Exception as e:
+            print(f"Error processing image: {e}")
+            return None
+    return None
+
+
+def remove_image_files(filename, widths=()):
+    """Delete an item's raw upload and derivatives, whichever exist"""
+    config = current_app.config
+    paths = [
+        os.path.join(config['RAW_UPLOAD_FOLDER'], filename),
+        os.path.join(config['UPLOAD_FOLDER'], filename),
+        os.path.join(config['UPLOAD_FOLDER'], f"thumb_{filename}"),
+    ] + [
+        os.path.join(config['UPLOAD_FOLDER'], variant)
+        for variant in images.variant_files(filename, widths, images.VARIANT_FORMATS)
+    ]
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"Error deleting image files: {e}")
+
+
+_image_pool = None
+
+
+def image_pool():
+    """Process pool that produces image derivatives, started on first use"""
+    global _image_pool
+    if _image_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        _image_pool = ProcessPoolExecutor(max_workers=current_app.config['IMAGE_WORKERS'],
+                                          mp_context=multiprocessing.get_context('spawn'))
+    return _image_pool
+
+
+def queue_image_processing(item):
+    """Produce the derivatives of a committed item's raw upload"""
+    config = current_app.config
+    queued = time.perf_counter()
+    job = (os.path.join(config['RAW_UPLOAD_FOLDER'], item.image_filename),
+           config['UPLOAD_FOLDER'], item.image_filename,
+           config['IMAGE_WIDTHS'], config['IMAGE_FORMATS'])
+
+    if not config['IMAGE_PROCESSING_ASYNC']:
+        try:
+            widths, error = images.process_upload(*job), None
+        except Exception as e:
+            widths, error = None, e
+        finish_image_job(current_app._get_current_object(), item.id, error, widths, queued)
+        return
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    global _image_pool
+    try:
+        future = image_pool().submit(images.process_upload, *job)
+    except BrokenProcessPool:
+        # A worker died and took the pool with it, start a fresh one
+        _image_pool = None
+        future = image_pool().submit(images.process_upload, *job)
+    future.add_done_callback(functools.partial(_image_job_done, current_app._get_current_object(), item.id, queued))
+
+
+def _image_job_done(app, item_id, queued, future):
+    error = future.exception()
+    finish_image_job(app, item_id, error, None if error else future.result(), queued)
+
+
+def finish_image_job(app, item_id, error, widths=None, queued=None):
+    """Record the outcome of an image job and retry it if attempts are left"""
+    # Done-callbacks run on the pool's thread, outside any request
+    with app.app_context():
+        item = db.session.get(RentalItem, item_id)
+        if item is None:
+            return
+
+        if error is None:
+            item.image_status = 'ready'
+            item.image_widths = ','.join(str(width) for width in widths or [])
+        else:
+            item.image_attempts = (item.image_attempts or 0) + 1
+            print(f"Error processing image for item {item_id} (attempt {item.image_attempts}): {error}")
+            item.image_status = 'pending' if item.image_attempts < app.config['IMAGE_MAX_ATTEMPTS'] else 'failed'
+        db.session.commit()
+        if item.image_status == 'ready':
+            # Cached pages still show the placeholder instead of the srcset
+            invalidate_catalog()
+
+        metrics = app.extensions.get('metrics')
+        if metrics is not None and queued is not None:
+            # 'pending' here means the job failed and is queued again
+            metrics.observe(metrics.image_seconds, time.perf_counter() - queued, item.image_status)
+
+        if item.image_status == 'pending':
+            queue_image_processing(item)
@@ -0,0 +1,81 @@
+"""Per-user dashboard counters.
+
+On SQLite the user_stats table is maintained by triggers (see
+USER_STATS_TRIGGERS in models.py), so the dashboard reads one row however
+many rentals a user has. On other databases, or with USER_STATS_ENABLED
+off, the counters are counted live. `flask upgrade-db` creates and fills the
+table; `flask rebuild-user-stats` recounts it if it ever drifts.
+"""
+from flask import current_app
+
+from models import (db, ACTIVE_RENTAL_STATUSES, USER_STATS_TRIGGERS, Payment, Rental, RentalItem, User, UserStats,
+                    forget_optional_table, optional_table_exists)
+
+COUNTERS = ('rentals', 'active_rentals', 'completed_payments', 'listings', 'pending_requests')
+
+
+def _counter_columns(user_id):
+    """Scalar subqueries counting each counter of user_id (a column or a value)"""
+    return {
+        'rentals': db.select(db.func.count(Rental.id)).where(Rental.renter_id == user_id),
+        'active_rentals': db.select(db.func.count(Rental.id)).where(
+            Rental.renter_id == user_id, Rental.status.in_(ACTIVE_RENTAL_STATUSES)),
+        'completed_payments': db.select(db.func.count(Payment.id)).join(Payment.rental).where(
+            Rental.renter_id == user_id, Payment.status == 'completed'),
+        'listings': db.select(db.func.count(RentalItem.id)).where(RentalItem.owner_id == user_id),
+        'pending_requests': db.select(db.func.count(Rental.id)).join(Rental.item).where(
+            RentalItem.owner_id == user_id, Rental.status == 'pending'),
+    }
+
+
+def user_stats_available():
+    if not current_app.config['USER_STATS_ENABLED'] or db.engine.dialect.name != 'sqlite':
+        return False
+    return optional_table_exists(UserStats.__tablename__)
+
+
+def dashboard_counters(user_id):
+    """{counter: value} for the dashboard of user_id"""
+    if user_stats_available():
+        stats = db.session.get(UserStats, user_id)
+        # No row yet means the user has never rented or listed anything
+        return {name: getattr(stats, name) if stats else 0 for name in COUNTERS}
+
+    columns = _counter_columns(user_id)
+    row = db.session.execute(db.select(*(columns[name].scalar_subquery() for name in COUNTERS))).one()
+    return dict(zip(COUNTERS, row))
+
+
+def create_user_stats(fill=True):
+    """Create user_stats and its triggers if they are missing, and fill the table if it is empty"""
+    UserStats.__table__.create(db.engine, checkfirst=True)
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.begin() as connection:
+            for trigger in USER_STATS_TRIGGERS:
+                connection.execute(trigger)
+    forget_optional_table(UserStats.__tablename__)
+    # Any rental or listing adds a row, so an empty table next to existing users was never built
+    if fill and not UserStats.query.first() and User.query.first():
+        rebuild_user_stats()
+
+
+def rebuild_user_stats():
+    """Recount every user's counters from the source tables.
+
+    Returns (users, drifted): the number of users and how many of them had
+    counters that differed from the recount.
+    """
+    columns = _counter_columns(User.id)
+    expected = db.session.execute(db.select(
+        User.id, *(columns[name].scalar_subquery().label(name) for name in COUNTERS)
+    )).all()
+    current = {stats.user_id: tuple(getattr(stats, name) for name in COUNTERS) for stats in UserStats.query}
+    drifted = sum(1 for user_id, *counts in expected if current.get(user_id, (0,) * len(COUNTERS)) != tuple(counts))
+
+    UserStats.query.delete()
+    if expected:
+        db.session.execute(UserStats.__table__.insert(), [
+            dict(zip(('user_id', *COUNTERS), row)) for row in expected
+        ])
+    db.session.commit()
+    return len(expected), drifted
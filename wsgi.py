@@ -0,0 +1,26 @@
+"""WSGI entry point for production servers.
+
+Create or upgrade the schema once, then start as many workers as needed:
+
+    flask --app app upgrade-db
+    gunicorn --workers 4 --bind 0.0.0.0:8000 wsgi:application
+
+Configuration comes from the environment: SECRET_KEY, DATABASE_URL
+(SQLite, or postgresql:// with a driver such as psycopg installed),
+DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING, and for
+SQLite SQLITE_JOURNAL_MODE (WAL), SQLITE_BUSY_TIMEOUT (ms) and
+SQLITE_SYNCHRONOUS. See benchmarks/load_test.py for a multi-worker load
+test.
+
+Every worker also expires unpaid rentals in the background, see expiry.py
+for RENTAL_HOLD_MINUTES and RENTAL_EXPIRY_INTERVAL.
+"""
+import functools
+
+from app import check_database, create_app
+from expiry import start_expiry_sweeper
+
+application = create_app()
+check_database(application)
+# Started by each worker's first request: a thread started here would not survive a --preload fork
+application.before_request(functools.partial(start_expiry_sweeper, application))